@@ -0,0 +1,84 @@
+"""对比线程池引擎与协程引擎的下载速度(论文/秒)
+
+用法: python benchmark/bench_engine.py ICLR.cc/2021/Conference --papers 60
+
+两种引擎分别下载同一批论文到临时目录, 不会影响项目下的cache和data
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+root_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root_dir))
+
+
+def bench_thread(venue_id, task_list, thread_num):
+    from core.openreview_spider import PaperDownload
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=thread_num) as executor:
+        futures = [
+            executor.submit(PaperDownload(venue_id, paper_info, states))
+            for paper_info, states in task_list
+        ]
+        for future in futures:
+            future.result()
+    return time.perf_counter() - start
+
+
+def bench_async(venue_id, task_list, concurrency):
+    from core.async_download import AsyncPaperDownload
+
+    start = time.perf_counter()
+    AsyncPaperDownload(concurrency)(venue_id, task_list)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("venue_id")
+    parser.add_argument("--papers", type=int, default=60, help="参与测试的论文数")
+    parser.add_argument("--threads", type=int, default=6, help="线程池引擎的线程数")
+    parser.add_argument("--concurrency", type=int, default=64, help="协程引擎并发数")
+    args = parser.parse_args()
+
+    # core中的路径均相对于当前目录, 切换到临时目录避免污染项目数据
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_engine_"))
+    os.chdir(work_dir)
+    (work_dir / "cache").mkdir()
+    from core.manifest import ARTIFACTS
+    from core.openreview_spider import OpenReviewSpider
+    from module import data_module
+
+    paper_list = (OpenReviewSpider(args.venue_id)() or [])[: args.papers]
+    if not paper_list:
+        print(f"{args.venue_id}: 没有获取到论文")
+        return
+
+    task_list = [(i, dict.fromkeys(ARTIFACTS)) for i in paper_list]
+    results = {}
+    for name, bench, worker_num in [
+        ("thread", bench_thread, args.threads),
+        ("async", bench_async, args.concurrency),
+    ]:
+        engine_dir = work_dir / name
+        (engine_dir / "cache").mkdir(parents=True)
+        os.chdir(engine_dir)
+        # 已创建目录的缓存是相对路径, 换到新目录后需要重新创建
+        data_module._created_dirs.clear()
+        results[name] = bench(args.venue_id, task_list, worker_num)
+        os.chdir(work_dir)
+
+    print(f"论文数: {len(paper_list)}, 临时目录: {work_dir}")
+    for name, seconds in results.items():
+        print(f"{name:>6}: {seconds:8.2f}s  {len(paper_list) / seconds:8.2f} 论文/秒")
+    print(f"加速比: {results['thread'] / results['async']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
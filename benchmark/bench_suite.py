@@ -0,0 +1,187 @@
+"""基于本地模拟服务器的离线基准测试, 不会请求真实的OpenReview
+
+用法: python benchmark/bench_suite.py --papers 300 --latency 0.02 --json result.json
+
+每个测试项在独立的子进程和临时目录中运行, 分别统计:
+    listing     获取论文列表并写入索引
+    pdf         只下载pdf
+    supplement  只下载支撑文件
+    review      逐篇获取评审
+    harvest     按会议批量获取评审(details=replies)
+    end_to_end  get_venue_tasks + 线程池下载全部内容
+输出每项的耗时、论文/秒、请求数与子进程的峰值内存, 可用--json保存结果对比不同版本
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+root_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root_dir))
+
+from benchmark.fake_server import FakeOpenReview  # noqa: E402
+
+WORKLOADS = ["listing", "pdf", "supplement", "review", "harvest", "end_to_end"]
+
+
+def peak_rss_mb():
+    """当前进程的峰值内存(MB), 不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB, macOS为字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def request_count(metrics) -> int:
+    return sum(metrics.snapshot()["counters"].get("http_status", {}).values())
+
+
+def download(venue_id, paper_list, artifacts, thread_num):
+    from core.openreview_spider import PaperDownload
+
+    with ThreadPoolExecutor(max_workers=thread_num) as executor:
+        futures = [
+            executor.submit(PaperDownload(venue_id, i, dict.fromkeys(artifacts)))
+            for i in paper_list
+        ]
+        for future in futures:
+            future.result()
+
+
+def run_workload(name, work_dir, baseurls, venue_id, options, result_queue):
+    """在子进程中运行一个测试项, core中的路径均相对于当前目录"""
+    os.chdir(work_dir)
+    for key in ("OPENREVIEW_USERNAME", "OPENREVIEW_PASSWORD"):
+        os.environ.pop(key, None)
+    from core import openreview_client
+    from core.log_config import print_log
+    from core.metrics import metrics
+    from core.openreview_spider import OpenReviewSpider
+    from core.pipeline import get_venue_tasks
+    from core.rate_limiter import rate_limiter
+    from core.review_harvester import ReviewHarvester
+
+    print_log.remove()
+    openreview_client.BASEURLS.update(baseurls)
+    rate_limiter.configure(
+        rate=options["rate"], max_rate=options["rate"], burst=options["rate"]
+    )
+
+    spider = OpenReviewSpider(venue_id)
+    start, requests = time.perf_counter(), request_count(metrics)
+    paper_list = spider()
+    if name != "listing":
+        # 论文列表只作为准备, 不计入耗时和请求数
+        start, requests = time.perf_counter(), request_count(metrics)
+    if name == "pdf":
+        download(venue_id, paper_list, ["pdf"], options["threads"])
+    elif name == "supplement":
+        download(venue_id, paper_list, ["supplement"], options["threads"])
+    elif name == "review":
+        download(venue_id, paper_list, ["review"], options["threads"])
+    elif name == "harvest":
+        ReviewHarvester(spider)(list(paper_list))
+    elif name == "end_to_end":
+        task_list = list(get_venue_tasks(venue_id))
+        download(
+            venue_id,
+            [i for i, _ in task_list],
+            ["pdf", "supplement", "review"],
+            options["threads"],
+        )
+    seconds = time.perf_counter() - start
+    result_queue.put(
+        {
+            "workload": name,
+            "papers": len(paper_list),
+            "seconds": round(seconds, 3),
+            "papers_per_second": round(len(paper_list) / seconds, 2),
+            "requests": request_count(metrics) - requests,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--papers", type=int, default=200, help="每个会议的论文数")
+    parser.add_argument("--api-version", type=int, default=2, choices=[1, 2])
+    parser.add_argument("--workloads", nargs="+", default=WORKLOADS, choices=WORKLOADS)
+    parser.add_argument("--threads", type=int, default=6, help="下载线程数")
+    parser.add_argument("--rate", type=float, default=1000, help="限速器速率(次/秒)")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的延迟(秒)")
+    parser.add_argument("--pdf-size", type=int, default=512 * 1024)
+    parser.add_argument("--supplement-size", type=int, default=2 * 1024 * 1024)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="429比例")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="500比例")
+    parser.add_argument("--json", type=Path, help="把结果保存为JSON")
+    args = parser.parse_args()
+
+    server = FakeOpenReview(
+        papers=args.papers,
+        pdf_size=args.pdf_size,
+        supplement_size=args.supplement_size,
+        latency=args.latency,
+        throttle_rate=args.throttle_rate,
+        failure_rate=args.failure_rate,
+    )
+    baseurls = server.baseurls(server.start())
+    venue_id = next(i for i, v in server.venues.items() if v == args.api_version)
+    options = {"threads": args.threads, "rate": args.rate}
+
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_suite_"))
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for name in args.workloads:
+        (work_dir / name).mkdir()
+        server.reset_counts()
+        result_queue = context.Queue()
+        process = context.Process(
+            target=run_workload,
+            args=(name, work_dir / name, baseurls, venue_id, options, result_queue),
+        )
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            print(f"{name}: 子进程异常退出, 退出码{process.exitcode}")
+            continue
+        result = result_queue.get()
+        result["server_requests"] = dict(server.request_counts)
+        results.append(result)
+    server.stop()
+
+    print(f"会议: {venue_id}, 论文数: {args.papers}, 临时目录: {work_dir}")
+    print(
+        f"{'workload':>12} {'seconds':>9} {'papers/s':>10} {'requests':>9} {'peak MB':>8}"
+    )
+    for i in results:
+        print(
+            f"{i['workload']:>12} {i['seconds']:>9.2f} {i['papers_per_second']:>10.2f} "
+            f"{i['requests']:>9} {i['peak_rss_mb'] or '-':>8}"
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "args": {k: str(v) for k, v in vars(args).items()},
+                    "results": results,
+                },
+                f,
+                ensure_ascii=False,
+                indent=4,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,497 @@
+"""本地模拟的OpenReview API, 用于离线测试与性能基准, 不会请求真实网站
+
+用法: python benchmark/fake_server.py --port 8080 --papers 500 --latency 0.05
+
+实现了OpenReviewSpider/PaperDownload用到的V1与V2接口:
+    /v1 与 /v2 前缀下的 GET /groups, GET /notes(invitation/forum/domain, 分页与details=replies),
+    GET /attachment(支持Range), POST /login
+可以配置延迟、附件大小、429注入比例与500失败比例
+"""
+
+import argparse
+import base64
+import json
+import random
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+VENUES = {
+    # venue_id: API版本
+    "Fake.cc/2023/Conference": 2,
+    "Fake.cc/2019/Conference": 1,
+}
+
+
+class FakeOpenReview:
+    """模拟服务器, 每个会议papers篇论文, 每篇reviews条回复"""
+
+    def __init__(
+        self,
+        venues: dict = None,
+        papers: int = 200,
+        reviews: int = 4,
+        pdf_size: int = 512 * 1024,
+        supplement_size: int = 2 * 1024 * 1024,
+        supplement_ratio: float = 0.5,
+        latency: float = 0.0,
+        throttle_rate: float = 0.0,
+        failure_rate: float = 0.0,
+        retry_after: float = 1.0,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            latency (float): 每个请求的固定延迟(秒)
+            throttle_rate (float): 返回429的请求比例
+            failure_rate (float): 返回500的请求比例
+            retry_after (float): 429响应的Retry-After(秒)
+        """
+        self.venues = VENUES if venues is None else venues
+        self.papers = papers
+        self.reviews = reviews
+        self.pdf_size = pdf_size
+        self.supplement_size = supplement_size
+        self.supplement_ratio = supplement_ratio
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.failure_rate = failure_rate
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.request_counts = {}
+        self._payload = random.Random(seed).randbytes(1024 * 1024)
+        self._layouts = {}
+        self._server = None
+
+    # ---------- 数据 ----------
+
+    @staticmethod
+    def _prefix(venue_id: str) -> str:
+        return "".join(i for i in venue_id if i.isalnum())[:12]
+
+    def _paper_ids(self, venue_id: str) -> list:
+        prefix = self._prefix(venue_id)
+        return [f"{prefix}{i:06d}" for i in range(self.papers)]
+
+    def _find_paper(self, paper_id: str):
+        for venue_id in self.venues:
+            prefix = self._prefix(venue_id)
+            if paper_id.startswith(prefix) and paper_id[len(prefix) :].isdigit():
+                index = int(paper_id[len(prefix) :])
+                if index < self.papers:
+                    return venue_id, index
+        return None, None
+
+    def _has_supplement(self, index: int) -> bool:
+        return index % 100 < self.supplement_ratio * 100
+
+    def _submission_invitation(self, venue_id: str) -> str:
+        if self.venues[venue_id] == 1:
+            return f"{venue_id}/-/Blind_Submission"
+        return f"{venue_id}/-/Submission"
+
+    def _value(self, venue_id: str, value):
+        return value if self.venues[venue_id] == 1 else {"value": value}
+
+    def submission(self, venue_id: str, index: int, replies: bool = False) -> dict:
+        paper_id = self._paper_ids(venue_id)[index]
+        content = {
+            "title": self._value(venue_id, f"Fake paper {index} of {venue_id}"),
+            "pdf": self._value(venue_id, f"/pdf/{paper_id}.pdf"),
+        }
+        if self._has_supplement(index):
+            content["supplementary_material"] = self._value(
+                venue_id, f"/attachment/{paper_id}.zip"
+            )
+        note = self._note(venue_id, paper_id, paper_id, None, content, index)
+        if replies:
+            note["details"] = {"replies": self.replies(venue_id, index)}
+        return note
+
+    def replies(self, venue_id: str, index: int) -> list:
+        paper_id = self._paper_ids(venue_id)[index]
+        return [
+            self._note(
+                venue_id,
+                f"{paper_id}r{j}",
+                paper_id,
+                paper_id,
+                {
+                    "rating": self._value(venue_id, "6: Marginally above"),
+                    "review": self._value(venue_id, "Lorem ipsum " * 200),
+                },
+                index,
+                offset=j + 1,
+            )
+            for j in range(self.reviews)
+        ]
+
+    def _note(self, venue_id, note_id, forum, replyto, content, index, offset=0):
+        base_time = 1700000000000 + index * 1000 + offset
+        note = {
+            "id": note_id,
+            "forum": forum,
+            "replyto": replyto,
+            "content": content,
+            "tcdate": base_time,
+            "tmdate": base_time,
+            "readers": ["everyone"],
+            "writers": [venue_id],
+            "signatures": [venue_id],
+        }
+        if self.venues[venue_id] == 1:
+            note["invitation"] = (
+                self._submission_invitation(venue_id)
+                if replyto is None
+                else f"{venue_id}/-/Official_Review"
+            )
+        else:
+            note["invitations"] = [
+                (
+                    self._submission_invitation(venue_id)
+                    if replyto is None
+                    else f"{venue_id}/-/Official_Review"
+                )
+            ]
+            note["domain"] = venue_id
+        return note
+
+    def group(self, group_id: str):
+        if group_id == "venues":
+            return {"id": "venues", "members": list(self.venues)}
+        if group_id not in self.venues:
+            return None
+        invitation = self._submission_invitation(group_id)
+        if self.venues[group_id] == 1:
+            return {"id": group_id, "web": f"var SUBMISSION_ID = '{invitation}';"}
+        return {
+            "id": group_id,
+            "domain": group_id,
+            "content": {"submission_id": {"value": invitation}},
+        }
+
+    def notes(self, query: dict) -> list:
+        limit = int(query.get("limit", 1000))
+        offset = int(query.get("offset", 0))
+        if "forum" in query:
+            venue_id, index = self._find_paper(query["forum"])
+            if venue_id is None:
+                return []
+            return [self.submission(venue_id, index)] + self.replies(venue_id, index)
+        if "invitation" in query:
+            for venue_id in self.venues:
+                if query["invitation"] == self._submission_invitation(venue_id):
+                    break
+            else:
+                return []
+            ids = self._paper_ids(venue_id)
+            start = 0
+            if query.get("after"):
+                start = next(
+                    (i for i, paper_id in enumerate(ids) if paper_id > query["after"]),
+                    len(ids),
+                )
+            start += offset
+            replies = "replies" in query.get("details", "")
+            return [
+                self.submission(venue_id, i, replies)
+                for i in range(start, min(start + limit, len(ids)))
+            ]
+        if "domain" in query and query["domain"] in self.venues:
+            # 按tmdate倒序, 与增量同步的查询一致
+            venue_id = query["domain"]
+            notes = []
+            for i in reversed(range(self.papers)):
+                notes.extend(reversed(self.replies(venue_id, i)))
+                notes.append(self.submission(venue_id, i))
+                if len(notes) >= offset + limit:
+                    break
+            return notes[offset : offset + limit]
+        return []
+
+    def attachment(self, paper_id: str, name: str):
+        venue_id, index = self._find_paper(paper_id)
+        if venue_id is None:
+            return None
+        if name == "pdf":
+            return self.pdf_size
+        if name == "supplementary_material" and self._has_supplement(index):
+            return self.supplement_size
+        return None
+
+    def _filler(self, start: int, end: int) -> bytes:
+        """按位置循环使用同一块随机数据"""
+        size = len(self._payload)
+        chunks = []
+        while start < end:
+            offset = start % size
+            length = min(end - start, size - offset)
+            chunks.append(self._payload[offset : offset + length])
+            start += length
+        return b"".join(chunks)
+
+    def _layout(self, name: str, size: int):
+        """附件由(文件头, 随机数据长度, 文件尾)组成, pdf有%PDF头和%%EOF结尾, 支撑文件是只有一个文件的zip
+
+        Returns:
+            tuple: (head, length, tail)
+        """
+        key = (name, size)
+        if key not in self._layouts:
+            if name == "pdf":
+                head, tail = b"%PDF-1.4\n", b"\n%%EOF\n"
+            else:
+                file_name = b"data.bin"
+                length = size - 30 - 46 - 22 - 2 * len(file_name)
+                if length < 0:
+                    head, tail = b"", b""
+                else:
+                    crc = 0
+                    for offset in range(0, length, len(self._payload)):
+                        crc = zlib.crc32(
+                            self._filler(
+                                offset, min(offset + len(self._payload), length)
+                            ),
+                            crc,
+                        )
+                    head, tail = _zip_parts(file_name, length, crc)
+            self._layouts[key] = (head, size - len(head) - len(tail), tail)
+        return self._layouts[key]
+
+    def payload(
+        self, start: int, end: int, name: str = "pdf", size: int = None
+    ) -> bytes:
+        """附件中[start, end)的内容"""
+        head, length, tail = self._layout(name, size or end)
+        chunks = []
+        if start < len(head):
+            chunks.append(head[start:end])
+        body_start, body_end = max(start, len(head)), min(end, len(head) + length)
+        if body_start < body_end:
+            chunks.append(self._filler(body_start - len(head), body_end - len(head)))
+        tail_start = len(head) + length
+        if end > tail_start:
+            chunks.append(tail[max(start - tail_start, 0) : end - tail_start])
+        return b"".join(chunks)
+
+    # ---------- 服务器 ----------
+
+    def count(self, path: str):
+        with self._lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+
+    def reset_counts(self):
+        with self._lock:
+            self.request_counts = {}
+
+    def inject(self):
+        """按配置返回429或500, 正常时返回None"""
+        with self._lock:
+            value = self._random.random()
+        if value < self.throttle_rate:
+            return 429
+        if value < self.throttle_rate + self.failure_rate:
+            return 500
+        return None
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """在后台线程启动服务器
+
+        Returns:
+            str: 服务器地址, V1与V2的baseurl分别为<地址>/v1与<地址>/v2
+        """
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def baseurls(self, url: str) -> dict:
+        return {1: f"{url}/v1", 2: f"{url}/v2"}
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def _make_handler(server: FakeOpenReview):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, obj, status=200, headers=None):
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _prepare(self):
+            url = urlparse(self.path)
+            path = url.path
+            for prefix in ("/v1", "/v2"):
+                if path.startswith(prefix + "/"):
+                    path = path[len(prefix) :]
+            server.count(path)
+            if server.latency:
+                time.sleep(server.latency)
+            status = server.inject()
+            if status == 429:
+                self._send_json(
+                    {"name": "RateLimitError", "message": "Too many requests"},
+                    429,
+                    {"Retry-After": str(server.retry_after)},
+                )
+                return None, None
+            if status == 500:
+                self._send_json({"name": "Error", "message": "Injected failure"}, 500)
+                return None, None
+            return path, {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            self.rfile.read(length)
+            path, _ = self._prepare()
+            if path is None:
+                return
+            if path == "/login":
+                # 未签名的JWT, 客户端只解码不校验
+                header = _b64({"alg": "none", "typ": "JWT"})
+                payload = _b64(
+                    {"user": {"id": "~Fake_User1"}, "exp": int(time.time()) + 3600}
+                )
+                self._send_json(
+                    {
+                        "token": f"{header}.{payload}.",
+                        "user": {"profile": {"id": "~Fake_User1"}},
+                    }
+                )
+                return
+            self._send_json({"name": "NotFound", "message": path}, 404)
+
+        def do_GET(self):
+            path, query = self._prepare()
+            if path is None:
+                return
+            if path == "/groups":
+                group = server.group(query.get("id", ""))
+                if group is None:
+                    self._send_json(
+                        {
+                            "name": "NotFoundError",
+                            "message": "Group not found",
+                            "status": 404,
+                        },
+                        404,
+                    )
+                    return
+                self._send_json({"groups": [group]})
+            elif path == "/notes":
+                notes = server.notes(query)
+                self._send_json({"notes": notes, "count": len(notes)})
+            elif path == "/attachment":
+                self._attachment(query)
+            else:
+                self._send_json({"name": "NotFound", "message": path}, 404)
+
+        def _attachment(self, query):
+            size = server.attachment(query.get("id", ""), query.get("name", ""))
+            if size is None:
+                self._send_json(
+                    {"name": "NotFoundError", "message": "Attachment not found"}, 404
+                )
+                return
+            start = 0
+            range_header = self.headers.get("Range")
+            if range_header:
+                start = int(range_header.split("=")[1].split("-")[0])
+                if start >= size:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{size - 1}/{size}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(size - start))
+            self.end_headers()
+            chunk_size = 256 * 1024
+            try:
+                for offset in range(start, size, chunk_size):
+                    self.wfile.write(
+                        server.payload(
+                            offset,
+                            min(offset + chunk_size, size),
+                            query.get("name", ""),
+                            size,
+                        )
+                    )
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+def _zip_parts(name: bytes, length: int, crc: int):
+    """只包含一个不压缩文件的zip: 返回文件数据之前的本地文件头, 以及之后的中央目录和目录结束记录"""
+    sizes = (crc, length, length, len(name))
+    head = struct.pack("<I5H3I2H", 0x04034B50, 20, 0, 0, 0, 0, *sizes, 0) + name
+    central = (
+        struct.pack("<I6H3I5H2I", 0x02014B50, 20, 20, 0, 0, 0, 0, *sizes, *[0] * 6)
+        + name
+    )
+    offset = len(head) + length
+    end = struct.pack("<I4H2IH", 0x06054B50, 0, 0, 1, 1, len(central), offset, 0)
+    return head, central + end
+
+
+def _b64(obj) -> str:
+    data = json.dumps(obj).encode("utf-8")
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--papers", type=int, default=200, help="每个会议的论文数")
+    parser.add_argument("--reviews", type=int, default=4, help="每篇论文的回复数")
+    parser.add_argument("--pdf-size", type=int, default=512 * 1024)
+    parser.add_argument("--supplement-size", type=int, default=2 * 1024 * 1024)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的延迟(秒)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="429比例")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="500比例")
+    args = parser.parse_args()
+    server = FakeOpenReview(
+        papers=args.papers,
+        reviews=args.reviews,
+        pdf_size=args.pdf_size,
+        supplement_size=args.supplement_size,
+        latency=args.latency,
+        throttle_rate=args.throttle_rate,
+        failure_rate=args.failure_rate,
+    )
+    url = server.start(args.host, args.port)
+    print(f"V1: {url}/v1, V2: {url}/v2, 会议: {list(server.venues)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
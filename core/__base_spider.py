@@ -1,20 +1,21 @@
+import itertools
 import time
 
 import requests
-from fake_useragent import UserAgent
 
+from core.http_pool import get_session, random_user_agent
 from core.log_config import print_log
+from core.metrics import metrics
 
 
 class BaseSpider:
     def __init__(self):
-        self.__ua = UserAgent()
-        self.session = requests.Session()
-        self.session.headers = {
+        # 所有爬虫共享一个保持长连接的session, 请求头随每次请求发送
+        self.session = get_session()
+        self.headers = {
             # "accept": "application/json,text/*;q=0.99",
             # "accept-language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6,zh-TW;q=0.5",
             # "cache-control": "no-cache",
-            "connection": "close",
             # "origin": "https://openreview.net",
             # "pragma": "no-cache",
             # "priority": "u=1, i",
@@ -29,25 +30,32 @@ class BaseSpider:
         }
 
     def _request(self, url: str, params=None, data=None) -> requests.Response:
-        while True:
-            self.session.headers["user-agent"] = self.__ua.random
-            try:
-                if data:
-                    response = self.session.post(url, params=params, data=data)
-                else:
-                    response = self.session.get(url, params=params)
-                if response.status_code in [200, 404]:
-                    # time.sleep(2)
-                    return response
-                elif response.status_code == 429:
-                    print_log.warning(f"网站返回频繁,10sec后重试: {url}")
-                    time.sleep(10)
-                else:
-                    print_log.warning(
-                        f"请求{url}失败，5sec后重试，状态码：{response.status_code}，返回内容：{response.text}"
+        with metrics.timer("request"):
+            for attempt in itertools.count():
+                if attempt:
+                    metrics.inc("request_retries")
+                headers = {**self.headers, "user-agent": random_user_agent()}
+                try:
+                    if data:
+                        response = self.session.post(
+                            url, params=params, data=data, headers=headers
+                        )
+                    else:
+                        response = self.session.get(url, params=params, headers=headers)
+                    if response.status_code in [200, 404]:
+                        # time.sleep(2)
+                        return response
+                    elif response.status_code == 429:
+                        # 限速器已按Retry-After暂停并降速, 下次请求会自动等待
+                        print_log.warning(f"网站返回频繁, 等待限速器后重试: {url}")
+                    else:
+                        print_log.warning(
+                            f"请求{url}失败，5sec后重试，状态码：{response.status_code}，返回内容：{response.text}"
+                        )
+                        time.sleep(5)
+                except requests.exceptions.ConnectionError:
+                    print_log.warning(f"ConnectionError: {url}")
+                except Exception as e:
+                    print_log.error(
+                        f"请求{url}失败，错误信息：{e.__class__.__name__}：{e}"
                     )
-                    time.sleep(5)
-            except requests.exceptions.ConnectionError:
-                print_log.warning(f"ConnectionError: {url}")
-            except Exception as e:
-                print_log.error(f"请求{url}失败，错误信息：{e.__class__.__name__}：{e}")
@@ -0,0 +1,386 @@
+import asyncio
+import contextlib
+import functools
+import hashlib
+
+import aiohttp
+import openreview
+from openreview.openreview import OpenReviewException
+
+from core import attachment, pdf_text, scheduler
+from core.log_config import print_log
+from core.manifest import ARTIFACTS, manifest
+from core.metrics import metrics
+from core.openreview_client import client_pool, get_client
+from core.openreview_spider import review_document, save_review
+from core.progress import tracker
+from core.rate_limiter import parse_retry_after
+from core.retry import call_with_retry_async, dead_letter, describe
+from module.data_module import PaperPath
+
+# 单个请求连续收到429时最多重试的次数, 与RateLimitAdapter一致, 超过后按失败处理, 由core.retry退避重试
+max_throttle_retries = 5
+
+
+async def _raise_for_status(response: aiohttp.ClientResponse):
+    """与同步版本一致, 非成功状态抛出带状态码的OpenReviewException, 由core.retry判断是否重试"""
+    raise OpenReviewException(
+        {
+            "name": "Error",
+            "message": (await response.text())[:200],
+            "status": response.status,
+        }
+    )
+
+
+class AsyncPaperDownload:
+    """基于asyncio的论文下载引擎, 论文/支撑文件/评审均以协程并发获取
+
+    输出目录结构与PaperDownload一致, 两种引擎可以交替使用
+    """
+
+    def __init__(self, concurrency: int = 64):
+        self.concurrency = concurrency
+
+    @contextlib.asynccontextmanager
+    async def _open(
+        self,
+        session: aiohttp.ClientSession,
+        api_version: int,
+        path: str,
+        params,
+        headers=None,
+    ):
+        """经过共享限速器的GET请求, 429时按Retry-After等待后最多重试max_throttle_retries次,
+        401时重新登录并重试一次"""
+        reauthorized = False
+        throttled = 0
+        while True:
+            # 多个账号时每次请求(包括429后的重试)重新选择账号; 第一次使用或token过期时会同步登录, 在线程中执行
+            client = await asyncio.to_thread(get_client, api_version)
+            token = client.token
+            await asyncio.sleep(client.limiter.reserve())
+            with metrics.timer(f"http:{path}"):
+                response = await session.get(
+                    client.baseurl + path,
+                    params=params,
+                    headers={**client.headers, **(headers or {})},
+                )
+            metrics.inc("http_status", str(response.status))
+            if response.status == 401 and not reauthorized:
+                reauthorized = True
+                # 登录是同步请求, 在线程中执行, 不阻塞事件循环
+                if await asyncio.to_thread(client_pool.reauthorize, client, token):
+                    response.release()
+                    continue
+            if response.status != 429:
+                break
+            client.limiter.on_throttle(
+                parse_retry_after(response.headers.get("Retry-After"))
+            )
+            throttled += 1
+            if throttled > max_throttle_retries:
+                # 交给调用方按非成功状态抛出OpenReviewException
+                break
+            response.release()
+        if response.status < 500 and response.status != 429:
+            client.limiter.on_success()
+        try:
+            yield response
+        finally:
+            response.release()
+
+    async def _stream_attachment(
+        self,
+        session: aiohttp.ClientSession,
+        paper_info: dict,
+        field_name: str,
+        save_path,
+        max_size: int = None,
+    ):
+        """流式下载附件, 断点续传、原子重命名和大小检查逻辑与同步版本一致
+
+        Returns:
+            tuple | None: (大小, sha256), 附件不存在(404)时返回None
+        """
+        offset = attachment.resume_offset(save_path)
+        headers = {"Range": f"bytes={offset}-"} if offset else None
+        async with self._open(
+            session,
+            paper_info["api_version"],
+            "/attachment",
+            {"id": paper_info["id"], "name": field_name},
+            headers,
+        ) as response:
+            if response.status == 404:
+                return None
+            start, _ = attachment.parse_content_range(
+                response.headers.get("Content-Range")
+            )
+            if offset and (
+                response.status == 416 or (response.status == 206 and start != offset)
+            ):
+                # .part已损坏或服务端文件发生变化, 从头下载
+                attachment.part_path(save_path).unlink()
+                return await self._stream_attachment(
+                    session, paper_info, field_name, save_path, max_size
+                )
+            if response.status not in [200, 206]:
+                await _raise_for_status(response)
+            attachment.check_size(response.status, response.headers, max_size)
+            if response.status == 206:
+                mode = "ab"
+                sha256 = await asyncio.to_thread(
+                    attachment.part_hash, save_path, offset
+                )
+            else:
+                mode, sha256 = "wb", hashlib.sha256()
+            with open(attachment.part_path(save_path), mode) as f:
+                async for chunk in response.content.iter_chunked(attachment.chunk_size):
+                    f.write(chunk)
+                    sha256.update(chunk)
+                await asyncio.to_thread(attachment.fsync_file, f)
+            size = attachment.expected_size(response.status, response.headers)
+        await asyncio.to_thread(attachment.finish_part, save_path, size)
+        return save_path.stat().st_size, sha256.hexdigest()
+
+    async def _download_supplement(self, session, venue_id, paper_info, save_path):
+        """超过scheduler.large_size的支撑文件等待大文件名额后再下载, 同时下载的大文件不超过large_worker_num个
+
+        Raises:
+            AttachmentTooLarge: 超过scheduler.max_supplement_size
+        """
+        try:
+            with metrics.timer("supplement", venue_id) as timer:
+                result = await self._stream_attachment(
+                    session,
+                    paper_info,
+                    "supplementary_material",
+                    save_path,
+                    scheduler.supplement_limit(),
+                )
+                timer["size"] = result[0] if result else 0
+            return result
+        except attachment.AttachmentTooLarge as e:
+            max_size = scheduler.max_supplement_size
+            if max_size is not None and e.size > max_size:
+                raise
+        async with self._large_lane:
+            with metrics.timer("supplement", venue_id) as timer:
+                result = await self._stream_attachment(
+                    session,
+                    paper_info,
+                    "supplementary_material",
+                    save_path,
+                    scheduler.max_supplement_size,
+                )
+                timer["size"] = result[0] if result else 0
+        return result
+
+    async def _get_review(self, session: aiohttp.ClientSession, paper_info: dict):
+        """获取论文的全部评审, 格式与Note.to_json()一致"""
+        async with self._open(
+            session,
+            paper_info["api_version"],
+            "/notes",
+            {"forum": paper_info["id"]},
+        ) as response:
+            if response.status != 200:
+                await _raise_for_status(response)
+            notes = (await response.json())["notes"]
+        note_class = (
+            openreview.Note if paper_info["api_version"] == 1 else openreview.api.Note
+        )
+        return review_document([note_class.from_json(i).to_json() for i in notes])
+
+    async def _need_download(
+        self, venue_id, paper_id, states, artifact, save_path
+    ) -> bool:
+        if artifact not in states:
+            return False
+        # 清单中没有记录但文件已存在(旧版本下载的数据), 直接登记; 登记时计算整个文件的sha256, 在线程中执行
+        if states[artifact] is None and await asyncio.to_thread(
+            manifest.adopt, venue_id, paper_id, artifact, save_path
+        ):
+            tracker.adopted(venue_id)
+            if tracker.sampled(paper_id):
+                print_log.info(f"已下载过: {paper_id} {artifact}")
+            return False
+        return True
+
+    async def _attempt(self, venue_id: str, paper_info: dict, artifact: str, func):
+        """按core.retry的策略执行一个下载项, 仍然失败时记入死信队列, 不影响其他下载项和论文
+
+        Returns:
+            func的返回值, 失败时为None
+        """
+        try:
+            result = await call_with_retry_async(
+                func,
+                venue_id,
+                f"{paper_info['id']} {artifact}",
+                (aiohttp.ClientError,),
+            )
+        except Exception as e:
+            print_log.error(
+                f"下载失败, 记入死信队列: {paper_info['id']} {artifact}, {describe(e)}"
+            )
+            dead_letter.add(venue_id, paper_info, artifact, e)
+            return None
+        dead_letter.discard(venue_id, paper_info["id"], artifact)
+        return result
+
+    async def _fetch_pdf(self, session, venue_id, paper_info, save_path) -> bool:
+        """下载论文, 不存在时所有下载项记为absent并返回False"""
+        paper_id = paper_info["id"]
+        with metrics.timer("pdf", venue_id) as timer:
+            result = await self._stream_attachment(
+                session, paper_info, "pdf", save_path
+            )
+            timer["size"] = result[0] if result else 0
+        if result is None:
+            print_log.warning(f"论文不存在: {paper_id}")
+            manifest.record_many(
+                [(venue_id, paper_id, i, "absent", None, None, None) for i in ARTIFACTS]
+            )
+            return False
+        manifest.record(venue_id, paper_id, "pdf", "done", *result, save_path)
+        pdf_text.on_pdf(venue_id, paper_id, save_path, result[1])
+        if tracker.sampled(paper_id):
+            print_log.info(f"论文下载成功: {paper_id}")
+        return True
+
+    async def _fetch_supplement(self, session, venue_id, paper_info, save_path):
+        paper_id = paper_info["id"]
+        result = skipped = None
+        if save_path:
+            try:
+                result = await self._download_supplement(
+                    session, venue_id, paper_info, save_path
+                )
+            except attachment.AttachmentTooLarge as e:
+                skipped = e.size
+        if skipped is not None:
+            print_log.warning(f"支撑文件{skipped}字节超过上限, 跳过: {paper_id}")
+            manifest.record(venue_id, paper_id, "supplement", "skipped", skipped)
+        elif result is None:
+            manifest.record(venue_id, paper_id, "supplement", "absent")
+        else:
+            manifest.record(
+                venue_id, paper_id, "supplement", "done", *result, save_path
+            )
+            if tracker.sampled(paper_id):
+                print_log.info(f"支撑下载成功: {paper_id}")
+        return True
+
+    async def _fetch_review(self, session, venue_id, paper_info, paper_path):
+        with metrics.timer("review", venue_id):
+            review = await self._get_review(session, paper_info)
+        await asyncio.to_thread(
+            save_review,
+            venue_id,
+            paper_info["id"],
+            review,
+            paper_path.paper_review_save_path,
+            paper_path.year_dir,
+        )
+        if tracker.sampled(paper_info["id"]):
+            print_log.info(f"评审下载成功: {paper_info['id']}")
+        return True
+
+    async def download(
+        self,
+        session: aiohttp.ClientSession,
+        venue_id: str,
+        paper_info: dict,
+        states: dict,
+    ) -> bool:
+        """下载一篇论文剩余的项, 单个下载项失败时记入死信队列, 继续下载其余的项
+
+        Returns:
+            bool: 全部下载项都成功
+        """
+        paper_id = paper_info["id"]
+        paper_path = PaperPath(venue_id, paper_info)
+        paper_path.make_dir()
+        results = []
+        save_path = paper_path.paper_save_path
+        if await self._need_download(venue_id, paper_id, states, "pdf", save_path):
+            result = await self._attempt(
+                venue_id,
+                paper_info,
+                "pdf",
+                functools.partial(
+                    self._fetch_pdf, session, venue_id, paper_info, save_path
+                ),
+            )
+            if result is False:
+                return False
+            results.append(result)
+
+        save_path = paper_path.paper_supplement_save_path
+        if await self._need_download(
+            venue_id, paper_id, states, "supplement", save_path
+        ):
+            result = await self._attempt(
+                venue_id,
+                paper_info,
+                "supplement",
+                functools.partial(
+                    self._fetch_supplement, session, venue_id, paper_info, save_path
+                ),
+            )
+            results.append(result)
+
+        save_path = paper_path.paper_review_save_path
+        if await self._need_download(venue_id, paper_id, states, "review", save_path):
+            result = await self._attempt(
+                venue_id,
+                paper_info,
+                "review",
+                functools.partial(
+                    self._fetch_review, session, venue_id, paper_info, paper_path
+                ),
+            )
+            results.append(result)
+        return all(results)
+
+    async def run(self, venue_id: str, tasks: list) -> int:
+        """并发下载一个会议剩余的论文
+
+        Args:
+            venue_id (str): 会议id
+            tasks (list): manifest.pending()生成的(paper_info, states)列表
+
+        Returns:
+            int: 下载成功的论文数量
+        """
+        task_count = len(tasks)
+        self._large_lane = asyncio.Semaphore(scheduler.large_worker_num)
+        task_iter = iter(enumerate(tasks, 1))
+        success_count = 0
+
+        async def worker(session):
+            nonlocal success_count
+            # 所有worker共享同一个迭代器, 同时在途的任务数不超过concurrency
+            for task_index, (paper_info, states) in task_iter:
+                if tracker.sampled(paper_info["id"]):
+                    print_log.info(
+                        f"开始: {venue_id}, 第{task_index}/{task_count}个论文"
+                    )
+                if await self.download(session, venue_id, paper_info, states):
+                    success_count += 1
+                tracker.paper_done(venue_id)
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=60, sock_read=300)
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout
+        ) as session:
+            await asyncio.gather(
+                *(worker(session) for _ in range(min(self.concurrency, task_count)))
+            )
+        return success_count
+
+    def __call__(self, venue_id: str, tasks: list) -> int:
+        return asyncio.run(self.run(venue_id, tasks))
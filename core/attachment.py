@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import re
+import zipfile
+import zlib
+from pathlib import Path
+
+from openreview.openreview import OpenReviewException
+
+# 流式下载每次读取/写入的块大小, 单个下载任务的内存占用与文件大小无关
+chunk_size = 1024 * 1024
+
+
+def part_path(save_path: Path) -> Path:
+    """下载中的临时文件路径, 完整下载后才重命名为save_path"""
+    return save_path.with_name(save_path.name + ".part")
+
+
+def resume_offset(save_path: Path) -> int:
+    """已下载的字节数, 用于HTTP Range断点续传"""
+    part = part_path(save_path)
+    return part.stat().st_size if part.exists() else 0
+
+
+def parse_content_range(value: str):
+    """解析Content-Range响应头
+
+    Returns:
+        tuple: (起始位置, 文件总大小), 总大小未知时为None
+    """
+    match = re.match(r"bytes (\d+)-\d+/(\d+|\*)", value or "")
+    if not match:
+        return None, None
+    total = match.group(2)
+    return int(match.group(1)), None if total == "*" else int(total)
+
+
+def expected_size(status_code: int, headers):
+    """根据响应头计算完整文件的大小, 未知或内容经过压缩时返回None"""
+    if headers.get("Content-Encoding", "identity") != "identity":
+        return None
+    if status_code == 206:
+        return parse_content_range(headers.get("Content-Range"))[1]
+    content_length = headers.get("Content-Length")
+    return int(content_length) if content_length else None
+
+
+class AttachmentTooLarge(Exception):
+    """附件大小超过限制, 响应体没有读取"""
+
+    def __init__(self, size: int):
+        super().__init__(f"附件大小{size}字节超过限制")
+        self.size = size
+
+
+def check_size(status_code: int, headers, max_size: int = None):
+    """读取响应体之前按Content-Length/Content-Range检查完整文件的大小, 大小未知时不检查
+
+    Raises:
+        AttachmentTooLarge: 超过max_size
+    """
+    if max_size is None:
+        return
+    size = expected_size(status_code, headers)
+    if size is not None and size > max_size:
+        raise AttachmentTooLarge(size)
+
+
+def finish_part(save_path: Path, size=None):
+    """校验大小后把.part文件原子重命名为最终文件"""
+    part = part_path(save_path)
+    if size is not None and part.stat().st_size != size:
+        raise OSError(
+            f"文件不完整: {part}, 期望{size}字节, 实际{part.stat().st_size}字节"
+        )
+    os.replace(part, save_path)
+
+
+def _update_hash(sha256, path: Path) -> int:
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            sha256.update(chunk)
+            size += len(chunk)
+    return size
+
+
+def file_digest(path: Path):
+    """流式计算文件的大小与sha256
+
+    Returns:
+        tuple: (大小, sha256)
+    """
+    sha256 = hashlib.sha256()
+    size = _update_hash(sha256, path)
+    return size, sha256.hexdigest()
+
+
+def check_file(path: Path, deep: bool = False):
+    """按文件类型检查完整性: pdf的%PDF文件头和%%EOF结尾, zip的中央目录(deep时校验每个文件的CRC), JSON能否解析
+
+    Returns:
+        str | None: 损坏的原因, 正常时为None
+    """
+    size = path.stat().st_size
+    if size == 0:
+        return "空文件"
+    suffix = path.suffix.lower()
+    if suffix == ".pdf":
+        with open(path, "rb") as f:
+            head = f.read(1024)
+            f.seek(max(size - 2048, 0))
+            tail = f.read()
+        if b"%PDF-" not in head:
+            return "缺少%PDF文件头"
+        if b"%%EOF" not in tail:
+            return "缺少%%EOF结尾"
+    elif suffix == ".zip":
+        try:
+            with zipfile.ZipFile(path) as f:
+                name = f.testzip() if deep else None
+        except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+            return f"zip损坏: {e}"
+        if name is not None:
+            return f"zip中的文件损坏: {name}"
+    elif suffix == ".json":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                json.load(f)
+        except ValueError as e:
+            return f"JSON无法解析: {e}"
+    return None
+
+
+def part_hash(save_path: Path, offset: int):
+    """断点续传时用已下载的部分初始化sha256"""
+    sha256 = hashlib.sha256()
+    if offset:
+        _update_hash(sha256, part_path(save_path))
+    return sha256
+
+
+def fsync_file(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def atomic_write_bytes(save_path: Path, data: bytes):
+    """先写.part文件并fsync, 再原子重命名, 中途崩溃不会留下残缺文件
+
+    Returns:
+        tuple: (大小, sha256)
+    """
+    with open(part_path(save_path), "wb") as f:
+        f.write(data)
+        fsync_file(f)
+    finish_part(save_path)
+    return len(data), hashlib.sha256(data).hexdigest()
+
+
+def _raise_for_response(response):
+    """与openreview客户端一致, 非成功状态抛出OpenReviewException"""
+    if "application/json" in response.headers.get("Content-Type", ""):
+        error = response.json()
+    else:
+        error = {"name": "Error", "message": response.text or response.reason}
+    error.setdefault("status", response.status_code)
+    raise OpenReviewException(error)
+
+
+def stream_attachment(
+    client, paper_id: str, field_name: str, save_path: Path, max_size: int = None
+):
+    """流式下载附件, 支持断点续传, 写完fsync后原子重命名
+
+    Args:
+        client: openreview.Client或openreview.api.OpenReviewClient
+        paper_id (str): 论文id
+        field_name (str): 附件字段, pdf或supplementary_material
+        save_path (Path): 最终保存路径
+        max_size (int): 完整文件的大小上限(字节), 超过时不读取响应体
+
+    Returns:
+        tuple | None: (大小, sha256), 附件不存在(404)时返回None
+
+    Raises:
+        AttachmentTooLarge: 超过max_size
+    """
+    offset = resume_offset(save_path)
+    headers = dict(client.headers)
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+    with client.session.get(
+        client.baseurl + "/attachment",
+        params={"id": paper_id, "name": field_name},
+        headers=headers,
+        stream=True,
+        timeout=(60, 300),
+    ) as response:
+        if response.status_code == 404:
+            return None
+        start, _ = parse_content_range(response.headers.get("Content-Range"))
+        if offset and (
+            response.status_code == 416
+            or (response.status_code == 206 and start != offset)
+        ):
+            # .part已损坏或服务端文件发生变化, 从头下载
+            part_path(save_path).unlink()
+            return stream_attachment(client, paper_id, field_name, save_path, max_size)
+        if response.status_code not in [200, 206]:
+            _raise_for_response(response)
+        check_size(response.status_code, response.headers, max_size)
+        if response.status_code == 206:
+            mode, sha256 = "ab", part_hash(save_path, offset)
+        else:
+            mode, sha256 = "wb", hashlib.sha256()
+        with open(part_path(save_path), mode) as f:
+            for chunk in response.iter_content(chunk_size):
+                f.write(chunk)
+                sha256.update(chunk)
+            fsync_file(f)
+        size = expected_size(response.status_code, response.headers)
+    finish_part(save_path, size)
+    return save_path.stat().st_size, sha256.hexdigest()
@@ -0,0 +1,200 @@
+"""会议发现: 并发获取会议的group, 缓存API版本和投稿invitation, 之后的运行直接使用缓存的下载计划
+
+用法: python -m core.discovery [VENUE_ID ...]   不指定会议时使用全部会议(cache/venues.json)
+      python -m core.discovery --refresh        忽略缓存重新获取
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from openreview.openreview import OpenReviewException
+
+from core.attachment import atomic_write_bytes
+from core.log_config import print_log
+from core.metrics import metrics
+from core.openreview_client import get_client
+from core.path_config import cache_dir
+from core.retry import describe, error_status
+
+# 会议信息(API版本、投稿invitation)的有效期(秒), 过期后重新获取; 进行中的会议可能新增invitation
+ttl = 7 * 24 * 3600
+# 全部会议列表cache/venues.json的有效期(秒)
+venues_ttl = 7 * 24 * 3600
+# 并发获取group的线程数, 请求仍受共享限速器限制
+worker_num = 8
+
+plan_file_path = cache_dir / "venue_plan.json"
+
+
+def get_all_venues() -> list:
+    """获取所有的会议id列表, cache/venues.json超过venues_ttl后重新获取
+
+    Returns:
+        list: id列表
+    """
+    file_path = cache_dir / "venues.json"
+    if file_path.exists() and time.time() - file_path.stat().st_mtime < venues_ttl:
+        with open(file_path, "r", encoding="utf-8") as f:
+            venues = json.load(f)
+            return venues["members"]
+    venues = get_client(2).get_group(id="venues")
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(venues.to_json(), f, ensure_ascii=False, indent=4)
+    return venues.to_json()["members"]
+
+
+def parse_group(group):
+    """根据group判断API版本并解析获取所有论文时需要的invitation参数
+
+    Returns:
+        tuple: (API版本, invitation列表)
+    """
+    if group.domain:  # 存在domain,是V2版本
+        content = group.content or {}
+        return 2, [content[i]["value"] for i in content if i.endswith("submission_id")]
+    # 否则是V1版本, invitation写在group的网页代码中
+    return 1, re.findall("SUBMISSION_ID = '(.*?)'", group.web or "")
+
+
+def venue_missing(error: Exception) -> bool:
+    """会议不存在或没有权限(403/404), 可以缓存; 没有状态码时按错误名称判断"""
+    if error_status(error) in (403, 404):
+        return True
+    if isinstance(error, OpenReviewException) and isinstance(error.args[0], dict):
+        return error.args[0].get("name") in ("NotFoundError", "ForbiddenError")
+    return False
+
+
+def probe_venue(venue_id: str):
+    """获取一个会议的group
+
+    Returns:
+        dict | None: {"version", "submission_ids", "checked_at"}, 会议不存在(403/404)时version为None, 同样缓存;
+            限速、服务端错误、网络错误等暂时的失败返回None, 不缓存, 下次运行重新获取
+    """
+    try:
+        with metrics.timer("discovery", venue_id):
+            group = get_client(2).get_group(venue_id)
+    except Exception as e:
+        if not venue_missing(e):
+            print_log.error(f"{venue_id}: 获取会议信息失败, 本次跳过: {describe(e)}")
+            return None
+        print_log.error(f"{venue_id}: {e.args[0].get('message', e)}")
+        version, submission_ids = None, []
+    else:
+        version, submission_ids = parse_group(group)
+        print_log.info(f"{venue_id}: API版本为V{version}")
+    return {
+        "version": version,
+        "submission_ids": submission_ids,
+        "checked_at": time.time(),
+    }
+
+
+class VenuePlan:
+    """cache/venue_plan.json中缓存的会议信息, 进程内共享"""
+
+    def __init__(self, file_path=plan_file_path):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._plan = None
+
+    def _load(self) -> dict:
+        if self._plan is None:
+            self._plan = {}
+            if self.file_path.exists():
+                with open(self.file_path, "r", encoding="utf-8") as f:
+                    self._plan = json.load(f)
+        return self._plan
+
+    def _save(self):
+        atomic_write_bytes(
+            self.file_path,
+            json.dumps(self._plan, ensure_ascii=False, indent=4).encode("utf-8"),
+        )
+
+    def fresh(self, venue_id: str):
+        """没有过期的会议信息, 没有或过期时返回None"""
+        with self._lock:
+            entry = self._load().get(venue_id)
+        if entry and time.time() - entry["checked_at"] < ttl:
+            return entry
+        return None
+
+    def update(self, entries: dict):
+        with self._lock:
+            self._load().update(entries)
+            self._save()
+
+    def venue_ids(self) -> list:
+        """缓存中的全部会议id, 包括已过期的"""
+        with self._lock:
+            return list(self._load())
+
+    def get(self, venue_id: str):
+        """会议信息, 没有或过期时获取并缓存
+
+        Returns:
+            dict | None: 会议不存在时为None
+        """
+        entry = self.fresh(venue_id)
+        if entry is None:
+            entry = probe_venue(venue_id)
+            if entry is None:
+                return None
+            self.update({venue_id: entry})
+        return entry if entry["version"] else None
+
+    def discover(self, venue_list, refresh: bool = False) -> dict:
+        """并发获取没有缓存或已过期的会议, 一次写入缓存
+
+        Returns:
+            dict: {venue_id: 会议信息}, 不包含无法获取的会议
+        """
+        plan = {}
+        todo = []
+        for venue_id in venue_list:
+            entry = None if refresh else self.fresh(venue_id)
+            if entry is None:
+                todo.append(venue_id)
+            else:
+                plan[venue_id] = entry
+        if todo:
+            with ThreadPoolExecutor(
+                max_workers=worker_num, thread_name_prefix="发现"
+            ) as executor:
+                entries = dict(zip(todo, executor.map(probe_venue, todo)))
+            # 暂时失败的会议不缓存, 下次运行重新获取
+            entries = {k: v for k, v in entries.items() if v is not None}
+            self.update(entries)
+            plan.update(entries)
+        plan = {k: v for k, v in plan.items() if v["version"]}
+        print_log.info(
+            f"会议发现: 共{len(venue_list)}个会议, 使用缓存{len(venue_list) - len(todo)}个, "
+            f"获取{len(todo)}个, 无法获取{len(venue_list) - len(plan)}个"
+        )
+        return plan
+
+
+# 进程内共享的会议信息缓存
+venue_plan = VenuePlan()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("venue_ids", nargs="*", metavar="VENUE_ID")
+    parser.add_argument("--refresh", action="store_true", help="忽略缓存重新获取")
+    args = parser.parse_args()
+    plan = venue_plan.discover(args.venue_ids or get_all_venues(), args.refresh)
+    for venue_id, entry in sorted(plan.items()):
+        print(f"V{entry['version']} {len(entry['submission_ids']):>3} {venue_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""列式导出: 论文列表与评审展开为带类型的Arrow表, 按会议和年份分区写入Parquet(需要安装pyarrow)
+
+输出为hive分区目录export/<papers|reviews>/venue=<会议>/year=<年份>/part-0.parquet,
+可以用pandas.read_parquet("export/reviews")、pyarrow.dataset或duckdb直接读取全部历史;
+只重写输入(论文标题、评审sha256)有变化的分区, 状态保存在export/_state.json
+
+用法: python -m core.export [VENUE_ID ...]   不指定会议时导出下载清单中的全部会议
+      --full  忽略上次导出的状态, 重写全部分区
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from core.attachment import atomic_write_bytes, part_path
+from core.log_config import print_log
+from core.manifest import manifest
+from core.metrics import metrics
+from core.openreview_spider import OpenReviewSpider
+from core.search import RATING_FIELDS, content_value, load_review, parse_number
+
+# 每个会议下载结束后是否增量导出
+enabled = False
+# 导出目录
+export_dir = Path("export")
+
+# 评审中作为置信度的字段
+CONFIDENCE_FIELDS = ("confidence",)
+# 表结构变化时修改, 所有分区在下次导出时重写
+SCHEMA_VERSION = 1
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("导出Parquet需要安装pyarrow") from e
+    return pyarrow
+
+
+def schemas(pa) -> dict:
+    """papers与reviews表的结构, 分区列venue和year不写入文件"""
+    return {
+        "papers": pa.schema(
+            [
+                ("paper_id", pa.string()),
+                ("venue_id", pa.string()),
+                ("title", pa.string()),
+                ("api_version", pa.int8()),
+                ("supplementary_type", pa.string()),
+                ("decision", pa.string()),
+                ("review_count", pa.int32()),
+                ("rating_mean", pa.float64()),
+                ("rating_min", pa.float64()),
+                ("rating_max", pa.float64()),
+                ("confidence_mean", pa.float64()),
+            ]
+        ),
+        "reviews": pa.schema(
+            [
+                ("paper_id", pa.string()),
+                ("note_id", pa.string()),
+                ("venue_id", pa.string()),
+                ("invitation", pa.string()),
+                ("signature", pa.string()),
+                ("rating", pa.float64()),
+                ("confidence", pa.float64()),
+            ]
+        ),
+    }
+
+
+def _first_number(values: dict, fields: tuple):
+    for field in fields:
+        if field in values:
+            number = parse_number(values[field])
+            if number is not None:
+                return number
+    return None
+
+
+def _mean(numbers: list):
+    return sum(numbers) / len(numbers) if numbers else None
+
+
+def flatten(venue_id: str, paper_info: dict, review) -> tuple:
+    """把一篇论文展开为papers表的一行和reviews表的多行
+
+    有评分或置信度的回复作为评审; 没有决定note时使用投稿的venue字段作为决定
+
+    Args:
+        review (list | None): forum下全部note的to_json()结果, 没有下载评审时为None
+
+    Returns:
+        tuple: (papers的行, reviews的行列表)
+    """
+    decision = venue = None
+    rows = []
+    for note in review or []:
+        values = {
+            key: content_value(value)
+            for key, value in (note.get("content") or {}).items()
+        }
+        if values.get("decision") is not None:
+            decision = str(values["decision"])
+        if note.get("id") == paper_info["id"]:
+            venue = values.get("venue")
+            continue
+        rating = _first_number(values, RATING_FIELDS)
+        confidence = _first_number(values, CONFIDENCE_FIELDS)
+        if rating is None and confidence is None:
+            continue
+        # V1为invitation, V2为invitations列表
+        invitations = note.get("invitations") or [note.get("invitation")]
+        signatures = note.get("signatures") or [None]
+        rows.append(
+            {
+                "paper_id": paper_info["id"],
+                "note_id": note.get("id"),
+                "venue_id": venue_id,
+                "invitation": invitations[0],
+                "signature": signatures[0],
+                "rating": rating,
+                "confidence": confidence,
+            }
+        )
+    ratings = [i["rating"] for i in rows if i["rating"] is not None]
+    confidences = [i["confidence"] for i in rows if i["confidence"] is not None]
+    paper = {
+        "paper_id": paper_info["id"],
+        "venue_id": venue_id,
+        "title": paper_info["title"],
+        "api_version": paper_info["api_version"],
+        "supplementary_type": paper_info["supplementary_type"] or None,
+        "decision": decision or (str(venue) if venue else None),
+        "review_count": len(rows),
+        "rating_mean": _mean(ratings),
+        "rating_min": min(ratings, default=None),
+        "rating_max": max(ratings, default=None),
+        "confidence_mean": _mean(confidences),
+    }
+    return paper, rows
+
+
+class ParquetExporter:
+    """按会议和年份分区增量导出Parquet"""
+
+    def __init__(self, directory: Path = None):
+        self._directory = directory
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> Path:
+        """没有指定时使用模块的export_dir, 可以在main.py中修改"""
+        return self._directory or export_dir
+
+    @property
+    def state_path(self) -> Path:
+        return self.directory / "_state.json"
+
+    def _load_state(self) -> dict:
+        if not self.state_path.exists():
+            return {}
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def partition_path(self, table: str, venue_id: str, year: str) -> Path:
+        venue = venue_id.replace("/", "_")
+        return (
+            self.directory
+            / table
+            / f"venue={venue}"
+            / f"year={year}"
+            / "part-0.parquet"
+        )
+
+    def _write_partition(self, venue_id: str, year: str, papers: list, reviews: dict):
+        pa = _import_pyarrow()
+        paper_rows, review_rows = [], []
+        for paper_info in papers:
+            review = None
+            if paper_info["id"] in reviews:
+                review = load_review(paper_info["id"], reviews[paper_info["id"]][1])
+            paper, rows = flatten(venue_id, paper_info, review)
+            paper_rows.append(paper)
+            review_rows.extend(rows)
+        for table, rows in (("papers", paper_rows), ("reviews", review_rows)):
+            schema = schemas(pa)[table]
+            save_path = self.partition_path(table, venue_id, year)
+            save_path.parent.mkdir(parents=True, exist_ok=True)
+            # 先写.part再原子重命名, 读取方不会看到写了一半的文件
+            pa.parquet.write_table(
+                pa.Table.from_pylist(rows, schema=schema), part_path(save_path)
+            )
+            os.replace(part_path(save_path), save_path)
+
+    def export_venue(self, venue_id: str, full: bool = False) -> int:
+        """导出一个会议, 只重写论文标题或评审sha256有变化的年份分区
+
+        Returns:
+            int: 重写的分区数量
+        """
+        paper_index = OpenReviewSpider(venue_id).load_paper_list()
+        if not paper_index.exists():
+            return 0
+        reviews = {
+            paper_id: (sha256, path)
+            for paper_id, sha256, path in manifest.done(venue_id, "review")
+        }
+        partitions = {}
+        for paper in paper_index:
+            partitions.setdefault(paper["year"], []).append(paper)
+        written = 0
+        with self._lock, metrics.timer("export", venue_id):
+            state = self._load_state()
+            for year, papers in sorted(partitions.items()):
+                digest = hashlib.sha256(f"{SCHEMA_VERSION}\n".encode("utf-8"))
+                for paper in papers:
+                    sha256 = reviews.get(paper["id"], ("",))[0]
+                    digest.update(
+                        f"{paper['id']}\t{paper['title']}\t{sha256}\n".encode("utf-8")
+                    )
+                key = f"{venue_id}|{year}"
+                exists = all(
+                    self.partition_path(table, venue_id, year).exists()
+                    for table in ("papers", "reviews")
+                )
+                if not full and exists and state.get(key) == digest.hexdigest():
+                    continue
+                self._write_partition(venue_id, year, papers, reviews)
+                state[key] = digest.hexdigest()
+                written += 1
+            self.directory.mkdir(parents=True, exist_ok=True)
+            atomic_write_bytes(
+                self.state_path,
+                json.dumps(state, ensure_ascii=False, indent=4).encode("utf-8"),
+            )
+        print_log.info(
+            f"{venue_id}: Parquet导出{written}/{len(partitions)}个年份分区有变化"
+        )
+        return written
+
+
+# 进程内共享的导出器
+exporter = ParquetExporter()
+
+
+def export_venue(venue_id: str):
+    """会议下载结束后增量导出, 出错不影响下载"""
+    if not enabled:
+        return
+    try:
+        exporter.export_venue(venue_id)
+    except Exception as e:
+        print_log.error(f"{venue_id}: Parquet导出失败: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("venue_ids", nargs="*", metavar="VENUE_ID")
+    parser.add_argument("--full", action="store_true", help="重写全部分区")
+    args = parser.parse_args()
+    for venue_id in args.venue_ids or manifest.venues():
+        exporter.export_venue(venue_id, args.full)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import threading
+import time
+
+import requests
+from fake_useragent import UserAgent
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from core.rate_limiter import RateLimitAdapter, mount_rate_limiter, rate_limiter
+
+# 每个host保持的长连接数, 应不小于下载线程数
+pool_size = 16
+# 是否使用HTTP/2(需要安装httpx[http2]), 单个连接多路复用
+http2 = False
+
+_session = None
+_session_lock = threading.Lock()
+# 使用单独限速器的session(每个账号一个): [(session, limiter)]
+_limited_sessions = []
+_user_agent = None
+_user_agent_lock = threading.Lock()
+
+
+class ConnectionStats:
+    """统计请求数、新建连接数与建连(TCP+TLS握手)耗时, 估算连接复用节省的时间"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_count = 0
+        self.connection_count = 0
+        self.connect_seconds = 0.0
+
+    def on_request(self):
+        with self._lock:
+            self.request_count += 1
+
+    def on_connect(self, seconds: float):
+        with self._lock:
+            self.connection_count += 1
+            self.connect_seconds += seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            handshakes_avoided = max(0, self.request_count - self.connection_count)
+            avg_connect = self.connect_seconds / max(1, self.connection_count)
+            saved_seconds = handshakes_avoided * avg_connect
+            return {
+                "request_count": self.request_count,
+                "connection_count": self.connection_count,
+                "handshakes_avoided": handshakes_avoided,
+                "avg_handshake_ms": round(avg_connect * 1000, 2),
+                "saved_seconds": round(saved_seconds, 3),
+                "saved_ms_per_request": round(
+                    saved_seconds * 1000 / max(1, self.request_count), 2
+                ),
+            }
+
+
+connection_stats = ConnectionStats()
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        connection_stats.on_connect(time.perf_counter() - start)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        connection_stats.on_connect(time.perf_counter() - start)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+    def _make_request(self, *args, **kwargs):
+        connection_stats.on_request()
+        return super()._make_request(*args, **kwargs)
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+    def _make_request(self, *args, **kwargs):
+        connection_stats.on_request()
+        return super()._make_request(*args, **kwargs)
+
+
+class PooledAdapter(RateLimitAdapter):
+    """keep-alive连接池适配器, 记录连接复用情况"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class _Http2Raw:
+    """把httpx的响应包装成requests.Response.raw需要的接口"""
+
+    def __init__(self, response):
+        self._response = response
+        self._chunks = None
+        self._buffer = b""
+
+    def stream(self, chunk_size, decode_content=True):
+        try:
+            yield from self._response.iter_bytes(chunk_size)
+        finally:
+            self._response.close()
+
+    def read(self, amt=None):
+        if self._chunks is None:
+            self._chunks = self._response.iter_bytes()
+        while amt is None or len(self._buffer) < amt:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if amt is None:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        return data
+
+    def close(self):
+        self._response.close()
+
+    def release_conn(self):
+        self.close()
+
+
+class Http2Adapter(RateLimitAdapter):
+    """使用httpx发送HTTP/2请求的适配器, 同一host的请求在一个连接上多路复用"""
+
+    def __init__(self, limiter, pool_maxsize: int = pool_size, **kwargs):
+        try:
+            import httpx
+        except ImportError as e:
+            raise ImportError("HTTP/2模式需要安装httpx[http2]") from e
+        self._httpx = httpx
+        self._client = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=None, max_keepalive_connections=pool_maxsize
+            ),
+        )
+        kwargs.pop("pool_connections", None)
+        super().__init__(limiter, **kwargs)
+
+    def _send_once(self, request, stream=False, timeout=None, verify=True, **kwargs):
+        if isinstance(timeout, tuple):
+            timeout = self._httpx.Timeout(timeout[1], connect=timeout[0])
+        else:
+            timeout = self._httpx.Timeout(timeout)
+        connection_stats.on_request()
+        httpx_request = self._client.build_request(
+            request.method,
+            request.url,
+            headers=dict(request.headers),
+            content=request.body,
+            timeout=timeout,
+        )
+        httpx_response = self._client.send(httpx_request, stream=True)
+        response = requests.Response()
+        response.status_code = httpx_response.status_code
+        response.headers = CaseInsensitiveDict(httpx_response.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.reason = httpx_response.reason_phrase
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.raw = _Http2Raw(httpx_response)
+        return response
+
+    def close(self):
+        self._client.close()
+        super().close()
+
+
+def _mount_adapter(session: requests.Session, limiter=rate_limiter):
+    """挂载新的适配器, 关闭被替换的适配器, 释放其中的空闲连接(HTTP/2为httpx客户端)"""
+    old_adapters = set(session.adapters.values())
+    if http2:
+        mount_rate_limiter(
+            session, limiter, adapter_class=Http2Adapter, pool_maxsize=pool_size
+        )
+    else:
+        mount_rate_limiter(
+            session,
+            limiter,
+            adapter_class=PooledAdapter,
+            pool_connections=10,
+            pool_maxsize=pool_size,
+        )
+    for adapter in old_adapters - set(session.adapters.values()):
+        adapter.close()
+
+
+def configure_pool(size: int = None, use_http2: bool = None):
+    """修改连接池参数, 已创建的session会重新挂载适配器并关闭原来的适配器"""
+    global pool_size, http2
+    with _session_lock:
+        if size is not None:
+            pool_size = size
+        if use_http2 is not None:
+            http2 = use_http2
+        if _session is not None:
+            _mount_adapter(_session)
+        for session, limiter in _limited_sessions:
+            _mount_adapter(session, limiter)
+
+
+def get_session() -> requests.Session:
+    """获取进程内共享的requests.Session, 连接池线程安全且保持长连接"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _mount_adapter(_session)
+    return _session
+
+
+def new_session(limiter) -> requests.Session:
+    """创建经过指定限速器的session, 连接池参数与共享session一致, 用于多账号时每个账号单独限速"""
+    session = requests.Session()
+    with _session_lock:
+        _mount_adapter(session, limiter)
+        _limited_sessions.append((session, limiter))
+    return session
+
+
+def random_user_agent() -> str:
+    """随机User-Agent, UserAgent的数据每个进程只加载一次"""
+    global _user_agent
+    with _user_agent_lock:
+        if _user_agent is None:
+            _user_agent = UserAgent()
+    return _user_agent.random
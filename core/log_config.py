@@ -1,3 +1,4 @@
+import multiprocessing
 import os
 import sys
 from pathlib import Path
@@ -6,15 +7,20 @@ from loguru import logger as print_log
 
 __max_old_log_num = 10  # 只保存10个日志
 __log_directory = Path(Path.cwd() / "./logs")
-Path.mkdir(__log_directory, exist_ok=True)  # 创建日志文件夹
+# multiprocessing的子进程(如spawn方式启动的PDF文本提取进程)会重新导入本模块, 不创建日志文件也不清理旧日志
+# 子进程导入主模块时parent_process()还没有设置, 进程名已经设置
+__is_child_process = multiprocessing.current_process().name != "MainProcess"
 
-# 删除多余的日志
-__old_log_list = sorted(__log_directory.glob("*.log"))
-__total_log_num = len(__old_log_list)
-if __total_log_num > __max_old_log_num:
-    __difference_num = __total_log_num - __max_old_log_num
-    for log in __old_log_list[: __difference_num + 1]:
-        os.remove(log)
+if not __is_child_process:
+    Path.mkdir(__log_directory, exist_ok=True)  # 创建日志文件夹
+
+    # 删除多余的日志
+    __old_log_list = sorted(__log_directory.glob("*.log"))
+    __total_log_num = len(__old_log_list)
+    if __total_log_num > __max_old_log_num:
+        __difference_num = __total_log_num - __max_old_log_num
+        for log in __old_log_list[: __difference_num + 1]:
+            os.remove(log)
 
 
 print_log.remove()  # 移除默认日志处理器
@@ -31,18 +37,19 @@ __console_log_format = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <blue>{threa
 __file_log_format = "{time:YYYY-MM-DD HH:mm:ss} | {process.name} | {thread.name} | {file:>10}:{line}:{function}() | {level} : {message}"
 
 # 添加文件日志处理器
-print_log.add(
-    sink=__log_directory / "log_{time:YYYY-MM-DD HH-mm-ss}.log",
-    # sink=sys.stdout,
-    level="DEBUG",  # 级别
-    format=__file_log_format,
-    rotation="20 MB",  # 设置大小
-    retention=20,
-    encoding="utf-8",
-    enqueue=True,
-    backtrace=True,  # 记录堆栈
-    diagnose=True,  # 堆栈跟踪
-)
+if not __is_child_process:
+    print_log.add(
+        sink=__log_directory / "log_{time:YYYY-MM-DD HH-mm-ss}.log",
+        # sink=sys.stdout,
+        level="DEBUG",  # 级别
+        format=__file_log_format,
+        rotation="20 MB",  # 设置大小
+        retention=20,
+        encoding="utf-8",
+        enqueue=True,
+        backtrace=True,  # 记录堆栈
+        diagnose=True,  # 堆栈跟踪
+    )
 
 # 添加控制台日志处理器
 print_log.add(
@@ -51,7 +58,7 @@ print_log.add(
     # level="DEBUG",
     format=__console_log_format,
     colorize=True,
-    enqueue=True,
+    enqueue=not __is_child_process,
 )
 # print_log.debug("test")
 # print_log.info("test")
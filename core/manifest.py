@@ -0,0 +1,231 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from core.attachment import check_file, file_digest
+from core.path_config import cache_dir
+
+# 每篇论文分别记录的下载项
+ARTIFACTS = ("pdf", "supplement", "review")
+# 已完成的状态: done 已下载, absent 服务端不存在(没有支撑文件或404)
+# 另有skipped: 支撑文件超过大小上限没有下载, 之后每次运行重新检查大小
+FINISHED_STATES = ("done", "absent")
+
+
+class DownloadManifest:
+    """SQLite(WAL模式)下载清单, 按会议、论文id和下载项分别记录状态、大小、哈希和时间
+
+    每个线程使用独立的连接, 多个下载线程可以同时写入
+    """
+
+    def __init__(self, db_path: Path = cache_dir / "manifest.sqlite3"):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=60)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS artifact (
+                    venue_id TEXT NOT NULL,
+                    paper_id TEXT NOT NULL,
+                    artifact TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    size INTEGER,
+                    sha256 TEXT,
+                    path TEXT,
+                    updated_at REAL NOT NULL,
+                    format INTEGER,
+                    PRIMARY KEY (venue_id, paper_id, artifact)
+                ) WITHOUT ROWID
+                """)
+            columns = [i[1] for i in conn.execute("PRAGMA table_info(artifact)")]
+            if "format" not in columns:
+                # 旧版本的清单没有format列, 已有的记录为NULL, 即第1版格式
+                conn.execute("ALTER TABLE artifact ADD COLUMN format INTEGER")
+            self._local.conn = conn
+        return conn
+
+    def record(
+        self,
+        venue_id: str,
+        paper_id: str,
+        artifact: str,
+        state: str,
+        size: int = None,
+        sha256: str = None,
+        path: Path = None,
+        file_format: int = None,
+    ):
+        """记录一个下载项的状态
+
+        Args:
+            file_format (int): 文件内容的格式版本, 目前只用于评审(openreview_spider.REVIEW_FORMAT)
+        """
+        self.record_many(
+            [(venue_id, paper_id, artifact, state, size, sha256, path, file_format)]
+        )
+
+    def record_many(self, rows: list):
+        """在一个事务中记录多个下载项, 每行为(venue_id, paper_id, artifact, state, size, sha256, path),
+        可以再加上format"""
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO artifact (venue_id, paper_id, artifact, state, "
+                "size, sha256, path, updated_at, format) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        *row[:6],
+                        str(row[6]) if row[6] else None,
+                        now,
+                        row[7] if len(row) > 7 else None,
+                    )
+                    for row in rows
+                ],
+            )
+
+    def adopt(self, venue_id: str, paper_id: str, artifact: str, path: Path) -> bool:
+        """清单中没有记录但文件已存在(旧版本下载的数据)且检查完整时, 直接登记为已完成"""
+        if path is None or not path.exists() or check_file(path):
+            return False
+        size, sha256 = file_digest(path)
+        self.record(venue_id, paper_id, artifact, "done", size, sha256, path)
+        return True
+
+    def get(self, venue_id: str, paper_id: str, artifact: str):
+        """一个下载项的记录
+
+        Returns:
+            tuple | None: (state, size, sha256, path, format), 没有记录时为None
+        """
+        return (
+            self._connect()
+            .execute(
+                "SELECT state, size, sha256, path, format FROM artifact "
+                "WHERE venue_id = ? AND paper_id = ? AND artifact = ?",
+                (venue_id, paper_id, artifact),
+            )
+            .fetchone()
+        )
+
+    def get_states(self, venue_id: str) -> dict:
+        """一次查询一个会议所有下载项的状态
+
+        Returns:
+            dict: {paper_id: {artifact: state}}
+        """
+        states = {}
+        rows = self._connect().execute(
+            "SELECT paper_id, artifact, state FROM artifact WHERE venue_id = ?",
+            (venue_id,),
+        )
+        for paper_id, artifact, state in rows:
+            states.setdefault(paper_id, {})[artifact] = state
+        return states
+
+    def pending(self, venue_id: str, paper_list, artifacts=ARTIFACTS):
+        """根据清单生成剩余的下载任务, 只考虑artifacts中的下载项
+
+        Yields:
+            tuple: (paper_info, {artifact: state}), state为None表示清单中没有记录
+        """
+        states = self.get_states(venue_id)
+        for paper_info in paper_list:
+            paper_states = states.get(paper_info["id"], {})
+            todo = {
+                i: paper_states.get(i)
+                for i in artifacts
+                if paper_states.get(i) not in FINISHED_STATES
+            }
+            if todo:
+                yield paper_info, todo
+
+    def done(self, venue_id: str, artifact: str):
+        """一个会议某个下载项已完成的记录
+
+        Yields:
+            tuple: (paper_id, sha256, path)
+        """
+        yield from self._connect().execute(
+            "SELECT paper_id, sha256, path FROM artifact "
+            "WHERE venue_id = ? AND artifact = ? AND state = 'done'",
+            (venue_id, artifact),
+        )
+
+    def venues(self) -> list:
+        """清单中出现过的全部会议"""
+        rows = self._connect().execute("SELECT DISTINCT venue_id FROM artifact")
+        return [venue_id for (venue_id,) in rows]
+
+    def rows(self):
+        """全部记录, 格式与record_many的参数一致(包括format)"""
+        yield from self._connect().execute(
+            "SELECT venue_id, paper_id, artifact, state, size, sha256, path, format "
+            "FROM artifact"
+        )
+
+    def merge(self, db_path: Path) -> int:
+        """把另一个下载清单(如分片目录中的)合并进来, 只替换比本清单更新(updated_at更大)的记录,
+        保留原来的updated_at; 合并后清空对方, 重复合并不会用旧记录覆盖之后的状态
+
+        Returns:
+            int: 替换或新增的记录数
+        """
+        other = DownloadManifest(db_path)._connect()
+        try:
+            with other:
+                rows = other.execute(
+                    "SELECT venue_id, paper_id, artifact, state, size, sha256, path, "
+                    "updated_at, format FROM artifact"
+                ).fetchall()
+                other.execute("DELETE FROM artifact")
+        finally:
+            other.close()
+        conn = self._connect()
+        with conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT INTO artifact (venue_id, paper_id, artifact, state, size, "
+                "sha256, path, updated_at, format) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (venue_id, paper_id, artifact) DO UPDATE SET "
+                "state = excluded.state, size = excluded.size, sha256 = excluded.sha256, "
+                "path = excluded.path, updated_at = excluded.updated_at, "
+                "format = excluded.format "
+                "WHERE excluded.updated_at > artifact.updated_at",
+                rows,
+            )
+            return conn.total_changes - before
+
+    def mark_stale(self, venue_id: str, paper_ids, artifacts=ARTIFACTS):
+        """把已完成的下载项标记为过期, 下次运行时重新下载"""
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "UPDATE artifact SET state = 'stale', updated_at = ? "
+                "WHERE venue_id = ? AND paper_id = ? AND artifact = ?",
+                [
+                    (time.time(), venue_id, paper_id, artifact)
+                    for paper_id in paper_ids
+                    for artifact in artifacts
+                ],
+            )
+
+    def stats(self, venue_id: str) -> dict:
+        """各下载项各状态的数量"""
+        rows = self._connect().execute(
+            "SELECT artifact, state, COUNT(*) FROM artifact "
+            "WHERE venue_id = ? GROUP BY artifact, state",
+            (venue_id,),
+        )
+        return {f"{artifact}:{state}": count for artifact, state, count in rows}
+
+
+# 进程内共享的下载清单
+manifest = DownloadManifest()
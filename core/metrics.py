@@ -0,0 +1,176 @@
+import contextlib
+import json
+import threading
+import time
+from pathlib import Path
+
+from core.attachment import atomic_write_bytes
+from core.log_config import print_log
+from core.path_config import cache_dir
+
+# 耗时直方图的分桶上界(秒)
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Histogram:
+    """固定分桶的耗时直方图, 分位数按桶上界估算"""
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.bytes = 0
+
+    def observe(self, seconds: float, size: int = 0):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                break
+        else:
+            i = len(BUCKETS)
+        self.bucket_counts[i] += 1
+        self.count += 1
+        self.sum += seconds
+        self.bytes += size
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        total = 0
+        for i, count in enumerate(self.bucket_counts):
+            total += count
+            if total >= rank:
+                return BUCKETS[i] if i < len(BUCKETS) else float("inf")
+        return float("inf")
+
+
+class Metrics:
+    """按阶段和会议统计耗时直方图、计数器, 导出为Prometheus文本文件与JSON快照
+
+    阶段: request(BaseSpider._request), http:<路径>(每个HTTP请求), list(论文列表分页),
+    harvest(批量评审分页), pdf, supplement, review(获取评审), write(写入评审)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.start_time = time.time()
+        self.histograms = {}  # {(stage, venue_id): Histogram}
+        self.counters = {}  # {(name, label): int}
+        self._gauges = {}  # {name: 返回dict的函数}
+        self._export_thread = None
+        self._stop_event = threading.Event()
+
+    def observe(self, stage: str, seconds: float, venue_id: str = "", size: int = 0):
+        with self._lock:
+            histogram = self.histograms.get((stage, venue_id))
+            if histogram is None:
+                histogram = self.histograms[(stage, venue_id)] = Histogram()
+            histogram.observe(seconds, size)
+
+    @contextlib.contextmanager
+    def timer(self, stage: str, venue_id: str = ""):
+        """统计代码块的耗时, 块内可以给yield的dict设置size(字节数)"""
+        result = {"size": 0}
+        start = time.perf_counter()
+        try:
+            yield result
+        finally:
+            self.observe(stage, time.perf_counter() - start, venue_id, result["size"])
+
+    def inc(self, name: str, label: str = "", value: float = 1):
+        with self._lock:
+            self.counters[(name, label)] = self.counters.get((name, label), 0) + value
+
+    def counter(self, name: str, label: str = "") -> float:
+        with self._lock:
+            return self.counters.get((name, label), 0)
+
+    def register_gauges(self, name: str, func):
+        """导出时调用func获取当前值, 如限速器和连接池的stats"""
+        self._gauges[name] = func
+
+    def snapshot(self) -> dict:
+        elapsed = max(time.time() - self.start_time, 1e-9)
+        with self._lock:
+            stages = {}
+            for (stage, venue_id), h in sorted(self.histograms.items()):
+                stages.setdefault(stage, {})[venue_id or "-"] = {
+                    "count": h.count,
+                    "per_second": round(h.count / elapsed, 3),
+                    "bytes_per_second": round(h.bytes / elapsed, 1),
+                    "avg": round(h.sum / h.count, 4) if h.count else 0,
+                    "p50": h.quantile(0.5),
+                    "p99": h.quantile(0.99),
+                }
+            counters = {}
+            for (name, label), value in sorted(self.counters.items()):
+                counters.setdefault(name, {})[label or "-"] = value
+        return {
+            "time": time.time(),
+            "elapsed": round(elapsed, 3),
+            "stages": stages,
+            "counters": counters,
+            "gauges": {name: func() for name, func in self._gauges.items()},
+        }
+
+    def prometheus_text(self) -> str:
+        lines = [
+            "# TYPE openreview_stage_seconds histogram",
+        ]
+        with self._lock:
+            for (stage, venue_id), h in sorted(self.histograms.items()):
+                labels = f'stage="{stage}",venue="{venue_id}"'
+                total = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), h.bucket_counts):
+                    total += count
+                    lines.append(
+                        f'openreview_stage_seconds_bucket{{{labels},le="{bound}"}} {total}'
+                    )
+                lines.append(f"openreview_stage_seconds_sum{{{labels}}} {h.sum}")
+                lines.append(f"openreview_stage_seconds_count{{{labels}}} {h.count}")
+                lines.append(f"openreview_stage_bytes_total{{{labels}}} {h.bytes}")
+            for (name, label), value in sorted(self.counters.items()):
+                lines.append(f'openreview_{name}_total{{label="{label}"}} {value}')
+        for name, func in self._gauges.items():
+            for key, value in func().items():
+                if isinstance(value, (int, float)):
+                    lines.append(f"openreview_{name}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(
+        self,
+        prometheus_path: Path = cache_dir / "metrics.prom",
+        json_path: Path = cache_dir / "metrics.json",
+    ):
+        """原子写入Prometheus文本文件(可供node_exporter的textfile收集器读取)和JSON快照"""
+        atomic_write_bytes(prometheus_path, self.prometheus_text().encode("utf-8"))
+        atomic_write_bytes(
+            json_path,
+            json.dumps(self.snapshot(), ensure_ascii=False, indent=4).encode("utf-8"),
+        )
+
+    def start_export(self, interval: float = 30):
+        """后台线程每interval秒导出一次"""
+
+        def run():
+            while not self._stop_event.wait(interval):
+                try:
+                    self.export()
+                except OSError as e:
+                    print_log.warning(f"导出统计失败: {e}")
+
+        self._stop_event.clear()
+        self._export_thread = threading.Thread(target=run, name="指标", daemon=True)
+        self._export_thread.start()
+
+    def stop_export(self):
+        """停止后台导出并导出最终结果"""
+        if self._export_thread is not None:
+            self._stop_event.set()
+            self._export_thread.join()
+            self._export_thread = None
+        self.export()
+
+
+# 进程内共享的统计
+metrics = Metrics()
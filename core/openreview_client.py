@@ -0,0 +1,330 @@
+import itertools
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import jwt
+import openreview
+from openreview.openreview import OpenReviewException
+
+from core.attachment import atomic_write_bytes
+from core.http_pool import get_session, new_session
+from core.log_config import print_log
+from core.metrics import metrics
+from core.path_config import cache_dir
+from core.rate_limiter import AdaptiveRateLimiter, rate_limiter
+
+BASEURLS = {1: "https://api.openreview.net", 2: "https://api2.openreview.net"}
+ENV_CREDENTIALS = ("OPENREVIEW_USERNAME", "OPENREVIEW_PASSWORD")
+# 账号配置文件, 环境变量OPENREVIEW_USERNAME/OPENREVIEW_PASSWORD优先
+config_file_path = Path(os.environ.get("OPENREVIEW_CONFIG", "config.json"))
+# 多账号配置文件, 格式为[{"username": "...", "password": "..."}, ...], 存在时请求分配到各账号, 每个账号单独限速
+accounts_file_path = Path(os.environ.get("OPENREVIEW_ACCOUNTS", "accounts.json"))
+# 登录后的token缓存, 过期前的运行直接复用, 不再登录
+token_file_path = cache_dir / "openreview_token.json"
+# token剩余有效期不足该秒数时重新登录
+token_margin = 300
+# 登录遇到"链接过多"等错误时的重试次数与间隔
+login_retries = 5
+login_retry_seconds = 30
+
+_tokens_lock = threading.Lock()
+
+
+def load_credentials():
+    """读取OpenReview账号, 都没有配置时返回(None, None), 以匿名方式访问公开数据
+
+    Returns:
+        tuple: (username, password)
+    """
+    username, password = (os.environ.get(i) for i in ENV_CREDENTIALS)
+    if not (username and password) and config_file_path.exists():
+        with open(config_file_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        username = username or config.get("username")
+        password = password or config.get("password")
+    return username, password
+
+
+def load_accounts() -> list:
+    """读取全部账号, 环境变量中的账号优先, 其次是accounts.json, 最后是config.json中的单个账号
+
+    Returns:
+        list: [(username, password)], 没有配置账号时为[(None, None)]
+    """
+    username, password = (os.environ.get(i) for i in ENV_CREDENTIALS)
+    if username and password:
+        return [(username, password)]
+    if accounts_file_path.exists():
+        with open(accounts_file_path, "r", encoding="utf-8") as f:
+            accounts = [(i["username"], i["password"]) for i in json.load(f)]
+        if accounts:
+            return accounts
+    return [load_credentials()]
+
+
+def _load_tokens() -> dict:
+    if not token_file_path.exists():
+        return {}
+    with open(token_file_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_tokens(tokens: dict):
+    atomic_write_bytes(token_file_path, json.dumps(tokens).encode("utf-8"))
+    os.chmod(token_file_path, 0o600)
+
+
+def _token_expiry(token: str) -> float:
+    """token的过期时间, 无法解析时为0"""
+    try:
+        user = jwt.decode(token, options={"verify_signature": False})
+    except jwt.PyJWTError:
+        return 0
+    return user.get("exp", 0)
+
+
+def _token_valid(token: str) -> bool:
+    return _token_expiry(token) > time.time() + token_margin
+
+
+def _use_token(client, token: str):
+    """与openreview客户端登录后的状态一致, 但不请求profile"""
+    client.token = token
+    client.headers["Authorization"] = "Bearer " + token
+    client.user = jwt.decode(token, options={"verify_signature": False})
+
+
+def _login(client, username: str, password: str):
+    for retry in range(1, login_retries + 1):
+        try:
+            client.login_user(username, password)
+            return
+        except OpenReviewException as e:
+            if retry == login_retries:
+                raise
+            print_log.warning(
+                f"登录失败, {login_retry_seconds}秒后重试({retry}/{login_retries}): {e}"
+            )
+            time.sleep(login_retry_seconds)
+
+
+class _ManualLogin:
+    """openreview客户端构造时发现OPENREVIEW_USERNAME等环境变量会自动登录, 这里只跳过构造时的这次登录,
+    由Account按token缓存决定是否登录; 不读取也不修改进程的环境变量
+    """
+
+    def __init__(self, baseurl: str):
+        self._constructing = True
+        super().__init__(baseurl=baseurl)
+        self._constructing = False
+
+    def login_user(self, *args, **kwargs):
+        if self._constructing:
+            return None
+        return super().login_user(*args, **kwargs)
+
+
+class _ClientV1(_ManualLogin, openreview.Client):
+    pass
+
+
+class _ClientV2(_ManualLogin, openreview.api.OpenReviewClient):
+    pass
+
+
+def _new_client(baseurl: str, api_version: int):
+    """创建未登录的客户端"""
+    if api_version == 1:
+        return _ClientV1(baseurl)
+    return _ClientV2(baseurl)
+
+
+class Account:
+    """一个账号的V1/V2客户端与限速器
+
+    只有一个账号(或匿名访问)时使用进程内共享的限速器和session, 多个账号时每个账号单独限速
+    """
+
+    def __init__(self, username: str, password: str, limiter: AdaptiveRateLimiter):
+        self.username = username
+        self.password = password
+        self.limiter = limiter
+        self.session = (
+            get_session() if limiter is rate_limiter else new_session(limiter)
+        )
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._expires = {}  # {api_version: token过期时间}
+        self.login_count = 0
+
+    def _authorize(self, client, api_version: int):
+        """优先使用缓存中没有过期的token(可能是其他进程刚登录的), 否则登录并写入缓存"""
+        baseurl = BASEURLS[api_version]
+        key = f"{self.username}@{baseurl}"
+        with _tokens_lock:
+            token = _load_tokens().get(key)
+        if isinstance(token, str) and _token_valid(token):
+            _use_token(client, token)
+        else:
+            _login(client, self.username, self.password)
+            self.login_count += 1
+            with _tokens_lock:
+                tokens = _load_tokens()
+                tokens[key] = client.token
+                _save_tokens(tokens)
+            print_log.info(f"登录成功: {self.username} {baseurl}")
+        self._expires[api_version] = _token_expiry(client.token)
+
+    def _create_client(self, api_version: int):
+        client = _new_client(BASEURLS[api_version], api_version)
+        # openreview客户端与爬虫共用长连接池, 请求经过该账号的限速器
+        client.session = self.session
+        client.limiter = self.limiter
+        if self.username:
+            self._authorize(client, api_version)
+        return client
+
+    def client(self, api_version: int):
+        """第一次使用时创建客户端, token剩余有效期不足token_margin秒时重新登录"""
+        client = self._clients.get(api_version)
+        if client is not None and (
+            not self.username or self._expires[api_version] > time.time() + token_margin
+        ):
+            return client
+        with self._lock:
+            client = self._clients.get(api_version)
+            if client is None:
+                client = self._clients[api_version] = self._create_client(api_version)
+            elif self._expires[api_version] <= time.time() + token_margin:
+                print_log.info(f"token即将过期, 重新登录: {self.username}")
+                self._authorize(client, api_version)
+        return client
+
+    def reauthorize(self, api_version: int, token: str) -> bool:
+        """token被服务端拒绝(401)时丢弃该token(包括缓存中的)并重新登录, 其他线程已经换过token时不再登录
+
+        Returns:
+            bool: 是否可以重试, 匿名访问时为False
+        """
+        if not self.username:
+            return False
+        with self._lock:
+            client = self._clients.get(api_version)
+            if client is None or client.token != token:
+                return True
+            key = f"{self.username}@{BASEURLS[api_version]}"
+            with _tokens_lock:
+                tokens = _load_tokens()
+                if tokens.get(key) == token:
+                    del tokens[key]
+                    _save_tokens(tokens)
+            print_log.warning(f"token被拒绝(401), 重新登录: {self.username}")
+            self._authorize(client, api_version)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            **self.limiter.stats(),
+            "backlog_seconds": round(self.limiter.backlog(), 3),
+            "throttled": int(self.limiter.throttled()),
+            "login_count": self.login_count,
+        }
+
+
+class ClientPool:
+    """多账号客户端池, 账号在第一次请求时才读取
+
+    每次get_client选择没有被429暂停、令牌排队最短的账号, 排队相同时轮流使用;
+    所有账号都在暂停时选择最先恢复的账号
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._accounts = None
+        self._counter = itertools.count()
+        # 每个线程最后一次取得的客户端及其token, 请求返回401时据此确定账号
+        self._local = threading.local()
+
+    def accounts(self) -> list:
+        if self._accounts is None:
+            with self._lock:
+                if self._accounts is None:
+                    self._accounts = self._create_accounts()
+        return self._accounts
+
+    @staticmethod
+    def _create_accounts() -> list:
+        credentials = load_accounts()
+        if len(credentials) == 1:
+            return [Account(*credentials[0], rate_limiter)]
+        accounts = []
+        for index, (username, password) in enumerate(credentials):
+            # 每个账号的初始速率、上限与共享限速器的配置相同
+            limiter = AdaptiveRateLimiter(
+                rate=rate_limiter.rate,
+                min_rate=rate_limiter.min_rate,
+                max_rate=rate_limiter.max_rate,
+                burst=rate_limiter.burst,
+            )
+            account = Account(username, password, limiter)
+            metrics.register_gauges(f"account_{index}", account.stats)
+            accounts.append(account)
+        print_log.info(f"共{len(accounts)}个账号, 请求在各账号之间分配")
+        return accounts
+
+    def pick(self) -> Account:
+        accounts = self.accounts()
+        if len(accounts) == 1:
+            return accounts[0]
+        start = next(self._counter) % len(accounts)
+        ordered = accounts[start:] + accounts[:start]
+        available = [i for i in ordered if not i.limiter.throttled()] or ordered
+        return min(available, key=lambda i: i.limiter.backlog())
+
+    def get_client(self, api_version: int):
+        account = self.pick()
+        client = account.client(api_version)
+        self._local.last = (account, api_version, client.token)
+        return client
+
+    def reauthorize(self, client=None, token: str = None) -> bool:
+        """请求返回401时重新登录对应的账号, 每次请求最多调用一次
+
+        Args:
+            client: 被拒绝的客户端, 为None时是当前线程最后一次get_client返回的客户端
+            token (str): 请求使用的token
+
+        Returns:
+            bool: 是否可以重试
+        """
+        if client is None:
+            last = getattr(self._local, "last", None)
+            return last is not None and last[0].reauthorize(*last[1:])
+        for account in self.accounts():
+            for api_version, i in list(account._clients.items()):
+                if i is client:
+                    return account.reauthorize(api_version, token)
+        return False
+
+    def stats(self) -> dict:
+        return {
+            account.username or "匿名": account.stats() for account in self.accounts()
+        }
+
+
+# 进程内共享的客户端池
+client_pool = ClientPool()
+
+
+def get_client(api_version: int):
+    """从客户端池获取openreview客户端, 多个账号时每次调用按负载选择账号
+
+    返回的客户端有limiter属性, 为该账号使用的限速器
+
+    Args:
+        api_version (int): 1为openreview.Client, 2为openreview.api.OpenReviewClient
+    """
+    return client_pool.get_client(api_version)
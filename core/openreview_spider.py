@@ -1,208 +1,404 @@
-import ast
+import hashlib
 import json
-import re
 import time
 from pathlib import Path
 
-import openreview
-from openreview.openreview import OpenReviewException
-
+from core import pdf_text, review_store, scheduler
 from core.__base_spider import BaseSpider
+from core.attachment import AttachmentTooLarge, atomic_write_bytes, stream_attachment
+from core.discovery import venue_plan
 from core.log_config import print_log
-from core.path_config import cache_dir, data_dir
-from module.data_module import DownlaodModule
-from module.params_module import Params
-
-while True:
-    try:
-        client_v1 = openreview.Client(
-            baseurl="https://api.openreview.net",  # https://api.openreview.net
-            username="Ming.Hu@mbzuai.ac.ae",
-            password="N-U74PKzf7y#T,q",
-        )
-        client_v2 = openreview.api.OpenReviewClient(
-            baseurl="https://api2.openreview.net",  # https://api.openreview.net
-            username="Ming.Hu@mbzuai.ac.ae",
-            password="N-U74PKzf7y#T,q",
-        )
-        break
-    except OpenReviewException as e:
-        print_log.warning(f"链接过多, 30秒后重试: {e.args[0]['message']}")
-        time.sleep(30)
+from core.manifest import ARTIFACTS, manifest
+from core.metrics import metrics
+from core.openreview_client import get_client
+from core.paper_index import PaperIndex
+from core.progress import tracker
+from core.path_config import cache_dir
+from core.retry import call_with_retry, dead_letter, describe
+from module.data_module import PaperPath
+
+# 评审文件的格式版本, 记录在下载清单的format列: 1(NULL)为旧版本get_notes(forum=..., trash=True)的原始顺序,
+# 2为review_document的结果; 旧格式的评审在重新获取时改写一次, 计为格式升级而不是内容变化
+REVIEW_FORMAT = 2
+
+
+def review_document(notes: list) -> list:
+    """一篇论文的评审文件内容(第REVIEW_FORMAT版): forum下未删除的全部note(to_json()结果), 按id排序
+
+    逐篇获取和批量获取的结果经过同样的处理, 同一个forum得到相同的内容和sha256
+    """
+    return sorted((i for i in notes if not i.get("ddate")), key=lambda i: i["id"])
+
+
+def save_review(
+    venue_id: str, paper_id: str, review: list, save_path: Path, segment_dir: Path
+) -> bool:
+    """写入一篇论文的评审并登记到下载清单
 
+    review_store.backend为"segment"时追加到segment_dir(年份目录)的压缩段, 否则原子写入save_path;
+    内容的sha256与清单中已保存的一致时不重写, 只把记录恢复为done
 
-def get_all_venues() -> list:
-    """获取所有的会议id列表
+    Args:
+        review (list): forum下全部note的to_json()结果
 
     Returns:
-        list: id列表
+        bool: 是否写入了新内容, 只是把旧格式的文件改写为当前格式时为False
     """
-    file_path = cache_dir / "venues.json"
-    if file_path.exists():
-        with open(file_path, "r", encoding="utf-8") as f:
-            venues = json.load(f)
-            return venues["members"]
-    venues = client_v2.get_group(id="venues")
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(venues.to_json(), f, ensure_ascii=False, indent=4)
-    return venues.to_json()["members"]
+    segment = None
+    if review_store.backend == "segment":
+        segment = review_store.review_store.segment(segment_dir)
+        data = segment.encode(paper_id, review)
+        save_path = segment.path
+    else:
+        data = json.dumps(review, ensure_ascii=False, indent=4).encode("utf-8")
+    result = len(data), hashlib.sha256(data).hexdigest()
+    record = manifest.get(venue_id, paper_id, "review")
+    if (
+        record is not None
+        and record[2] == result[1]
+        and record[3] == str(save_path)
+        and (paper_id in segment if segment else save_path.exists())
+    ):
+        metrics.inc("review_unchanged", venue_id)
+        if record[0] != "done" or record[4] != REVIEW_FORMAT:
+            manifest.record(
+                venue_id, paper_id, "review", "done", *result, save_path, REVIEW_FORMAT
+            )
+        return False
+    with metrics.timer("write", venue_id) as timer:
+        if segment:
+            segment.append(paper_id, review, data)
+        else:
+            atomic_write_bytes(save_path, data)
+        timer["size"] = result[0]
+    manifest.record(
+        venue_id, paper_id, "review", "done", *result, save_path, REVIEW_FORMAT
+    )
+    if record is not None and record[0] == "done" and record[4] != REVIEW_FORMAT:
+        # 旧格式的内容无法与当前格式比较, 不计为内容变化
+        metrics.inc("review_upgraded", venue_id)
+        return False
+    return True
 
 
 class OpenReviewSpider(BaseSpider):
-    def __init__(self, venue_id: str):
+    def __init__(self, venue_id: str, incremental: bool = False):
         super().__init__()
         print_log.debug(f"获取venue_id: {venue_id}")
         self.venue_id = venue_id
-        self.cache_file_path = cache_dir / f'{venue_id.replace("/", "_")}.json'
+        # 增量模式下按tmdate游标只获取上次同步之后修改过的论文
+        self.incremental = incremental
+        file_name = venue_id.replace("/", "_")
+        # 旧版本的JSON论文列表, 存在时转换为论文索引
+        self.cache_file_path = cache_dir / f"{file_name}.json"
+        self.paper_index = PaperIndex(cache_dir / file_name)
+        self.cursor_file_path = cache_dir / f"{file_name}.cursor.json"
 
     def check_api_version(self) -> bool:
-        """检查API版本"""
-        try:
-            group_data = client_v2.get_group(self.venue_id)
-        except OpenReviewException as e:
-            print_log.error(f'{self.venue_id}: {e.args[0]["message"]}')
+        """检查API版本, 优先使用cache/venue_plan.json中没有过期的会议信息"""
+        plan = venue_plan.get(self.venue_id)
+        if plan is None:
             return False
-        self.group_data = group_data
-        domain = group_data.domain
-        if domain:  # 存在domain,是V2版本
-            print_log.info(f"{self.venue_id}: API版本为V2")
-            self.version = 2
-        else:  # 否则是V1版本
-            print_log.info(f"{self.venue_id}: API版本为V1")
-            self.version = 1
+        self.version = plan["version"]
+        self.submition_id_list = plan["submission_ids"]
         return True
 
     def parse_submitions(self):
-        """解析获取所有论文时需要的invitation参数"""
-        if self.version == 1:
-            web_code = self.group_data.web
-            pattern = "SUBMISSION_ID = '(.*?)'"
-            submition_id_list = re.findall(pattern, web_code)
-            return submition_id_list
-        content = self.group_data.content
-        submition_id_list = [
-            content[i]["value"] for i in content.keys() if i.endswith("submission_id")
-        ]
-        return submition_id_list
-
-    def get_paper_list(self, submition_id_list: list):
-        """获取所有论文列表"""
-
-        def get_papers_v1():
-            papers = []
-            for submission_id in submition_id_list:
-                notes = client_v1.get_all_notes(invitation=submission_id)
-                for i in notes:
-                    pdf = i.content.get("pdf", "")
-                    if not pdf:
-                        continue
-                    year = time.strftime("%Y", time.localtime(i.tcdate // 1000))
-                    id_ = i.id
-                    title = i.content["title"]
-                    supplementary = i.content.get("supplementary_material", "")
-                    if supplementary:
-                        supplementary_type = supplementary.split(".")[-1]
-                    else:
-                        supplementary_type = ""
-                    papers.append(
-                        {
-                            "year": year,
-                            "id": id_,
-                            "title": title,
-                            "api_version": 1,
-                            "supplementary_type": supplementary_type,
-                        }
-                    )
-            return papers
+        """获取所有论文时需要的invitation参数"""
+        return self.submition_id_list
 
-        def get_papers_v2():
-            papers = []
+    @staticmethod
+    def parse_paper_v1(note):
+        """解析V1的投稿, 没有pdf时返回None"""
+        pdf = note.content.get("pdf", "")
+        if not pdf:
+            return None
+        supplementary = note.content.get("supplementary_material", "")
+        if supplementary:
+            supplementary_type = supplementary.split(".")[-1]
+        else:
+            supplementary_type = ""
+        return {
+            "year": time.strftime("%Y", time.localtime(note.tcdate // 1000)),
+            "id": note.id,
+            "title": note.content["title"],
+            "api_version": 1,
+            "supplementary_type": supplementary_type,
+        }
+
+    @staticmethod
+    def parse_paper_v2(note):
+        """解析V2的投稿"""
+        supplementary = note.content.get("supplementary_material", "")
+        if supplementary:
+            supplementary_type = supplementary["value"].split(".")[-1]
+        else:
+            supplementary_type = ""
+        return {
+            "year": time.strftime("%Y", time.localtime(note.tcdate // 1000)),
+            "id": note.id,
+            "title": note.content["title"]["value"],
+            "api_version": 2,
+            "supplementary_type": supplementary_type,
+        }
+
+    def iter_paper_list(self, submition_id_list: list, page_size: int = 1000):
+        """按页获取所有论文, 每页边追加写入论文索引边产出, 第一页返回后即可开始下载
+
+        全部获取完成后才替换正式索引并保存tmdate游标, 中途中断下次会重新获取
+        """
+        parse_paper = self.parse_paper_v1 if self.version == 1 else self.parse_paper_v2
+        cursor = 0
+        with self.paper_index.writer() as writer:
             for submission_id in submition_id_list:
-                notes = client_v2.get_all_notes(invitation=submission_id)
-                for i in notes:
-                    year = time.strftime("%Y", time.localtime(i.tcdate // 1000))
-                    id_ = i.id
-                    title = i.content["title"]["value"]
-                    supplementary = i.content.get("supplementary_material", "")
-                    if supplementary:
-                        supplementary_type = supplementary["value"].split(".")[-1]
-                    else:
-                        supplementary_type = ""
-                    papers.append(
-                        {
-                            "year": year,
-                            "id": id_,
-                            "title": title,
-                            "api_version": 2,
-                            "supplementary_type": supplementary_type,
-                        }
-                    )
-            return papers
+                after = None
+                while True:
+                    with metrics.timer("list", self.venue_id):
+                        notes = call_with_retry(
+                            lambda: get_client(self.version).get_notes(
+                                invitation=submission_id,
+                                sort="id",
+                                limit=page_size,
+                                after=after,
+                            ),
+                            self.venue_id,
+                            "论文列表",
+                        )
+                    for i in notes:
+                        cursor = max(cursor, i.tmdate or 0)
+                        paper = parse_paper(i)
+                        if paper:
+                            writer.append(paper)
+                            yield paper
+                    if len(notes) < page_size:
+                        break
+                    after = notes[-1].id
+        self.save_cursor(cursor)
+        print_log.info(f"{self.venue_id}: 共{writer.count}个论文")
+
+    def get_paper_list(self, submition_id_list: list) -> PaperIndex:
+        """获取所有论文列表, 写完索引后按内存映射读取"""
+        for _ in self.iter_paper_list(submition_id_list):
+            pass
+        return self.paper_index
+
+    def save_paper_list(self, paper_list):
+        """把论文列表写入论文索引"""
+        with self.paper_index.writer() as writer:
+            for paper in paper_list:
+                writer.append(paper)
 
+    def save_cursor(self, cursor: int):
+        with open(self.cursor_file_path, "w", encoding="utf-8") as f:
+            json.dump({"tmdate": cursor}, f)
+
+    def load_paper_list(self) -> PaperIndex:
+        if not self.paper_index.exists() and self.cache_file_path.exists():
+            # 旧版本缓存的JSON论文列表, 转换为索引后不再使用
+            with open(self.cache_file_path, "r", encoding="utf-8") as f:
+                self.save_paper_list(json.load(f))
+            self.cache_file_path.unlink()
+        return self.paper_index
+
+    def load_cursor(self):
+        """上次同步时见到的最大tmdate, 没有记录时返回None"""
+        if not self.cursor_file_path.exists():
+            return None
+        with open(self.cursor_file_path, "r", encoding="utf-8") as f:
+            return json.load(f)["tmdate"]
+
+    def get_changed_notes(self, submition_id_list: list, cursor: int):
+        """按tmdate倒序翻页, 获取cursor之后修改过的note
+
+        V2按domain查询, 包含投稿以及评审、讨论等回复; V1只能按投稿的invitation查询,
+        回复的新增和修改不会出现在结果中, 调用方需要另外处理V1会议的评审
+        """
         if self.version == 1:
-            paper_list = get_papers_v1()
+            queries = [{"invitation": i} for i in submition_id_list]
         else:
-            paper_list = get_papers_v2()
-        with open(self.cache_file_path, "w", encoding="utf-8") as f:
-            json.dump(paper_list, f, ensure_ascii=False, indent=4)
-        print_log.info(f"{self.venue_id}: 共{len(paper_list)}个论文")
-        return paper_list
+            queries = [{"domain": self.venue_id}]
+        page_size = 1000
+        for params in queries:
+            offset = 0
+            while True:
+                with metrics.timer("sync", self.venue_id):
+                    notes = call_with_retry(
+                        lambda: get_client(self.version).get_notes(
+                            sort="tmdate:desc", limit=page_size, offset=offset, **params
+                        ),
+                        self.venue_id,
+                        "增量同步",
+                    )
+                for note in notes:
+                    if (note.tmdate or 0) <= cursor:
+                        break
+                    yield note
+                else:
+                    if len(notes) == page_size:
+                        offset += page_size
+                        continue
+                break
 
-    def __call__(self):
-        if self.cache_file_path.exists():
-            with open(self.cache_file_path, "r", encoding="utf-8") as f:
-                paper_list = json.load(f)
-            return paper_list
+    def sync_paper_list(self, submition_id_list: list):
+        """增量同步论文列表, 修改过的论文在下载清单中标记为过期"""
+        cursor = self.load_cursor()
+        if cursor is None:
+            return self.get_paper_list(submition_id_list)
+        parse_paper = self.parse_paper_v1 if self.version == 1 else self.parse_paper_v2
+        submission_ids = set(submition_id_list)
+        new_cursor = cursor
+        # 只在内存中保存修改过的论文, 旧索引逐条读取并替换
+        papers, changed_forums = {}, set()
+        for note in self.get_changed_notes(submition_id_list, cursor):
+            new_cursor = max(new_cursor, note.tmdate)
+            if self.version == 1 or submission_ids & set(note.invitations):
+                paper = parse_paper(note)
+                if paper:
+                    papers[note.id] = paper
+            else:
+                changed_forums.add(note.forum)
+        paper_index = self.load_paper_list()
+        changed_papers = set()
+        with paper_index.writer() as writer:
+            for paper in paper_index:
+                if paper["id"] in papers:
+                    changed_papers.add(paper["id"])
+                    paper = papers[paper["id"]]
+                writer.append(paper)
+            new_papers = papers.keys() - changed_papers
+            for paper_id in new_papers:
+                writer.append(papers[paper_id])
+        self.save_cursor(new_cursor)
+        if self.version == 1:
+            # V1查询不到回复的修改, 全部评审重新获取, 内容没有变化的评审不会重写
+            print_log.warning(
+                f"{self.venue_id}: V1接口无法按tmdate获取新回复, 全部评审重新获取"
+            )
+            changed_forums = {i["id"] for i in paper_index}
+        # 投稿本身修改过则全部重新下载, 只有回复变化时只更新评审
+        manifest.mark_stale(self.venue_id, changed_papers)
+        manifest.mark_stale(self.venue_id, changed_forums - changed_papers, ["review"])
+        print_log.info(
+            f"{self.venue_id}: 增量同步, 新增{len(new_papers)}个论文, "
+            f"修改{len(changed_papers)}个论文, {len(changed_forums)}个论文有新回复"
+        )
+        return paper_index
+
+    def __call__(self, stream: bool = False):
+        """
+        Args:
+            stream (bool): 首次获取时返回边获取边产出的生成器, 否则获取完成后返回论文索引
+
+        Returns:
+            PaperIndex | Iterator | False: 会议无法获取时返回False
+        """
+        paper_index = self.load_paper_list()
+        if paper_index.exists() and not self.incremental:
+            return paper_index
         if self.check_api_version():
             submition_id_list = self.parse_submitions()
-            paper_list = self.get_paper_list(submition_id_list)
-            return paper_list
+            if paper_index.exists():
+                return self.sync_paper_list(submition_id_list)
+            if stream:
+                return self.iter_paper_list(submition_id_list)
+            return self.get_paper_list(submition_id_list)
         return False
 
 
 class PaperDownload(BaseSpider):
 
-    def __init__(self, venue_id: str, paper_info: dict):
+    def __init__(
+        self,
+        venue_id: str,
+        paper_info: dict,
+        states: dict = None,
+        large_lane: scheduler.LargeLane = None,
+    ):
         super().__init__()
-        print_log.debug(f"获取文章: {paper_info}")
+        # 抽样输出这篇论文的日志, 关闭时下载过程中不产生每篇论文的日志
+        self.detail = tracker.sampled(paper_info["id"])
+        if self.detail:
+            print_log.debug(f"获取文章: {paper_info}")
         self.venue_id = venue_id
+        self.paper_info = paper_info
         self.paper_id = paper_info["id"]
         self.paper_title = paper_info["title"]
         self.paper_year = paper_info["year"]
         self.api_version = paper_info["api_version"]
         self.supplementary_type = paper_info["supplementary_type"]
+        # 需要下载的项及其在清单中的状态, None表示清单中没有记录
+        self.states = {i: None for i in ARTIFACTS} if states is None else states
+        self.review = None
+        # 超过scheduler.large_size的支撑文件先跳过, 其余下载完成后交给large_lane(没有时直接下载)
+        self.large_lane = large_lane
+        self.large_supplement_size = None
+
+    def _generate_save_path(self):
+        paper_path = PaperPath(self.venue_id, self.paper_info)
+        paper_path.make_dir()
+        self.paper_save_path = paper_path.paper_save_path
+        self.paper_supplement_save_path = paper_path.paper_supplement_save_path
+        self.paper_review_save_path = paper_path.paper_review_save_path
+        self.review_segment_dir = paper_path.year_dir
+
+    def _need_download(self, artifact: str, save_path: Path) -> bool:
+        if artifact not in self.states:
+            return False
+        # 清单中没有记录但文件已存在(旧版本下载的数据), 直接登记
+        if self.states[artifact] is None and manifest.adopt(
+            self.venue_id, self.paper_id, artifact, save_path
+        ):
+            tracker.adopted(self.venue_id)
+            if self.detail:
+                print_log.info(f"已下载过: {self.paper_id} {artifact}")
+            return False
+        return True
+
+    def _attempt(self, artifact: str, func, finished: bool = True):
+        """按core.retry的策略执行一个下载项, 仍然失败时记入死信队列, 不影响其他下载项和论文
 
-    def __generate_save_path(self):
-        venue_id = re.sub(r'[<>:"/\\|?*]', "-", self.venue_id)
-        paper_title = re.sub(r'[<>:"/\\|?*]', "-", self.paper_title).replace("\x08", "")
-        paper_save_dir = data_dir / f"{venue_id}/{self.paper_year}"
-        paper_save_dir.mkdir(parents=True, exist_ok=True)
-        self.paper_save_path = paper_save_dir / f"{paper_title}.pdf"
-        if self.paper_save_path.exists():
-            print_log.info(f"已下载过: {self.paper_id}")
-            return True
-        if self.supplementary_type:
-            self.paper_supplement_save_path = (
-                paper_save_dir / f"{paper_title}_supplement.{self.supplementary_type}"
+        Args:
+            finished (bool): func成功即表示该下载项完成, 从死信队列中删除
+
+        Returns:
+            func的返回值, 失败时为None
+        """
+        try:
+            result = call_with_retry(func, self.venue_id, f"{self.paper_id} {artifact}")
+        except Exception as e:
+            print_log.error(
+                f"下载失败, 记入死信队列: {self.paper_id} {artifact}, {describe(e)}"
             )
-        self.paper_review_save_path = paper_save_dir / f"{paper_title}.json"
+            dead_letter.add(self.venue_id, self.paper_info, artifact, e)
+            return None
+        if finished:
+            dead_letter.discard(self.venue_id, self.paper_id, artifact)
+        return result
 
     def download_paper(self) -> bool:
         # url = f"https://openreview.net/pdf?id={self.paper_id}"
         # response = self._request(url)
-        try:
-            if self.api_version == 1:
-                pdf_data = client_v1.get_attachment(id=self.paper_id, field_name="pdf")
-            else:
-                pdf_data = client_v2.get_attachment(id=self.paper_id, field_name="pdf")
-        except OpenReviewException as e:
-            status_code = e.args[0]["status"]
-            if status_code == 404:
-                print_log.warning(f"论文不存在: {self.paper_id}")
-                return False
-        with open(self.paper_save_path, "wb") as f:
-            f.write(pdf_data)
-        print_log.info(f"论文下载成功: {self.paper_id}")
+        client = get_client(self.api_version)
+        with metrics.timer("pdf", self.venue_id) as timer:
+            result = stream_attachment(
+                client, self.paper_id, "pdf", self.paper_save_path
+            )
+            timer["size"] = result[0] if result else 0
+        if result is None:
+            print_log.warning(f"论文不存在: {self.paper_id}")
+            manifest.record_many(
+                [
+                    (self.venue_id, self.paper_id, i, "absent", None, None, None)
+                    for i in ARTIFACTS
+                ]
+            )
+            return False
+        manifest.record(
+            self.venue_id, self.paper_id, "pdf", "done", *result, self.paper_save_path
+        )
+        pdf_text.on_pdf(self.venue_id, self.paper_id, self.paper_save_path, result[1])
+        if self.detail:
+            print_log.info(f"论文下载成功: {self.paper_id}")
         return True
 
     def download_paper_supplement(self):
@@ -212,35 +408,101 @@ class PaperDownload(BaseSpider):
         #     print_log.info(f"支撑文件不存在: {self.paper_id}")
         #     return
         if not self.supplementary_type:
+            manifest.record(self.venue_id, self.paper_id, "supplement", "absent")
             return
-        if self.api_version == 1:
-            data = client_v1.get_attachment(
-                id=self.paper_id, field_name="supplementary_material"
-            )
-        else:
-            data = client_v2.get_attachment(
-                id=self.paper_id, field_name="supplementary_material"
+        try:
+            self._download_supplement(scheduler.supplement_limit())
+        except AttachmentTooLarge as e:
+            if not self._skip_supplement(e.size):
+                self.large_supplement_size = e.size
+
+    def download_large_supplement(self):
+        """在大文件通道中下载之前按大小跳过的支撑文件"""
+        self.large_supplement_size = None
+        self._attempt("supplement", self._download_large_supplement)
+
+    def _download_large_supplement(self):
+        try:
+            self._download_supplement(scheduler.max_supplement_size)
+        except AttachmentTooLarge as e:
+            self._skip_supplement(e.size)
+
+    def _skip_supplement(self, size: int) -> bool:
+        """超过scheduler.max_supplement_size时记为skipped"""
+        max_size = scheduler.max_supplement_size
+        if max_size is None or size <= max_size:
+            return False
+        print_log.warning(
+            f"支撑文件{size}字节超过上限{max_size}字节, 跳过: {self.paper_id}"
+        )
+        manifest.record(self.venue_id, self.paper_id, "supplement", "skipped", size)
+        return True
+
+    def _download_supplement(self, max_size: int = None):
+        client = get_client(self.api_version)
+        with metrics.timer("supplement", self.venue_id) as timer:
+            result = stream_attachment(
+                client,
+                self.paper_id,
+                "supplementary_material",
+                self.paper_supplement_save_path,
+                max_size,
             )
-        with open(self.paper_supplement_save_path, "wb") as f:
-            f.write(data)
-        print_log.info(f"支撑下载成功: {self.paper_id}")
+            timer["size"] = result[0] if result else 0
+        if result is None:
+            manifest.record(self.venue_id, self.paper_id, "supplement", "absent")
+            return
+        manifest.record(
+            self.venue_id,
+            self.paper_id,
+            "supplement",
+            "done",
+            *result,
+            self.paper_supplement_save_path,
+        )
+        if self.detail:
+            print_log.info(f"支撑下载成功: {self.paper_id}")
+
+    def fetch_paper_review(self):
+        """获取评审, 暂存在self.review中等待写入"""
+        client = get_client(self.api_version)
+        with metrics.timer("review", self.venue_id):
+            review = client.get_notes(forum=self.paper_id)
+        self.review = review_document([i.to_json() for i in review])
+
+    def save_paper_review(self):
+        if self.review is None:
+            return
+        save_review(
+            self.venue_id,
+            self.paper_id,
+            self.review,
+            self.paper_review_save_path,
+            self.review_segment_dir,
+        )
+        self.review = None
+        if self.detail:
+            print_log.info(f"评审下载成功: {self.paper_id}")
 
     def download_paper_review(self):
-        if self.api_version == 1:
-            review = client_v1.get_notes(forum=self.paper_id, trash=True)
-        else:
-            review = client_v2.get_notes(forum=self.paper_id, trash=True)
-        review = [i.to_json() for i in review]
-        with open(self.paper_review_save_path, "w", encoding="utf-8") as f:
-            json.dump(review, f, ensure_ascii=False, indent=4)
-        print_log.info(f"评审下载成功: {self.paper_id}")
+        self.fetch_paper_review()
+        self.save_paper_review()
 
     def __call__(self):
-        if self.__generate_save_path():
-            return
-        if self.download_paper():
-            self.download_paper_supplement()
-            self.download_paper_review()
+        self._generate_save_path()
+        # 单个下载项失败时记入死信队列, 继续下载其余的项; 只有论文不存在时跳过整篇
+        if self._need_download("pdf", self.paper_save_path):
+            if self._attempt("pdf", self.download_paper) is False:
+                return
+        if self._need_download("supplement", self.paper_supplement_save_path):
+            self._attempt("supplement", self.download_paper_supplement)
+        if self._need_download("review", self.paper_review_save_path):
+            self._attempt("review", self.download_paper_review)
+        if self.large_supplement_size is not None:
+            if self.large_lane:
+                self.large_lane.put(self, self.large_supplement_size)
+            else:
+                self.download_large_supplement()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,152 @@
+import mmap
+import os
+import struct
+from pathlib import Path
+
+from core.attachment import fsync_file, part_path
+
+# 定长记录: id, 年份, API版本, 支撑文件类型, 标题在标题文件中的偏移和长度
+RECORD = struct.Struct("<32sHB16sQI")
+# id超过32字节或支撑文件类型超过16字节时API版本加上这个标志, 两者与标题一起写入标题文件: id\0类型\0标题
+LONG_FIELDS = 0x80
+
+
+def _fits(value: str, size: int) -> bool:
+    return len(value.encode("utf-8")) <= size
+
+
+class PaperIndexWriter:
+    """边获取边追加写入论文索引, 全部写完后才原子替换正式文件"""
+
+    def __init__(self, index: "PaperIndex"):
+        self.index = index
+        self.count = 0
+        self._titles_offset = 0
+        self._records = open(part_path(index.index_path), "wb")
+        self._titles = open(part_path(index.titles_path), "wb")
+
+    def append(self, paper: dict):
+        paper_id, supplementary_type = paper["id"], paper["supplementary_type"]
+        api_version = paper["api_version"]
+        title = paper["title"]
+        if not (_fits(paper_id, 32) and _fits(supplementary_type, 16)):
+            # 过长的字段不截断, 放到变长的标题文件中
+            title = f"{paper_id}\0{supplementary_type}\0{title}"
+            paper_id, supplementary_type = "", ""
+            api_version |= LONG_FIELDS
+        title = title.encode("utf-8")
+        self._records.write(
+            RECORD.pack(
+                paper_id.encode("utf-8"),
+                int(paper["year"]),
+                api_version,
+                supplementary_type.encode("utf-8"),
+                self._titles_offset,
+                len(title),
+            )
+        )
+        self._titles.write(title)
+        self._titles_offset += len(title)
+        self.count += 1
+
+    def commit(self):
+        for f in (self._titles, self._records):
+            fsync_file(f)
+            f.close()
+        # 读取中的旧索引需要先关闭内存映射才能替换; 先替换标题文件, 索引中的偏移只会指向已经存在的标题
+        self.index.close()
+        os.replace(part_path(self.index.titles_path), self.index.titles_path)
+        os.replace(part_path(self.index.index_path), self.index.index_path)
+
+    def abort(self):
+        for f in (self._titles, self._records):
+            f.close()
+            Path(f.name).unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+class PaperIndex:
+    """会议的论文索引: 定长记录文件(.index)加标题文件(.titles)
+
+    读取时两个文件都按内存映射访问, 不需要解析整个列表, 按下标取出的记录与原来的论文信息dict格式一致
+    """
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path (Path): 不含后缀的文件路径
+        """
+        self.index_path = path.with_name(path.name + ".index")
+        self.titles_path = path.with_name(path.name + ".titles")
+        self._files = []
+        self._records = None
+        self._titles = None
+
+    def exists(self) -> bool:
+        return self.index_path.exists() and self.titles_path.exists()
+
+    def writer(self) -> PaperIndexWriter:
+        return PaperIndexWriter(self)
+
+    def _map(self, path: Path):
+        f = open(path, "rb")
+        self._files.append(f)
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _open(self):
+        if self._records is None:
+            self._records = self._map(self.index_path)
+            self._titles = self._map(self.titles_path)
+
+    def close(self):
+        """关闭内存映射, 替换索引文件前需要先关闭"""
+        for m in (self._records, self._titles):
+            if isinstance(m, mmap.mmap):
+                m.close()
+        for f in self._files:
+            f.close()
+        self._files = []
+        self._records = None
+        self._titles = None
+
+    def __len__(self) -> int:
+        self._open()
+        return len(self._records) // RECORD.size
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError(key)
+        paper_id, year, api_version, supplementary_type, offset, length = (
+            RECORD.unpack_from(self._records, key * RECORD.size)
+        )
+        paper_id = paper_id.rstrip(b"\0").decode("utf-8")
+        supplementary_type = supplementary_type.rstrip(b"\0").decode("utf-8")
+        title = self._titles[offset : offset + length].decode("utf-8")
+        if api_version & LONG_FIELDS:
+            paper_id, supplementary_type, title = title.split("\0", 2)
+            api_version &= ~LONG_FIELDS
+        return {
+            "year": str(year),
+            "id": paper_id,
+            "title": title,
+            "api_version": api_version,
+            "supplementary_type": supplementary_type,
+        }
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
@@ -0,0 +1,273 @@
+"""标题到文件路径的索引, 可选的按标题命名的符号链接, 以及旧版本按标题保存的数据迁移
+
+用法: python -m core.path_index --migrate [VENUE_ID ...]   把按标题保存的文件迁移到按id保存的布局
+      python -m core.path_index [VENUE_ID ...]             重新生成路径索引(和符号链接)
+      python -m core.path_index --lookup "标题" VENUE_ID     按标题查找文件
+不指定会议时处理下载清单中的全部会议; --migrate时为cache/中有论文列表并且data/中有保存目录的会议
+"""
+
+import argparse
+import os
+from pathlib import Path
+
+from core.attachment import check_file, file_digest
+from core.discovery import venue_plan
+from core.log_config import print_log
+from core.manifest import ARTIFACTS, manifest
+from core.openreview_spider import OpenReviewSpider
+from core.path_config import cache_dir
+from module.data_module import PaperPath, id_shard, safe_title, venue_dir
+
+# 每个会议下载结束后在data/<venue>/<year>/by-title下生成按标题命名的符号链接(指向按id保存的文件)
+title_links = False
+
+# 每个会议的路径索引: data/<venue>/paths.tsv
+INDEX_NAME = "paths.tsv"
+INDEX_FIELDS = ("year", "paper_id", "title", *ARTIFACTS)
+LINK_DIR_NAME = "by-title"
+
+
+def _clean(title: str) -> str:
+    """路径索引中的标题, 合并空白字符以免破坏tsv格式"""
+    return " ".join(title.split())
+
+
+def venue_paths(venue_id: str) -> dict:
+    """下载清单中一个会议已下载的文件
+
+    Returns:
+        dict: {paper_id: {artifact: path}}
+    """
+    paths = {}
+    for artifact in ARTIFACTS:
+        for paper_id, _, path in manifest.done(venue_id, artifact):
+            if path:
+                paths.setdefault(paper_id, {})[artifact] = Path(path)
+    return paths
+
+
+def write_venue_index(venue_id: str) -> int:
+    """生成一个会议的路径索引, 每行为年份、论文id、标题和各下载项相对于会议目录的路径
+
+    Returns:
+        int: 写入的论文数量
+    """
+    paper_index = OpenReviewSpider(venue_id).load_paper_list()
+    if not paper_index.exists():
+        return 0
+    directory = venue_dir(venue_id)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = venue_paths(venue_id)
+    index_path = directory / INDEX_NAME
+    part_path = index_path.with_name(index_path.name + ".part")
+    count = 0
+    links = []
+    with open(part_path, "w", encoding="utf-8") as f:
+        f.write("\t".join(INDEX_FIELDS) + "\n")
+        for paper in paper_index:
+            paper_paths = paths.get(paper["id"])
+            if not paper_paths:
+                continue
+            f.write(
+                "\t".join(
+                    [
+                        paper["year"],
+                        paper["id"],
+                        _clean(paper["title"]),
+                        *(
+                            (
+                                os.path.relpath(paper_paths[i], directory)
+                                if i in paper_paths
+                                else ""
+                            )
+                            for i in ARTIFACTS
+                        ),
+                    ]
+                )
+                + "\n"
+            )
+            count += 1
+            if title_links:
+                links.append((paper, paper_paths))
+    os.replace(part_path, index_path)
+    if title_links:
+        make_title_links(venue_id, links)
+    return count
+
+
+def make_title_links(venue_id: str, papers: list):
+    """在年份目录的by-title下为每个文件生成按标题命名的相对符号链接, 同名论文在文件名后加论文id
+
+    Args:
+        papers (list): (paper_info, {artifact: path})
+    """
+    used = set()
+    for paper, paper_paths in papers:
+        link_dir = venue_dir(venue_id) / paper["year"] / LINK_DIR_NAME
+        link_dir.mkdir(parents=True, exist_ok=True)
+        name = safe_title(_clean(paper["title"]))[:200]
+        if (link_dir, name) in used:
+            name = f"{name} ({paper['id']})"
+        used.add((link_dir, name))
+        for artifact, target in paper_paths.items():
+            # 评审段由多篇论文共用, 不生成链接
+            if target.parent.name != id_shard(paper["id"]):
+                continue
+            suffix = target.name[len(paper["id"]) :]
+            link = link_dir / f"{name}{suffix}"
+            relative = os.path.relpath(target, link_dir)
+            if link.is_symlink():
+                if os.readlink(link) == relative:
+                    continue
+                link.unlink()
+            try:
+                link.symlink_to(relative)
+            except OSError as e:
+                print_log.warning(f"{venue_id}: 无法创建符号链接, 跳过: {e}")
+                return
+
+
+def lookup(venue_id: str, title: str) -> list:
+    """按标题(忽略大小写和多余空白)查找一个会议的文件, 同名论文会返回多条
+
+    Returns:
+        list: {"year", "paper_id", "title", "pdf", "supplement", "review"}, 路径为Path, 不存在的项为None
+    """
+    index_path = venue_dir(venue_id) / INDEX_NAME
+    if not index_path.exists():
+        return []
+    title = _clean(title).lower()
+    results = []
+    with open(index_path, "r", encoding="utf-8") as f:
+        next(f)
+        for line in f:
+            row = dict(zip(INDEX_FIELDS, line.rstrip("\n").split("\t")))
+            if row["title"].lower() != title:
+                continue
+            for artifact in ARTIFACTS:
+                row[artifact] = (
+                    venue_dir(venue_id) / row[artifact] if row[artifact] else None
+                )
+            results.append(row)
+    return results
+
+
+def migrate_venue(venue_id: str) -> int:
+    """把一个会议按标题保存的文件移动到按id保存的位置并更新下载清单
+
+    同一年份有同名论文时旧文件只保留了其中一篇, 无法确定属于哪篇, 这些论文标记为过期重新下载;
+    与Verifier一致, 检查不完整(如下载中断的PDF)的文件同样移动, 但标记为过期, 下次运行重新下载并覆盖
+
+    Returns:
+        int: 移动的文件数量
+    """
+    paper_index = OpenReviewSpider(venue_id).load_paper_list()
+    if not paper_index.exists():
+        return 0
+    digests = {
+        (paper_id, artifact): sha256
+        for artifact in ARTIFACTS
+        for paper_id, sha256, _ in manifest.done(venue_id, artifact)
+    }
+    groups = {}
+    for paper in paper_index:
+        key = (paper["year"], safe_title(paper["title"]))
+        groups.setdefault(key, []).append(paper)
+    rows, stale_ids, damaged_count = [], [], 0
+    for papers in groups.values():
+        if len(papers) > 1:
+            stale_ids.extend(i["id"] for i in papers)
+            continue
+        paper = papers[0]
+        old_paths = PaperPath(venue_id, paper, "title").artifact_paths()
+        new_path = PaperPath(venue_id, paper, "id")
+        for artifact, target in new_path.artifact_paths().items():
+            source = old_paths[artifact]
+            if source is None or not source.exists():
+                continue
+            new_path.make_dir()
+            os.replace(source, target)
+            reason = check_file(target)
+            if reason:
+                print_log.warning(
+                    f"文件损坏: {venue_id} {paper['id']} {artifact}, {reason}"
+                )
+                rows.append(
+                    (venue_id, paper["id"], artifact, "stale", None, None, target)
+                )
+                damaged_count += 1
+                continue
+            sha256 = digests.get((paper["id"], artifact))
+            size = target.stat().st_size
+            if sha256 is None:
+                size, sha256 = file_digest(target)
+            rows.append((venue_id, paper["id"], artifact, "done", size, sha256, target))
+    manifest.record_many(rows)
+    manifest.mark_stale(venue_id, stale_ids)
+    print_log.info(
+        f"{venue_id}: 迁移{len(rows)}个文件, 其中{damaged_count}个损坏需要重新下载, "
+        f"{len(stale_ids)}个同名论文需要重新下载"
+    )
+    return len(rows)
+
+
+def index_venue(venue_id: str):
+    """会议下载结束后更新路径索引, 出错不影响下载"""
+    try:
+        write_venue_index(venue_id)
+    except Exception as e:
+        print_log.error(f"{venue_id}: 路径索引更新失败: {e}")
+
+
+def cached_venues() -> list:
+    """cache/中有论文列表(论文索引或旧版本的JSON)并且data/中有保存目录的会议, 旧版本的数据不在下载清单中
+
+    缓存文件名是venue_id中的/替换为_, 优先按cache/venue_plan.json中的会议id还原, 其余把_还原为/
+    """
+    known = {i.replace("/", "_"): i for i in venue_plan.venue_ids()}
+    venue_ids = set()
+    for path in cache_dir.glob("*"):
+        for suffix in (".index", ".json"):
+            if path.name.endswith(suffix) and not path.name.endswith(".cursor.json"):
+                name = path.name[: -len(suffix)]
+                venue_id = known.get(name, name.replace("_", "/"))
+                if venue_dir(venue_id).is_dir():
+                    venue_ids.add(venue_id)
+    return sorted(venue_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("venue_ids", nargs="*", metavar="VENUE_ID")
+    parser.add_argument("--migrate", action="store_true", help="迁移旧版本的数据")
+    parser.add_argument("--lookup", metavar="TITLE", help="按标题查找文件")
+    parser.add_argument("--links", action="store_true", help="同时生成符号链接")
+    args = parser.parse_args()
+    global title_links
+    title_links = title_links or args.links
+    if args.venue_ids:
+        venue_ids = args.venue_ids
+    elif args.migrate:
+        venue_ids = cached_venues()
+        if not venue_ids:
+            print_log.warning(
+                "cache/和data/中没有找到可以迁移的会议, 请在命令行指定VENUE_ID"
+            )
+    else:
+        venue_ids = manifest.venues()
+    if args.lookup:
+        for venue_id in venue_ids:
+            for row in lookup(venue_id, args.lookup):
+                print(venue_id, *(row[i] or "-" for i in INDEX_FIELDS), sep="\t")
+        return
+    for venue_id in venue_ids:
+        if args.migrate:
+            migrate_venue(venue_id)
+        count = write_venue_index(venue_id)
+        print_log.info(f"{venue_id}: 路径索引共{count}个论文")
+
+
+if __name__ == "__main__":
+    main()
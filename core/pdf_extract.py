@@ -0,0 +1,44 @@
+"""在子进程中运行的PDF解析函数(需要安装pypdf)
+
+子进程以spawn方式启动, 本模块只依赖标准库和pypdf; spawn会在子进程中重新导入主模块(如main.py),
+因此主模块顶层只做配置赋值, 有副作用的初始化放在__main__中, core.log_config在子进程中不创建日志文件
+"""
+
+
+def import_pypdf():
+    try:
+        import pypdf
+    except ImportError as e:
+        raise ImportError("提取PDF文本需要安装pypdf") from e
+    return pypdf
+
+
+def _info(metadata, key: str):
+    value = metadata.get(key) if metadata else None
+    return str(value) if value else None
+
+
+def extract_pdf(path: str, first_page_chars: int = 4000) -> dict:
+    """提取PDF的纯文本、页数、第一页文本以及文档信息中的标题和作者
+
+    Args:
+        first_page_chars (int): 第一页文本保存的最大字符数, 用于之后解析标题、作者等信息
+
+    Returns:
+        dict: {"page_count", "text", "first_page", "title", "author"}, 无法解析时为{"error"}
+    """
+    pypdf = import_pypdf()
+    try:
+        reader = pypdf.PdfReader(path)
+        # 页之间用换页符分隔, 可以按页切分
+        pages = [page.extract_text() or "" for page in reader.pages]
+        metadata = reader.metadata
+    except Exception as e:  # pypdf对各种损坏的文件抛出的异常类型不固定
+        return {"error": f"{e.__class__.__name__}: {e}"}
+    return {
+        "page_count": len(pages),
+        "text": "\f".join(pages),
+        "first_page": pages[0][:first_page_chars] if pages else "",
+        "title": _info(metadata, "/Title"),
+        "author": _info(metadata, "/Author"),
+    }
@@ -0,0 +1,303 @@
+"""PDF文本提取: 下载完成的PDF交给进程池提取纯文本、页数和第一页信息, 保存到每个会议的文本库
+
+解析是CPU密集的, 在独立的进程中运行, 不与下载线程争抢GIL; 在途任务达到max_pending时新的PDF直接跳过,
+下载线程从不等待, 跳过的PDF在会议结束时和全部下载结束后补上; 文本库中PDF的sha256没有变化的不再提取
+
+文本库为data/<venue>/text.sqlite3, 全文用zlib压缩保存, 用text_store.get(venue_id, paper_id)读取
+
+用法: python -m core.pdf_text [VENUE_ID ...]   为已下载的PDF补全文本库, 不指定会议时处理下载清单中的全部会议
+      --workers N  进程数, 默认为CPU核数
+"""
+
+import argparse
+import multiprocessing
+import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from core.log_config import print_log
+from core.manifest import manifest
+from core.metrics import metrics
+from core.pdf_extract import extract_pdf, import_pypdf
+from module.data_module import venue_dir
+
+# 下载完成后是否提取PDF文本(需要安装pypdf)
+enabled = False
+# 进程数, None为CPU核数
+worker_num = None
+# 在途的提取任务上限, 达到时下载线程不等待, 直接跳过
+max_pending = 64
+# 第一页文本保存的最大字符数
+first_page_chars = 4000
+
+TEXT_DB_NAME = "text.sqlite3"
+
+
+class TextStore:
+    """每个会议一个SQLite文本库, 所有写入经过同一个锁"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conns = {}
+        self._done = {}  # {venue_id: {paper_id: pdf_sha256}}
+
+    def _connect(self, venue_id: str) -> sqlite3.Connection:
+        conn = self._conns.get(venue_id)
+        if conn is None:
+            directory = venue_dir(venue_id)
+            directory.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                directory / TEXT_DB_NAME, timeout=60, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS text (
+                    paper_id TEXT PRIMARY KEY,
+                    pdf_sha256 TEXT NOT NULL,
+                    page_count INTEGER,
+                    title TEXT,
+                    author TEXT,
+                    first_page TEXT,
+                    text BLOB,
+                    error TEXT,
+                    extracted_at REAL NOT NULL
+                ) WITHOUT ROWID
+                """)
+            self._conns[venue_id] = conn
+        return conn
+
+    def _processed(self, venue_id: str) -> dict:
+        if venue_id not in self._done:
+            self._done[venue_id] = dict(
+                self._connect(venue_id).execute("SELECT paper_id, pdf_sha256 FROM text")
+            )
+        return self._done[venue_id]
+
+    def is_done(self, venue_id: str, paper_id: str, pdf_sha256: str) -> bool:
+        """同一个PDF(sha256相同)已经提取过, 包括无法解析的"""
+        with self._lock:
+            return self._processed(venue_id).get(paper_id) == pdf_sha256
+
+    def put(self, venue_id: str, paper_id: str, pdf_sha256: str, result: dict):
+        text = result.get("text")
+        row = (
+            paper_id,
+            pdf_sha256,
+            result.get("page_count"),
+            result.get("title"),
+            result.get("author"),
+            result.get("first_page"),
+            zlib.compress(text.encode("utf-8")) if text is not None else None,
+            result.get("error"),
+            time.time(),
+        )
+        with self._lock:
+            conn = self._connect(venue_id)
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO text VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row,
+                )
+            self._processed(venue_id)[paper_id] = pdf_sha256
+
+    def get(self, venue_id: str, paper_id: str):
+        """
+        Returns:
+            dict | None: {"page_count", "title", "author", "first_page", "text", "error"}
+        """
+        with self._lock:
+            row = (
+                self._connect(venue_id)
+                .execute(
+                    "SELECT page_count, title, author, first_page, text, error "
+                    "FROM text WHERE paper_id = ?",
+                    (paper_id,),
+                )
+                .fetchone()
+            )
+        if row is None:
+            return None
+        keys = ("page_count", "title", "author", "first_page", "text", "error")
+        result = dict(zip(keys, row))
+        if result["text"] is not None:
+            result["text"] = zlib.decompress(result["text"]).decode("utf-8")
+        return result
+
+
+# 进程内共享的文本库
+text_store = TextStore()
+
+
+class TextExtractor:
+    """进程池提取PDF文本, 子进程以spawn方式启动, 不继承下载线程的状态"""
+
+    def __init__(self, store: TextStore = None):
+        self.store = store or text_store
+        self._executor = None
+        self._condition = threading.Condition()
+        self._pending = 0
+        self._in_flight = (
+            set()
+        )  # {(venue_id, paper_id, pdf_sha256)}, 已提交还没有完成的PDF
+        self.skipped_count = 0
+        self._skipped_venues = set()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._condition:
+            if self._executor is None:
+                import_pypdf()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=worker_num,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def submit(
+        self, venue_id: str, paper_id: str, path, pdf_sha256: str, wait: bool = False
+    ) -> bool:
+        """提交一个PDF, 已经提取过或正在提取的跳过
+
+        Args:
+            wait (bool): 在途任务达到max_pending时等待, 否则直接跳过
+
+        Returns:
+            bool: 是否提交
+        """
+        key = (venue_id, paper_id, pdf_sha256)
+        if self.store.is_done(*key):
+            return False
+        executor = self._pool()
+        with self._condition:
+            if key in self._in_flight:
+                return False
+            while self._pending >= max_pending:
+                if not wait:
+                    self.skipped_count += 1
+                    self._skipped_venues.add(venue_id)
+                    metrics.inc("text_skipped", venue_id)
+                    return False
+                self._condition.wait()
+                if key in self._in_flight:
+                    return False
+            self._pending += 1
+            self._in_flight.add(key)
+        try:
+            future = executor.submit(extract_pdf, str(path), first_page_chars)
+        except BrokenProcessPool:
+            # 子进程异常退出后进程池不能再使用, 下次提交时重新创建
+            with self._condition:
+                self._pending -= 1
+                self._in_flight.discard(key)
+                if self._executor is executor:
+                    self._executor = None
+            raise
+        future.add_done_callback(
+            lambda f: self._on_done(venue_id, paper_id, pdf_sha256, f)
+        )
+        return True
+
+    def _on_done(self, venue_id: str, paper_id: str, pdf_sha256: str, future):
+        try:
+            result = future.result()
+            if "error" in result:
+                print_log.warning(f"PDF无法解析: {paper_id}, {result['error']}")
+                metrics.inc("text_error", venue_id)
+            self.store.put(venue_id, paper_id, pdf_sha256, result)
+            metrics.inc("text_extracted", venue_id)
+        except Exception as e:
+            print_log.error(f"PDF文本提取失败: {paper_id}, {e.__class__.__name__}: {e}")
+        finally:
+            with self._condition:
+                self._pending -= 1
+                self._in_flight.discard((venue_id, paper_id, pdf_sha256))
+                self._condition.notify_all()
+
+    def extract_venue(self, venue_id: str, wait: bool = False) -> int:
+        """提交一个会议已下载但还没有提取(或PDF已变化)的PDF
+
+        Returns:
+            int: 提交的数量
+        """
+        count = 0
+        for paper_id, pdf_sha256, path in manifest.done(venue_id, "pdf"):
+            if not pdf_sha256 or not path:
+                continue
+            if self.submit(venue_id, paper_id, path, pdf_sha256, wait):
+                count += 1
+            elif not wait and self._pending >= max_pending:
+                break
+        return count
+
+    def join(self):
+        """等待在途任务全部完成"""
+        with self._condition:
+            while self._pending:
+                self._condition.wait()
+
+    def close(self):
+        """补上因在途任务过多跳过的PDF, 等待全部完成后关闭进程池, 在下载全部结束后调用"""
+        while self._skipped_venues:
+            self.extract_venue(self._skipped_venues.pop(), wait=True)
+        if self._executor is not None:
+            self.join()
+            self._executor.shutdown()
+            self._executor = None
+
+
+# 进程内共享的提取器
+extractor = TextExtractor()
+
+
+def _disable(e: ImportError):
+    global enabled
+    enabled = False
+    print_log.error(f"{e}, 不再提取PDF文本")
+
+
+def on_pdf(venue_id: str, paper_id: str, path, pdf_sha256: str):
+    """PDF下载完成后提交提取, 不等待、出错不影响下载"""
+    if not enabled:
+        return
+    try:
+        extractor.submit(venue_id, paper_id, path, pdf_sha256)
+    except ImportError as e:
+        _disable(e)
+    except Exception as e:
+        print_log.error(f"PDF文本提取提交失败: {paper_id}, {e}")
+
+
+def extract_venue(venue_id: str):
+    """会议下载结束后补上之前因在途任务过多跳过的PDF, 同样不等待"""
+    if not enabled:
+        return
+    try:
+        extractor.extract_venue(venue_id)
+    except ImportError as e:
+        _disable(e)
+    except Exception as e:
+        print_log.error(f"{venue_id}: PDF文本提取提交失败: {e}")
+
+
+def main():
+    global worker_num
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("venue_ids", nargs="*", metavar="VENUE_ID")
+    parser.add_argument("--workers", type=int, help="进程数, 默认为CPU核数")
+    args = parser.parse_args()
+    worker_num = args.workers or worker_num
+    try:
+        for venue_id in args.venue_ids or manifest.venues():
+            count = extractor.extract_venue(venue_id, wait=True)
+            print_log.info(f"{venue_id}: 提交{count}个PDF")
+    finally:
+        extractor.close()
+    print_log.info(f"PDF文本提取完成, 跳过{extractor.skipped_count}个")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from core import export, path_index, pdf_text, scheduler, search
+from core.log_config import print_log
+from core.manifest import manifest
+from core.openreview_spider import OpenReviewSpider, PaperDownload
+from core.paper_index import PaperIndex
+from core.progress import tracker
+from core.retry import describe
+from core.review_harvester import ReviewHarvester
+from core.shard import Shard
+
+# 各阶段默认的worker数量
+DEFAULT_WORKER_NUMS = {
+    "list": 1,  # 获取会议的论文列表
+    "plan": 2,  # 生成保存路径并创建目录
+    "pdf": 6,
+    "supplement": 2,
+    "review": 4,
+    "write": 1,  # 写入评审文件并统计进度
+}
+
+_STOP = object()
+
+
+def get_venue_tasks(
+    venue_id: str,
+    incremental: bool = False,
+    bulk_review: bool = True,
+    shard: Shard = None,
+):
+    """获取一个会议剩余的下载任务
+
+    首次获取且不批量获取评审时返回生成器, 论文列表第一页返回后即可开始下载
+
+    Args:
+        shard (Shard): 分片运行时只返回该分片负责的论文
+
+    Returns:
+        Iterable: (paper_info, states), 会议无法获取时为空列表
+    """
+    openreview_spider = OpenReviewSpider(venue_id, incremental=incremental)
+    paper_list = openreview_spider(stream=not bulk_review)
+    if paper_list is False:
+        return []
+    if not isinstance(paper_list, PaperIndex):
+        if shard:
+            paper_list = shard.filter(paper_list)
+        return manifest.pending(venue_id, paper_list, scheduler.artifacts)
+    venue_size = len(paper_list)
+    if shard:
+        paper_list = list(shard.filter(paper_list))
+    # 一次查询清单, 只保留还有下载项未完成的论文
+    task_list = list(manifest.pending(venue_id, paper_list, scheduler.artifacts))
+    # 分片运行时评审已在主进程中批量获取(见main.py的prepare_shards), 剩余的只逐篇获取本分片的论文,
+    # 不再每个分片都批量获取整个会议的回复
+    if bulk_review and not shard:
+        review_list = [i for i, states in task_list if "review" in states]
+        try:
+            harvested = ReviewHarvester(openreview_spider)(review_list, venue_size)
+        except Exception as e:
+            # 已经保存的评审不受影响, 其余的评审在下载时逐篇获取
+            print_log.error(
+                f"{venue_id}: 批量获取评审失败, 改为逐篇获取: {describe(e)}"
+            )
+            harvested = True
+        if harvested:
+            task_list = list(
+                manifest.pending(venue_id, paper_list, scheduler.artifacts)
+            )
+    print_log.info(
+        f"{venue_id}: 共{venue_size}个论文, 负责{len(paper_list)}个, 剩余{len(task_list)}个"
+    )
+    return task_list
+
+
+class Stage:
+    """流水线中的一个阶段: 固定数量的worker从有界队列取任务, 处理结果交给下一个阶段
+
+    队列满时put会阻塞上游, 因此无论会议多大, 在途任务数都不超过各队列容量之和
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func,
+        worker_num: int,
+        queue_size: int,
+        next_stage=None,
+        on_drop=None,
+        fan_out: bool = False,
+    ):
+        """
+        Args:
+            func: 处理函数, 返回None表示任务到此结束
+            on_drop: 任务在本阶段结束(返回None或出错)时的回调
+            fan_out (bool): func返回可迭代对象, 每个元素分别交给下一个阶段
+        """
+        self.name = name
+        self.func = func
+        self.worker_num = worker_num
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.next_stage = next_stage
+        self.on_drop = on_drop
+        self.fan_out = fan_out
+        self._threads = []
+
+    def start(self):
+        for i in range(self.worker_num):
+            thread = threading.Thread(
+                target=self._run, name=f"{self.name}_{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, item):
+        self.queue.put(item)
+
+    def _emit(self, result):
+        if self.next_stage is not None:
+            self.next_stage.put(result)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            try:
+                result = self.func(item)
+                if self.fan_out:
+                    for i in result:
+                        self._emit(i)
+                    continue
+            except Exception as e:
+                print_log.error(f"{self.name}阶段出错: {e.__class__.__name__}: {e}")
+                result = None
+            if result is None:
+                if self.on_drop:
+                    self.on_drop(item)
+                continue
+            self._emit(result)
+
+    def stop(self):
+        """等待队列中已有的任务处理完后结束worker"""
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+
+class DownloadPipeline:
+    """跨会议的流水线下载: 论文列表、路径生成、PDF、支撑文件、评审获取、写入分别为独立阶段
+
+    下一个会议的论文列表在上一个会议下载时就开始获取, 单篇慢论文只占用所在阶段的一个worker
+    """
+
+    def __init__(
+        self,
+        worker_nums: dict = None,
+        queue_size: int = 64,
+        incremental_venue_list=(),
+        bulk_review: bool = True,
+        shard: Shard = None,
+    ):
+        worker_nums = {**DEFAULT_WORKER_NUMS, **(worker_nums or {})}
+        self.incremental_venue_list = incremental_venue_list
+        self.bulk_review = bulk_review
+        self.shard = shard
+        self._lock = threading.Lock()
+        self._submitted = {}  # 每个会议已提交的论文数, 列表获取完成后才确定
+        self._finished = {}
+        self._listed = set()
+        self._list_failed = set()  # 论文列表获取中途出错的会议, 已提交的论文仍然处理完
+        self._closed = set()  # 已经执行过结束处理的会议
+        # 会议结束后的索引、导出等在单独的线程中执行, 不占用写入阶段的worker
+        self._after_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="会议结束"
+        )
+        # 超过scheduler.large_size的支撑文件在写入阶段之后交给大文件通道, 下载完才算处理完
+        self.large_lane = scheduler.LargeLane(on_done=self._finish_task)
+
+        stage = None
+        self.stages = []
+        for name, func in reversed(
+            [
+                ("list", self.list_venue),
+                ("plan", self.plan),
+                ("pdf", self.fetch_pdf),
+                ("supplement", self.fetch_supplement),
+                ("review", self.fetch_review),
+                ("write", self.write),
+            ]
+        ):
+            stage = Stage(
+                name,
+                func,
+                worker_nums[name],
+                queue_size,
+                next_stage=stage,
+                on_drop=self._finish_task if name != "list" else None,
+                fan_out=name == "list",
+            )
+            self.stages.insert(0, stage)
+
+    def list_venue(self, venue_id: str):
+        print_log.info(f"开始获取论文列表: {venue_id}")
+        with self._lock:
+            self._submitted[venue_id] = 0
+            self._finished.setdefault(venue_id, 0)
+        try:
+            task_list = get_venue_tasks(
+                venue_id,
+                venue_id in self.incremental_venue_list,
+                self.bulk_review,
+                self.shard,
+            )
+            for paper_info, states in task_list:
+                with self._lock:
+                    self._submitted[venue_id] += 1
+                tracker.add(venue_id)
+                yield PaperDownload(venue_id, paper_info, states)
+        except Exception as e:
+            print_log.error(
+                f"{venue_id}: 获取论文列表中途出错, 只处理已获取的论文: {describe(e)}"
+            )
+            with self._lock:
+                self._list_failed.add(venue_id)
+        finally:
+            # 出错时同样标记为获取完成, 已提交的论文处理完后照常执行会议结束的处理
+            with self._lock:
+                self._listed.add(venue_id)
+            self._check_venue_done(venue_id)
+
+    @staticmethod
+    def plan(task: PaperDownload):
+        task._generate_save_path()
+        return task
+
+    @staticmethod
+    def fetch_pdf(task: PaperDownload):
+        if task._need_download("pdf", task.paper_save_path):
+            if task._attempt("pdf", task.download_paper) is False:
+                return None
+        return task
+
+    @staticmethod
+    def fetch_supplement(task: PaperDownload):
+        if task._need_download("supplement", task.paper_supplement_save_path):
+            task._attempt("supplement", task.download_paper_supplement)
+        return task
+
+    @staticmethod
+    def fetch_review(task: PaperDownload):
+        if task._need_download("review", task.paper_review_save_path):
+            task._attempt("review", task.fetch_paper_review, finished=False)
+        return task
+
+    def write(self, task: PaperDownload):
+        """返回None时由on_drop结束任务, 交给大文件通道的任务由通道结束"""
+        if task.review is not None:
+            task._attempt("review", task.save_paper_review)
+        if task.large_supplement_size is not None:
+            self.large_lane.put(task, task.large_supplement_size)
+            return task
+        return None
+
+    def _finish_task(self, task: PaperDownload):
+        # 先计入进度, 会议结束时的汇总已包含这篇论文
+        tracker.paper_done(task.venue_id)
+        with self._lock:
+            self._finished[task.venue_id] += 1
+        self._check_venue_done(task.venue_id)
+
+    def _check_venue_done(self, venue_id: str):
+        with self._lock:
+            done = (
+                venue_id in self._listed
+                and venue_id not in self._closed
+                and self._finished[venue_id] == self._submitted[venue_id]
+            )
+            if done:
+                self._closed.add(venue_id)
+            count = self._finished[venue_id]
+            failed = venue_id in self._list_failed
+        if done:
+            if failed:
+                print_log.error(
+                    f"结束: {venue_id}, 论文列表不完整, 共处理{count}个论文"
+                )
+            else:
+                print_log.info(f"结束: {venue_id}, 共处理{count}个论文")
+            tracker.finish_venue(venue_id)
+            self._after_executor.submit(self._after_venue, venue_id)
+
+    @staticmethod
+    def _after_venue(venue_id: str):
+        """会议结束后更新检索索引、路径索引、导出和文本提取, 各自出错不影响下载"""
+        try:
+            search.index_venue(venue_id)
+            path_index.index_venue(venue_id)
+            export.export_venue(venue_id)
+            pdf_text.extract_venue(venue_id)
+        except Exception as e:
+            print_log.error(f"{venue_id}: 会议结束处理出错: {describe(e)}")
+
+    def __call__(self, venue_list: list):
+        self.large_lane.start()
+        for stage in reversed(self.stages):
+            stage.start()
+        for venue_id in venue_list:
+            self.stages[0].put(venue_id)
+        # 按顺序结束各阶段, 上游处理完所有任务后下游才收到结束信号
+        for stage in self.stages:
+            stage.stop()
+        self.large_lane.stop()
+        self._after_executor.shutdown()
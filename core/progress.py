@@ -0,0 +1,132 @@
+"""下载进度: 在内存中计数, 每interval秒输出一行汇总, 代替每篇论文的日志
+
+每个会议一行: 已完成/总数、最近一段时间的速度、预计剩余时间、直接登记的已有文件数、重试次数和记入死信队列的项数;
+detail=True时另外输出每篇论文的日志, 按论文id抽样detail_sample篇中的1篇, 同一篇论文的日志全部输出或全部不输出
+"""
+
+import threading
+import time
+import zlib
+
+from core.log_config import print_log
+from core.metrics import metrics
+
+# 汇总输出的间隔(秒)
+interval = 30
+# 是否输出每篇论文的日志(开始、结束、各下载项成功)
+detail = False
+# 输出每篇论文日志时的抽样比例, 1为全部输出
+detail_sample = 100
+
+
+class VenueProgress:
+    def __init__(self):
+        self.total = 0
+        self.done = 0
+        # 清单中没有记录但文件已存在, 直接登记的下载项
+        self.adopted = 0
+        self.start_time = time.monotonic()
+        # 上次汇总时的完成数和时间, 用于计算最近的速度
+        self.last_done = 0
+        self.last_time = self.start_time
+
+
+class Progress:
+    """按会议统计论文的完成情况, 热路径上只有一次加锁和计数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._venues = {}  # {venue_id: VenueProgress}, 只包含进行中的会议
+        self._report_thread = None
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def sampled(paper_id: str) -> bool:
+        """是否输出这篇论文的日志, detail=False时不计算哈希"""
+        return detail and zlib.crc32(paper_id.encode("utf-8")) % detail_sample == 0
+
+    def _venue(self, venue_id: str) -> VenueProgress:
+        venue = self._venues.get(venue_id)
+        if venue is None:
+            venue = self._venues[venue_id] = VenueProgress()
+        return venue
+
+    def add(self, venue_id: str, count: int = 1):
+        """会议增加count个待下载的论文, 论文列表流式获取时可以多次调用"""
+        with self._lock:
+            self._venue(venue_id).total += count
+
+    def paper_done(self, venue_id: str):
+        with self._lock:
+            self._venue(venue_id).done += 1
+
+    def adopted(self, venue_id: str):
+        """一个已存在的文件直接登记到清单"""
+        with self._lock:
+            self._venue(venue_id).adopted += 1
+
+    def finish_venue(self, venue_id: str):
+        """会议结束, 输出这个会议的最终汇总并不再出现在定期汇总中"""
+        with self._lock:
+            venue = self._venues.pop(venue_id, None)
+        if venue is None:
+            return
+        elapsed = time.monotonic() - venue.start_time
+        print_log.info(
+            f"{venue_id}: 完成{venue.done}/{venue.total}个论文, 用时{elapsed:.0f}秒, "
+            f"{venue.done / max(elapsed, 1e-9):.2f}篇/秒, 已有文件{venue.adopted}个, "
+            f"{self._errors(venue_id)}"
+        )
+
+    @staticmethod
+    def _errors(venue_id: str) -> str:
+        retry = metrics.counter("retry", venue_id)
+        failed = metrics.counter("dead_letter", venue_id)
+        return f"重试{retry:.0f}次, 失败{failed:.0f}项"
+
+    def report(self):
+        """输出进行中的会议的汇总, 速度按上次汇总以来的完成数计算"""
+        now = time.monotonic()
+        lines = []
+        with self._lock:
+            for venue_id, venue in self._venues.items():
+                rate = (venue.done - venue.last_done) / max(now - venue.last_time, 1e-9)
+                venue.last_done, venue.last_time = venue.done, now
+                lines.append((venue_id, venue.done, venue.total, venue.adopted, rate))
+        for venue_id, done, total, adopted, rate in lines:
+            remaining = total - done
+            eta = f"{remaining / rate:.0f}秒" if rate else "未知"
+            print_log.info(
+                f"进度: {venue_id}: {done}/{total}个论文, 剩余{remaining}个, "
+                f"{rate:.2f}篇/秒, 预计剩余{eta}, 已有文件{adopted}个, {self._errors(venue_id)}"
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "papers_total": sum(i.total for i in self._venues.values()),
+                "papers_done": sum(i.done for i in self._venues.values()),
+                "files_adopted": sum(i.adopted for i in self._venues.values()),
+                "venues": len(self._venues),
+            }
+
+    def start_report(self):
+        """后台线程每interval秒输出一次汇总"""
+
+        def run():
+            while not self._stop_event.wait(interval):
+                self.report()
+
+        self._stop_event.clear()
+        self._report_thread = threading.Thread(target=run, name="进度", daemon=True)
+        self._report_thread.start()
+
+    def stop_report(self):
+        if self._report_thread is not None:
+            self._stop_event.set()
+            self._report_thread.join()
+            self._report_thread = None
+
+
+# 进程内共享的进度统计
+tracker = Progress()
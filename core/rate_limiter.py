@@ -0,0 +1,195 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from core.log_config import print_log
+from core.metrics import metrics
+
+
+def parse_retry_after(value) -> float | None:
+    """解析Retry-After响应头, 支持秒数与HTTP日期两种格式
+
+    Returns:
+        float | None: 需要等待的秒数, 无法解析时返回None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveRateLimiter:
+    """进程内共享的令牌桶限速器, 速率按AIMD自适应调整
+
+    - 每个请求发出前预约一个令牌, 令牌按当前速率发放, 允许burst个突发
+    - 遇到429时速率减半, 并按Retry-After暂停所有请求
+    - 请求成功时速率线性恢复, 上限为max_rate
+    """
+
+    def __init__(
+        self,
+        rate: float = 5.0,
+        min_rate: float = 0.2,
+        max_rate: float = 20.0,
+        burst: int = 5,
+        increase_step: float = 0.05,
+        decrease_factor: float = 0.5,
+        default_retry_after: float = 10.0,
+    ):
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.default_retry_after = default_retry_after
+        self._next_time = 0.0  # 下一个令牌的理论发放时间
+        self._last_decrease = 0.0
+        self._paused_until = 0.0  # 按Retry-After暂停的截止时间
+        self.request_count = 0
+        self.throttled_count = 0
+        self.sleep_seconds = 0.0
+
+    def configure(self, **kwargs):
+        """修改限速参数, 参数名与__init__一致"""
+        with self._lock:
+            for key, value in kwargs.items():
+                if not hasattr(self, key) or key.startswith("_"):
+                    raise AttributeError(f"未知的限速参数: {key}")
+                setattr(self, key, value)
+
+    @property
+    def current_rate(self) -> float:
+        """当前使用的速率(请求/秒)"""
+        return self.rate
+
+    def reserve(self) -> float:
+        """预约一个令牌
+
+        Returns:
+            float: 调用方需要等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            interval = 1 / self.rate
+            start = max(now, self._next_time - self.burst * interval)
+            self._next_time = max(self._next_time, now) + interval
+            wait = start - now
+            self.request_count += 1
+            self.sleep_seconds += wait
+            return wait
+
+    def acquire(self):
+        """阻塞直到拿到令牌"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def backlog(self) -> float:
+        """现在预约令牌需要等待的秒数(不预约), 用于在多个限速器之间选择负载最低的"""
+        with self._lock:
+            now = time.monotonic()
+            return max(0.0, self._next_time - self.burst / self.rate - now)
+
+    def throttled(self) -> bool:
+        """是否处于429后的暂停期"""
+        with self._lock:
+            return time.monotonic() < self._paused_until
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_throttle(self, retry_after: float | None = None):
+        """收到429后降低速率, 并在retry_after秒内暂停发放令牌"""
+        delay = self.default_retry_after if retry_after is None else retry_after
+        with self._lock:
+            now = time.monotonic()
+            self.throttled_count += 1
+            # 同一批在途请求的429只降速一次
+            if now >= self._last_decrease + 1 / self.rate:
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self._last_decrease = now
+            interval = 1 / self.rate
+            self._next_time = max(self._next_time, now + delay + self.burst * interval)
+            self._paused_until = max(self._paused_until, now + delay)
+            rate = self.rate
+        print_log.warning(f"网站返回频繁, 暂停{delay:.1f}sec, 速率降为{rate:.2f}次/秒")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate": round(self.rate, 3),
+                "request_count": self.request_count,
+                "throttled_count": self.throttled_count,
+                "sleep_seconds": round(self.sleep_seconds, 3),
+            }
+
+
+class RateLimitAdapter(HTTPAdapter):
+    """所有请求经过限速器的HTTPAdapter, 429时遵守Retry-After自动重试"""
+
+    def __init__(
+        self, limiter: AdaptiveRateLimiter, max_throttle_retries: int = 5, **kwargs
+    ):
+        self.limiter = limiter
+        self.max_throttle_retries = max_throttle_retries
+        super().__init__(**kwargs)
+
+    def _send_once(self, request, **kwargs):
+        return super().send(request, **kwargs)
+
+    def send(self, request, **kwargs):
+        path = urlparse(request.url).path
+        for _ in range(self.max_throttle_retries + 1):
+            self.limiter.acquire()
+            # 流式请求只统计到收到响应头为止
+            with metrics.timer(f"http:{path}"):
+                response = self._send_once(request, **kwargs)
+            metrics.inc("http_status", str(response.status_code))
+            if response.status_code != 429:
+                if response.status_code < 500:
+                    self.limiter.on_success()
+                return response
+            self.limiter.on_throttle(
+                parse_retry_after(response.headers.get("Retry-After"))
+            )
+            response.close()
+        return response
+
+
+# 进程内共享的限速器, 所有爬虫与openreview客户端的请求都经过它
+rate_limiter = AdaptiveRateLimiter()
+
+
+def mount_rate_limiter(
+    session,
+    limiter: AdaptiveRateLimiter = rate_limiter,
+    adapter_class=RateLimitAdapter,
+    **adapter_kwargs,
+):
+    """给requests.Session挂载限速适配器, 保留openreview客户端原有的5xx重试策略
+
+    429交给限速器处理, 不能让urllib3按Retry-After在单个线程内自行重试
+    """
+    retry_strategy = Retry(
+        total=3,
+        backoff_factor=0.1,
+        status_forcelist=[500, 502, 503, 504],
+        respect_retry_after_header=False,
+    )
+    adapter = adapter_class(limiter, max_retries=retry_strategy, **adapter_kwargs)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
@@ -0,0 +1,363 @@
+"""下载项级别的失败隔离: 指数退避加随机抖动的重试、按会议的熔断, 以及持久化的死信队列
+
+单个下载项重试max_attempts次仍失败时记入死信队列(cache/dead_letter.sqlite3), 不影响其他论文,
+之后运行python main.py --replay只重新下载死信队列中的项, 不需要重新扫描会议
+
+用法: python -m core.retry            查看死信队列
+      python -m core.retry --clear    清空死信队列
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import requests
+from openreview.openreview import OpenReviewException
+
+from core.log_config import print_log
+from core.metrics import metrics
+from core.openreview_client import client_pool
+from core.path_config import cache_dir
+
+# 单个下载项的最大尝试次数(含第一次)
+max_attempts = 4
+# 第n次重试前等待[0, min(backoff_max, backoff_base * 2^n))秒中的随机值
+backoff_base = 2.0
+backoff_max = 60.0
+# 熔断: 一个会议最近breaker_window次尝试中失败比例不低于breaker_threshold时, 暂停该会议breaker_pause秒
+breaker_window = 20
+breaker_threshold = 0.5
+breaker_pause = 60.0
+
+# 这些状态码说明请求本身有问题, 重试也不会成功; 401时先重新登录并重试一次
+PERMANENT_STATUS = (400, 401, 403, 404, 410)
+
+
+def error_status(error: Exception):
+    """OpenReviewException中的HTTP状态码, 没有时返回None"""
+    if isinstance(error, OpenReviewException) and error.args:
+        if isinstance(error.args[0], dict):
+            return error.args[0].get("status")
+    return None
+
+
+def is_retryable(error: Exception, extra: tuple = ()) -> bool:
+    """网络错误、超时、5xx和不完整的文件可以重试, 4xx和程序错误不重试
+
+    Args:
+        extra (tuple): 另外可以重试的异常类型, 如aiohttp.ClientError
+    """
+    if isinstance(error, OpenReviewException):
+        return error_status(error) not in PERMANENT_STATUS
+    return isinstance(
+        error,
+        (requests.exceptions.RequestException, OSError, asyncio.TimeoutError, *extra),
+    )
+
+
+def backoff(attempt: int) -> float:
+    """第attempt次重试前等待的秒数(full jitter), 避免大量任务同时重试"""
+    return random.uniform(0, min(backoff_max, backoff_base * 2**attempt))
+
+
+def describe(error: Exception) -> str:
+    return f"{error.__class__.__name__}: {error}"
+
+
+class CircuitBreaker:
+    """按会议统计最近breaker_window次尝试的结果, 失败比例过高时暂停该会议的新请求
+
+    暂停结束后清空统计重新计数, 服务端仍然异常时很快再次暂停
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results = {}  # {venue_id: deque[bool]}
+        self._open_until = {}  # {venue_id: time.monotonic()}
+        self.open_count = 0
+
+    def remaining(self, venue_id: str) -> float:
+        """该会议还需要暂停的秒数"""
+        with self._lock:
+            until = self._open_until.get(venue_id, 0.0)
+        return max(0.0, until - time.monotonic())
+
+    def wait(self, venue_id: str):
+        """会议处于暂停状态时阻塞到暂停结束"""
+        delay = self.remaining(venue_id)
+        if delay:
+            time.sleep(delay)
+
+    def record(self, venue_id: str, success: bool):
+        with self._lock:
+            results = self._results.setdefault(
+                venue_id, collections.deque(maxlen=breaker_window)
+            )
+            results.append(success)
+            failures = results.count(False)
+            if len(results) < breaker_window or failures < breaker_threshold * len(
+                results
+            ):
+                return
+            results.clear()
+            self._open_until[venue_id] = time.monotonic() + breaker_pause
+            self.open_count += 1
+        metrics.inc("circuit_open", venue_id)
+        print_log.warning(
+            f"{venue_id}: 最近{breaker_window}次尝试失败{failures}次, 暂停{breaker_pause}秒"
+        )
+
+
+# 进程内共享的熔断器
+circuit_breaker = CircuitBreaker()
+
+
+def call_with_retry(func, venue_id: str, name: str = ""):
+    """执行func, 可重试的错误按指数退避重试, 每次尝试前检查会议是否处于暂停状态
+
+    func每次调用时通过get_client取得客户端, 返回401时重新登录该客户端的账号并立即重试一次
+
+    Raises:
+        Exception: 不可重试的错误, 或max_attempts次尝试后的最后一个错误
+    """
+    reauthorized = False
+    for attempt in range(max_attempts):
+        circuit_breaker.wait(venue_id)
+        try:
+            result = func()
+        except Exception as e:
+            if (
+                not reauthorized
+                and attempt + 1 < max_attempts
+                and error_status(e) == 401
+                and client_pool.reauthorize()
+            ):
+                reauthorized = True
+                continue
+            circuit_breaker.record(venue_id, False)
+            if attempt + 1 >= max_attempts or not is_retryable(e):
+                raise
+            delay = backoff(attempt)
+            metrics.inc("retry", venue_id)
+            print_log.warning(
+                f"{name}第{attempt + 1}次失败, {delay:.1f}秒后重试: {describe(e)}"
+            )
+            time.sleep(delay)
+        else:
+            circuit_breaker.record(venue_id, True)
+            return result
+
+
+async def call_with_retry_async(
+    func, venue_id: str, name: str = "", retryable: tuple = ()
+):
+    """call_with_retry的协程版本, func返回协程, retryable为另外可以重试的异常类型"""
+    for attempt in range(max_attempts):
+        delay = circuit_breaker.remaining(venue_id)
+        if delay:
+            await asyncio.sleep(delay)
+        try:
+            result = await func()
+        except Exception as e:
+            circuit_breaker.record(venue_id, False)
+            if attempt + 1 >= max_attempts or not is_retryable(e, retryable):
+                raise
+            delay = backoff(attempt)
+            metrics.inc("retry", venue_id)
+            print_log.warning(
+                f"{name}第{attempt + 1}次失败, {delay:.1f}秒后重试: {describe(e)}"
+            )
+            await asyncio.sleep(delay)
+        else:
+            circuit_breaker.record(venue_id, True)
+            return result
+
+
+class DeadLetterQueue:
+    """重试后仍然失败的下载项, 保存论文信息以便不重新扫描会议直接重放
+
+    每个线程使用独立的连接; 记录过的项缓存在内存中, 下载成功时只有在队列中的项才需要删除
+    """
+
+    def __init__(self, db_path: Path = cache_dir / "dead_letter.sqlite3"):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._keys = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=60)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS dead_letter (
+                    venue_id TEXT NOT NULL,
+                    paper_id TEXT NOT NULL,
+                    artifact TEXT NOT NULL,
+                    paper_info TEXT NOT NULL,
+                    error TEXT,
+                    failure_count INTEGER NOT NULL,
+                    failed_at REAL NOT NULL,
+                    PRIMARY KEY (venue_id, paper_id, artifact)
+                ) WITHOUT ROWID
+                """)
+            self._local.conn = conn
+        return conn
+
+    def _load_keys(self) -> set:
+        with self._lock:
+            if self._keys is None:
+                self._keys = {
+                    tuple(row)
+                    for row in self._connect().execute(
+                        "SELECT venue_id, paper_id, artifact FROM dead_letter"
+                    )
+                }
+            return self._keys
+
+    def add(self, venue_id: str, paper_info: dict, artifact: str, error: Exception):
+        """记录一个失败的下载项, 已存在时累加失败次数"""
+        keys = self._load_keys()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO dead_letter VALUES (?, ?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT (venue_id, paper_id, artifact) DO UPDATE SET "
+                "paper_info = excluded.paper_info, error = excluded.error, "
+                "failure_count = failure_count + 1, failed_at = excluded.failed_at",
+                (
+                    venue_id,
+                    paper_info["id"],
+                    artifact,
+                    json.dumps(paper_info, ensure_ascii=False),
+                    describe(error),
+                    time.time(),
+                ),
+            )
+        with self._lock:
+            keys.add((venue_id, paper_info["id"], artifact))
+        metrics.inc("dead_letter", venue_id)
+
+    def discard(self, venue_id: str, paper_id: str, artifact: str):
+        """下载成功后从队列中删除, 不在队列中时不访问数据库"""
+        key = (venue_id, paper_id, artifact)
+        keys = self._load_keys()
+        with self._lock:
+            if key not in keys:
+                return
+            keys.discard(key)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "DELETE FROM dead_letter "
+                "WHERE venue_id = ? AND paper_id = ? AND artifact = ?",
+                key,
+            )
+
+    def merge(self, db_path: Path) -> int:
+        """把另一个死信队列(如分片目录中的)合并进来, 同一项的失败次数相加, 合并后清空对方
+
+        Returns:
+            int: 合并的项数
+        """
+        other = sqlite3.connect(db_path, timeout=60)
+        try:
+            with other:
+                rows = other.execute(
+                    "SELECT venue_id, paper_id, artifact, paper_info, error, "
+                    "failure_count, failed_at FROM dead_letter"
+                ).fetchall()
+                other.execute("DELETE FROM dead_letter")
+        finally:
+            other.close()
+        keys = self._load_keys()
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO dead_letter VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (venue_id, paper_id, artifact) DO UPDATE SET "
+                "paper_info = excluded.paper_info, error = excluded.error, "
+                "failure_count = failure_count + excluded.failure_count, "
+                "failed_at = max(failed_at, excluded.failed_at)",
+                rows,
+            )
+        with self._lock:
+            keys.update(tuple(row[:3]) for row in rows)
+        return len(rows)
+
+    def venues(self) -> list:
+        rows = self._connect().execute(
+            "SELECT DISTINCT venue_id FROM dead_letter ORDER BY venue_id"
+        )
+        return [venue_id for (venue_id,) in rows]
+
+    def tasks(self, venue_id: str) -> list:
+        """一个会议需要重放的任务, 格式与manifest.pending()一致
+
+        Returns:
+            list: (paper_info, {artifact: None}), None表示清单中的记录需要重新检查
+        """
+        tasks = {}
+        rows = self._connect().execute(
+            "SELECT paper_id, artifact, paper_info FROM dead_letter "
+            "WHERE venue_id = ? ORDER BY paper_id",
+            (venue_id,),
+        )
+        for paper_id, artifact, paper_info in rows:
+            if paper_id not in tasks:
+                tasks[paper_id] = (json.loads(paper_info), {})
+            tasks[paper_id][1][artifact] = None
+        return list(tasks.values())
+
+    def rows(self):
+        """全部记录: (venue_id, paper_id, artifact, error, failure_count, failed_at)"""
+        yield from self._connect().execute(
+            "SELECT venue_id, paper_id, artifact, error, failure_count, failed_at "
+            "FROM dead_letter ORDER BY venue_id, paper_id, artifact"
+        )
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM dead_letter")
+        with self._lock:
+            self._keys = set()
+
+
+# 进程内共享的死信队列
+dead_letter = DeadLetterQueue()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--clear", action="store_true", help="清空死信队列")
+    args = parser.parse_args()
+    if args.clear:
+        dead_letter.clear()
+        return
+    count = 0
+    for (
+        venue_id,
+        paper_id,
+        artifact,
+        error,
+        failure_count,
+        failed_at,
+    ) in dead_letter.rows():
+        failed_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(failed_at))
+        print(f"{failed_at} {venue_id} {paper_id} {artifact} x{failure_count} {error}")
+        count += 1
+    print(f"共{count}项")
+
+
+if __name__ == "__main__":
+    main()
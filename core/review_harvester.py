@@ -0,0 +1,91 @@
+import openreview
+
+from core.log_config import print_log
+from core.metrics import metrics
+from core.openreview_client import get_client
+from core.openreview_spider import OpenReviewSpider, review_document, save_review
+from core.retry import call_with_retry
+from module.data_module import PaperPath
+
+
+class ReviewHarvester:
+    """按会议批量获取评审, 代替每篇论文一次get_notes(forum=...)
+
+    按投稿invitation分页获取投稿, 通过details=replies带出每个forum的全部回复,
+    每页处理完即写入对应论文的评审文件, 内存占用只与页大小有关
+    """
+
+    def __init__(self, spider: OpenReviewSpider, page_size: int = 100):
+        self.spider = spider
+        self.venue_id = spider.venue_id
+        self.page_size = page_size
+        self.request_count = 0
+
+    def iter_forums(self, submition_id_list: list):
+        """逐个产出带有全部回复的投稿note"""
+        for submission_id in submition_id_list:
+            after = None
+            while True:
+                with metrics.timer("harvest", self.venue_id):
+                    notes = call_with_retry(
+                        lambda: get_client(self.spider.version).get_notes(
+                            invitation=submission_id,
+                            details="replies",
+                            sort="id",
+                            limit=self.page_size,
+                            after=after,
+                        ),
+                        self.venue_id,
+                        "批量获取评审",
+                    )
+                self.request_count += 1
+                yield from notes
+                if len(notes) < self.page_size:
+                    break
+                after = notes[-1].id
+
+    def forum_review(self, note) -> list:
+        """转换为与逐篇获取相同的评审文件内容: 投稿本身加上全部回复"""
+        note_class = (
+            openreview.Note if self.spider.version == 1 else openreview.api.Note
+        )
+        replies = (note.details or {}).get("replies") or []
+        return review_document(
+            [note.to_json()] + [note_class.from_json(i).to_json() for i in replies]
+        )
+
+    def __call__(self, paper_list: list, venue_size: int = None) -> int:
+        """获取并保存指定论文的评审
+
+        Args:
+            paper_list (list): 需要评审的论文信息列表
+            venue_size (int): 会议论文总数, 需要的论文很少时逐篇获取请求更少, 直接跳过
+
+        Returns:
+            int: 保存成功的论文数量
+        """
+        papers = {i["id"]: i for i in paper_list}
+        if not papers or (venue_size and len(papers) < venue_size / self.page_size):
+            return 0
+        if not hasattr(self.spider, "version") and not self.spider.check_api_version():
+            return 0
+        saved_count = 0
+        for note in self.iter_forums(self.spider.parse_submitions()):
+            paper_info = papers.get(note.id)
+            if paper_info is None:
+                continue
+            paper_path = PaperPath(self.venue_id, paper_info)
+            paper_path.make_dir()
+            save_review(
+                self.venue_id,
+                note.id,
+                self.forum_review(note),
+                paper_path.paper_review_save_path,
+                paper_path.year_dir,
+            )
+            saved_count += 1
+        print_log.info(
+            f"{self.venue_id}: 批量获取评审{saved_count}/{len(papers)}个, "
+            f"共{self.request_count}次请求"
+        )
+        return saved_count
@@ -0,0 +1,290 @@
+"""讨论期的评审刷新: 按tmdate找出有新回复的forum, 最近活跃的优先重新获取, 内容没有变化的不重写
+
+每个forum的指纹(最大tmdate、note数、内容sha256)和每个会议的tmdate游标保存在cache/review_fingerprint.sqlite3,
+每次刷新的请求数与这段时间内的活跃forum数成正比, 与会议的论文总数无关
+
+用法: python -m core.review_refresh VENUE_ID [VENUE_ID ...]   需要先用main.py获取过论文列表
+      --workers N  同时获取forum的线程数
+      --full       忽略游标, 批量重新获取全部forum并重建指纹
+"""
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from core.log_config import print_log
+from core.metrics import metrics
+from core.openreview_client import get_client
+from core.openreview_spider import OpenReviewSpider, review_document, save_review
+from core.path_config import cache_dir
+from core.retry import call_with_retry, dead_letter, describe
+from core.review_harvester import ReviewHarvester
+from module.data_module import PaperPath
+
+# 同时获取forum的线程数, 请求仍受共享限速器限制
+worker_num = 4
+
+
+def fingerprint(review: list, max_tmdate: int) -> tuple:
+    """forum的指纹, Note.to_json()不包含tmdate, 由调用方从note对象中取得
+
+    Returns:
+        tuple: (最大tmdate, note数, 内容sha256)
+    """
+    # review_document已按id排序, 这里再排序一次, 兼容直接传入的note列表
+    notes = sorted(review, key=lambda i: i.get("id") or "")
+    data = json.dumps(notes, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return max_tmdate, len(review), hashlib.sha256(data).hexdigest()
+
+
+class ForumFingerprints:
+    """cache/review_fingerprint.sqlite3中每个forum的指纹与每个会议的游标"""
+
+    def __init__(self, db_path: Path = cache_dir / "review_fingerprint.sqlite3"):
+        self.db_path = db_path
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=60)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS fingerprint (
+                    venue_id TEXT NOT NULL,
+                    forum_id TEXT NOT NULL,
+                    max_tmdate INTEGER NOT NULL,
+                    note_count INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    checked_at REAL NOT NULL,
+                    PRIMARY KEY (venue_id, forum_id)
+                ) WITHOUT ROWID
+                """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS cursor (
+                    venue_id TEXT PRIMARY KEY,
+                    tmdate INTEGER NOT NULL
+                )
+                """)
+        return self._conn
+
+    def cursor(self, venue_id: str):
+        """上次刷新时见到的最大tmdate, 没有刷新过时为None"""
+        row = (
+            self._connect()
+            .execute("SELECT tmdate FROM cursor WHERE venue_id = ?", (venue_id,))
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def save_cursor(self, venue_id: str, tmdate: int):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cursor VALUES (?, ?)", (venue_id, tmdate)
+            )
+
+    def get(self, venue_id: str) -> dict:
+        """一个会议全部forum的指纹
+
+        Returns:
+            dict: {forum_id: (最大tmdate, note数, 内容sha256)}
+        """
+        rows = self._connect().execute(
+            "SELECT forum_id, max_tmdate, note_count, sha256 FROM fingerprint "
+            "WHERE venue_id = ?",
+            (venue_id,),
+        )
+        return {forum_id: tuple(values) for forum_id, *values in rows}
+
+    def update(self, venue_id: str, fingerprints: dict):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO fingerprint VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (venue_id, forum_id, *values, now)
+                    for forum_id, values in fingerprints.items()
+                ],
+            )
+
+
+class ReviewRefresher:
+    """刷新一个会议中有新回复的forum的评审
+
+    第一次刷新(或--full)时批量获取全部forum建立指纹; 之后按游标获取修改过的note,
+    只重新获取最大tmdate比指纹新的forum, 按最近活跃时间从新到旧获取
+    """
+
+    def __init__(self, fingerprints: ForumFingerprints = None, workers: int = None):
+        self.fingerprints = fingerprints or ForumFingerprints()
+        self.worker_num = workers or worker_num
+
+    def _save(self, venue_id: str, paper_info: dict, review: list) -> bool:
+        paper_path = PaperPath(venue_id, paper_info)
+        paper_path.make_dir()
+        return save_review(
+            venue_id,
+            paper_info["id"],
+            review,
+            paper_path.paper_review_save_path,
+            paper_path.year_dir,
+        )
+
+    def _baseline(self, spider: OpenReviewSpider, papers: dict) -> dict:
+        """批量获取全部forum, 建立指纹并保存有变化的评审
+
+        Returns:
+            dict: {"fetched", "written", "cursor"}
+        """
+        harvester = ReviewHarvester(spider)
+        fingerprints, written, cursor = {}, 0, 0
+        for note in harvester.iter_forums(spider.parse_submitions()):
+            paper_info = papers.get(note.id)
+            if paper_info is None:
+                continue
+            review = harvester.forum_review(note)
+            replies = (note.details or {}).get("replies") or []
+            max_tmdate = max(
+                [note.tmdate or 0, *((i.get("tmdate") or 0) for i in replies)]
+            )
+            fingerprints[note.id] = fingerprint(review, max_tmdate)
+            cursor = max(cursor, fingerprints[note.id][0])
+            written += self._save(spider.venue_id, paper_info, review)
+        self.fingerprints.update(spider.venue_id, fingerprints)
+        return {"fetched": len(fingerprints), "written": written, "cursor": cursor}
+
+    def _fetch(self, venue_id: str, api_version: int, paper_info: dict):
+        """获取一个forum的全部note, 重试后仍然失败时记入死信队列并返回None
+
+        Returns:
+            tuple | None: (评审, 最大tmdate)
+        """
+        forum_id = paper_info["id"]
+        try:
+            with metrics.timer("refresh", venue_id):
+                notes = call_with_retry(
+                    lambda: get_client(api_version).get_notes(forum=forum_id),
+                    venue_id,
+                    f"{forum_id} review",
+                )
+        except Exception as e:
+            print_log.error(f"刷新评审失败, 记入死信队列: {forum_id}, {describe(e)}")
+            dead_letter.add(venue_id, paper_info, "review", e)
+            return None
+        return review_document([i.to_json() for i in notes]), max(
+            (i.tmdate or 0 for i in notes), default=0
+        )
+
+    def _active_forums(self, spider: OpenReviewSpider, cursor: int) -> dict:
+        """游标之后有修改的forum
+
+        Returns:
+            dict: {forum_id: 最近一次修改的tmdate}
+        """
+        active = {}
+        for note in spider.get_changed_notes(spider.parse_submitions(), cursor):
+            forum_id = note.forum or note.id
+            active[forum_id] = max(active.get(forum_id, 0), note.tmdate or 0)
+        return active
+
+    def __call__(self, venue_id: str, full: bool = False) -> dict:
+        """
+        Returns:
+            dict: {"active", "fetched", "written", "upgraded"}, 会议无法刷新时为空dict;
+                upgraded为只改写为当前格式(REVIEW_FORMAT)、内容没有比较的评审数
+        """
+        upgraded = metrics.counter("review_upgraded", venue_id)
+        spider = OpenReviewSpider(venue_id)
+        paper_index = spider.load_paper_list()
+        if not paper_index.exists():
+            print_log.warning(f"{venue_id}: 没有论文列表, 先运行main.py下载")
+            return {}
+        if not spider.check_api_version():
+            return {}
+        papers = {i["id"]: i for i in paper_index}
+        cursor = None if full else self.fingerprints.cursor(venue_id)
+        if cursor is not None and spider.version == 1:
+            # V1只能按投稿的invitation查询修改, 回复的修改不会移动游标, 每次都批量获取全部forum
+            print_log.warning(
+                f"{venue_id}: V1接口无法按tmdate获取有修改的回复, 批量获取全部forum"
+            )
+            cursor = None
+        if cursor is None:
+            result = self._baseline(spider, papers)
+            self.fingerprints.save_cursor(venue_id, result.pop("cursor"))
+            result["active"] = result["fetched"]
+            result["upgraded"] = int(
+                metrics.counter("review_upgraded", venue_id) - upgraded
+            )
+            print_log.info(
+                f"{venue_id}: 建立评审指纹{result['fetched']}个, 写入{result['written']}个, "
+                f"格式升级{result['upgraded']}个"
+            )
+            return result
+
+        known = self.fingerprints.get(venue_id)
+        active = self._active_forums(spider, cursor)
+        # 只获取比指纹更新的forum, 最近活跃的优先
+        todo = sorted(
+            (
+                (tmdate, forum_id)
+                for forum_id, tmdate in active.items()
+                if forum_id in papers and tmdate > known.get(forum_id, (0,))[0]
+            ),
+            reverse=True,
+        )
+        fingerprints, written = {}, 0
+        with ThreadPoolExecutor(
+            max_workers=self.worker_num, thread_name_prefix="刷新"
+        ) as executor:
+            reviews = executor.map(
+                lambda item: self._fetch(venue_id, spider.version, papers[item[1]]),
+                todo,
+            )
+            for (_, forum_id), result in zip(todo, reviews):
+                if result is None:
+                    continue
+                review, max_tmdate = result
+                fingerprints[forum_id] = fingerprint(review, max_tmdate)
+                dead_letter.discard(venue_id, forum_id, "review")
+                # tmdate一定比指纹中的新, 只比较note数和内容, 内容没有变化(如修改后又改回)时不重写
+                if fingerprints[forum_id][1:] == known.get(forum_id, ())[1:]:
+                    continue
+                written += self._save(venue_id, papers[forum_id], review)
+        self.fingerprints.update(venue_id, fingerprints)
+        # 有forum获取失败时不前移游标, 下次刷新重新检查
+        if len(fingerprints) == len(todo):
+            self.fingerprints.save_cursor(venue_id, max([cursor, *active.values()]))
+        upgraded = int(metrics.counter("review_upgraded", venue_id) - upgraded)
+        print_log.info(
+            f"{venue_id}: 游标之后有{len(active)}个forum有修改, 获取{len(fingerprints)}/{len(todo)}个, "
+            f"写入{written}个, 格式升级{upgraded}个"
+        )
+        return {
+            "active": len(active),
+            "fetched": len(fingerprints),
+            "written": written,
+            "upgraded": upgraded,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("venue_ids", nargs="+", metavar="VENUE_ID")
+    parser.add_argument("--workers", type=int, help="同时获取forum的线程数")
+    parser.add_argument("--full", action="store_true", help="忽略游标, 重建指纹")
+    args = parser.parse_args()
+    refresher = ReviewRefresher(workers=args.workers)
+    for venue_id in args.venue_ids:
+        refresher(venue_id, args.full)
+
+
+if __name__ == "__main__":
+    main()
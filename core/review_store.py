@@ -0,0 +1,215 @@
+import gzip
+import hashlib
+import json
+import os
+import struct
+import threading
+from pathlib import Path
+
+from core.attachment import fsync_file
+from module.data_module import venue_dir
+
+# 评审的保存方式: "file" 每篇论文一个JSON文件, "segment" 每个会议年份追加到一个压缩的JSONL段
+backend = "file"
+# 段的压缩方式: "gzip", 或"zstd"(需要安装zstandard)
+compression = "gzip"
+
+# 段索引的定长记录: 论文id, 压缩块在段中的偏移和长度; id超过32字节时记录中的id为空,
+# 读取索引时从块中的记录({"id": ..., "notes": ...})取得完整的id
+INDEX_RECORD = struct.Struct("<32sQI")
+SEGMENT_NAMES = {"gzip": "reviews.jsonl.gz", "zstd": "reviews.jsonl.zst"}
+
+
+def _compress(data: bytes, method: str) -> bytes:
+    if method == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("zstd压缩需要安装zstandard") from e
+        return zstandard.ZstdCompressor().compress(data)
+    return gzip.compress(data)
+
+
+def _decompress(data: bytes, method: str) -> bytes:
+    if method == "zstd":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class ReviewSegment:
+    """一个会议年份的评审段
+
+    每篇论文的全部note压缩为一个独立的gzip成员(或zstd帧)追加到段文件末尾, 整个段仍是合法的.gz/.zst文件;
+    索引文件记录每篇论文最新一次写入的偏移和长度, 按论文id读取时只解压对应的块
+    """
+
+    def __init__(self, segment_dir: Path, method: str = None):
+        self.method = method or compression
+        self.path = segment_dir / SEGMENT_NAMES[self.method]
+        self.index_path = self.path.with_name(self.path.name + ".index")
+        self._lock = threading.Lock()
+        self._index = None
+
+    def _load_index(self) -> dict:
+        if self._index is None:
+            index = {}
+            if self.index_path.exists():
+                data = self.index_path.read_bytes()
+                # 写入中断留下的不完整记录直接忽略
+                end = len(data) - len(data) % INDEX_RECORD.size
+                long_ids = []
+                for paper_id, offset, length in INDEX_RECORD.iter_unpack(data[:end]):
+                    paper_id = paper_id.rstrip(b"\0").decode("utf-8")
+                    if paper_id:
+                        index[paper_id] = (offset, length)
+                    else:
+                        long_ids.append((offset, length))
+                if long_ids:
+                    # 索引中的顺序就是写入顺序, 同一篇论文后写入的覆盖先写入的
+                    with open(self.path, "rb") as f:
+                        for offset, length in long_ids:
+                            index[self._read(f, offset, length)["id"]] = (
+                                offset,
+                                length,
+                            )
+            self._index = index
+        return self._index
+
+    @staticmethod
+    def encode(paper_id: str, review: list) -> bytes:
+        """一篇论文在段中的未压缩记录, 下载清单中的sha256按它计算"""
+        data = json.dumps({"id": paper_id, "notes": review}, ensure_ascii=False)
+        return (data + "\n").encode("utf-8")
+
+    def __contains__(self, paper_id: str) -> bool:
+        with self._lock:
+            return paper_id in self._load_index()
+
+    def append(self, paper_id: str, review: list, data: bytes = None):
+        """追加一篇论文的评审, 已有的旧版本留在段中但不再被索引
+
+        Args:
+            data (bytes): 已经编码好的记录(encode的结果), 没有时按review编码
+
+        Returns:
+            tuple: (未压缩的大小, 未压缩内容的sha256)
+        """
+        if data is None:
+            data = self.encode(paper_id, review)
+        block = _compress(data, self.method)
+        record_id = paper_id.encode("utf-8")
+        if len(record_id) > 32:
+            # 过长的id不截断, 读取索引时从块中取得
+            record_id = b""
+        with self._lock:
+            index = self._load_index()
+            with open(self.path, "ab") as f:
+                offset = f.tell()
+                f.write(block)
+                fsync_file(f)
+            # 先写段再写索引, 中途崩溃最多留下没有索引的块
+            with open(self.index_path, "ab") as f:
+                f.write(INDEX_RECORD.pack(record_id, offset, len(block)))
+                fsync_file(f)
+            index[paper_id] = (offset, len(block))
+        return len(data), hashlib.sha256(data).hexdigest()
+
+    def _read(self, f, offset: int, length: int) -> dict:
+        f.seek(offset)
+        return json.loads(_decompress(f.read(length), self.method))
+
+    def get_raw(self, paper_id: str):
+        """按论文id读取解压后的原始记录(与append返回的sha256对应), 不存在时返回None"""
+        with self._lock:
+            position = self._load_index().get(paper_id)
+        if position is None:
+            return None
+        offset, length = position
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return _decompress(f.read(length), self.method)
+
+    def get(self, paper_id: str):
+        """按论文id读取评审, 不存在时返回None"""
+        with self._lock:
+            position = self._load_index().get(paper_id)
+        if position is None:
+            return None
+        with open(self.path, "rb") as f:
+            return self._read(f, *position)["notes"]
+
+    def ids(self) -> list:
+        with self._lock:
+            return list(self._load_index())
+
+    def extend(self, other: "ReviewSegment"):
+        """把另一个段(如分片目录中的段)的全部评审追加到本段"""
+        for paper_id, review in other:
+            self.append(paper_id, review)
+
+    def __iter__(self):
+        """按段中的顺序逐篇产出(paper_id, notes), 每次只解压一篇"""
+        with self._lock:
+            positions = sorted(self._load_index().values())
+        if not positions:
+            return
+        with open(self.path, "rb") as f:
+            for offset, length in positions:
+                record = self._read(f, offset, length)
+                yield record["id"], record["notes"]
+
+
+def segment_method(path: Path):
+    """path是段文件或段索引时返回压缩方式, 否则返回None"""
+    for method, name in SEGMENT_NAMES.items():
+        if path.name in (name, name + ".index"):
+            return method
+    return None
+
+
+class ReviewStore:
+    """进程内共享的评审段, 同一个段的写入由段内的锁串行化"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._segments = {}
+
+    def segment(self, segment_dir: Path, method: str = None) -> ReviewSegment:
+        method = method or compression
+        key = (os.path.abspath(segment_dir), method)
+        with self._lock:
+            if key not in self._segments:
+                self._segments[key] = ReviewSegment(segment_dir, method)
+            return self._segments[key]
+
+    def segments(self, venue_id: str) -> list:
+        """一个会议所有年份的段"""
+        directory = venue_dir(venue_id)
+        if not directory.exists():
+            return []
+        return [
+            self.segment(path.parent, method)
+            for method, name in SEGMENT_NAMES.items()
+            for path in sorted(directory.glob(f"*/{name}"))
+        ]
+
+    def get(self, venue_id: str, paper_id: str):
+        for segment in self.segments(venue_id):
+            review = segment.get(paper_id)
+            if review is not None:
+                return review
+        return None
+
+    def iter_venue(self, venue_id: str):
+        """流式读取一个会议的全部评审
+
+        Yields:
+            tuple: (paper_id, notes)
+        """
+        for segment in self.segments(venue_id):
+            yield from segment
+
+
+review_store = ReviewStore()
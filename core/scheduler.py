@@ -0,0 +1,78 @@
+import itertools
+import queue
+import threading
+
+from core.log_config import print_log
+from core.manifest import ARTIFACTS
+
+# 本次运行下载的项, 可以是ARTIFACTS的子集, 如("pdf", "review")
+artifacts = ARTIFACTS
+# 支撑文件的大小上限(字节), 超过时不下载并在下载清单中记为skipped, None表示不限制
+max_supplement_size = None
+# 超过该大小(字节)的支撑文件从快速通道转到大文件通道
+large_size = 64 * 1024 * 1024
+# 大文件通道的线程数(协程引擎中为同时下载的大文件数)
+large_worker_num = 2
+
+
+def supplement_limit() -> int:
+    """快速通道下载支撑文件时的大小上限"""
+    if max_supplement_size is None:
+        return large_size
+    return min(large_size, max_supplement_size)
+
+
+class LargeLane:
+    """大文件通道: 快速通道按Content-Length转过来的支撑文件, 由固定数量的线程按大小从小到大下载
+
+    快速通道的线程不会被大文件占满, 小文件先完成, 单位时间完成的论文数更多
+    """
+
+    def __init__(self, worker_num: int = None, on_done=None):
+        """
+        Args:
+            on_done: 每个任务完成(无论成功与否)后的回调, 参数为任务
+        """
+        self.worker_num = worker_num or large_worker_num
+        self.on_done = on_done
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.worker_num):
+            thread = threading.Thread(target=self._run, name=f"大文件-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def put(self, task, size: int):
+        """task需要实现download_large_supplement()"""
+        self._queue.put((size, next(self._counter), task))
+
+    def _run(self):
+        while True:
+            size, _, task = self._queue.get()
+            if task is None:
+                return
+            try:
+                task.download_large_supplement()
+            except Exception as e:
+                print_log.exception(e)
+            finally:
+                if self.on_done:
+                    self.on_done(task)
+
+    def stop(self):
+        """等待队列中的大文件下载完后结束"""
+        for _ in self._threads:
+            self._queue.put((float("inf"), next(self._counter), None))
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
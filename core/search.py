@@ -0,0 +1,367 @@
+"""本地全文检索: 标题与评审内容建立SQLite FTS5索引, 按会议、年份、决定和评分过滤
+
+用法: python -m core.search "graph neural network" --venue ICLR.cc --year 2023 --decision accept --min-rating 6
+      python -m core.search --update                  更新全部会议的索引
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+from core import review_store
+from core.log_config import print_log
+from core.manifest import manifest
+from core.metrics import metrics
+from core.openreview_spider import OpenReviewSpider
+from core.path_config import cache_dir
+
+# 每个会议下载结束后是否更新检索索引
+enabled = True
+
+# 评审中作为评分的字段, 取各条评审开头数字的平均值
+RATING_FIELDS = ("rating", "recommendation", "overall_rating", "overall_recommendation")
+# 不参与全文检索的字段
+SKIP_FIELDS = {
+    "pdf",
+    "supplementary_material",
+    "_bibtex",
+    "paperhash",
+    "authorids",
+    "venueid",
+}
+
+
+def content_value(value):
+    """V2的content字段为{"value": ...}"""
+    if isinstance(value, dict):
+        return value.get("value")
+    return value
+
+
+def parse_number(value):
+    """解析评分, 如6或"6: Marginally above acceptance threshold", 无法解析时返回None"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    match = re.match(r"\s*(-?\d+(?:\.\d+)?)", str(value))
+    return float(match.group(1)) if match else None
+
+
+def parse_review(review: list) -> dict:
+    """从forum下全部note中提取检索内容、决定和平均评分
+
+    没有决定note时使用投稿的venue字段(如"ICLR 2024 poster")
+    """
+    texts, ratings = [], []
+    decision = venue = None
+    for note in review:
+        content = note.get("content") or {}
+        for key, value in content.items():
+            value = content_value(value)
+            if key == "decision":
+                decision = str(value)
+            elif key == "venue":
+                venue = str(value)
+            elif key in RATING_FIELDS:
+                rating = parse_number(value)
+                if rating is not None:
+                    ratings.append(rating)
+            if key in SKIP_FIELDS or value is None:
+                continue
+            if isinstance(value, list):
+                texts.extend(str(i) for i in value)
+            elif isinstance(value, str):
+                texts.append(value)
+    return {
+        "body": "\n".join(texts),
+        "decision": decision or venue,
+        "rating": round(sum(ratings) / len(ratings), 2) if ratings else None,
+    }
+
+
+def load_review(paper_id: str, path: str):
+    """按下载清单中的路径读取评审, 文件不存在时返回None"""
+    path = Path(path)
+    method = review_store.segment_method(path)
+    if method:
+        return review_store.review_store.segment(path.parent, method).get(paper_id)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def like_escape(value: str) -> str:
+    """转义LIKE中的通配符, 与ESCAPE '\\'一起使用"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def match_query(query: str) -> str:
+    """把用户输入转换为FTS5查询: 每个词加引号后按AND组合, 以*结尾的词按前缀匹配"""
+    terms = []
+    for term in query.split():
+        prefix = term.endswith("*")
+        term = term.rstrip("*").replace('"', '""')
+        if term:
+            terms.append(f'"{term}"*' if prefix else f'"{term}"')
+    return " ".join(terms)
+
+
+# 论文表, 同一论文id可以出现在多个会议中
+PAPER_TABLE = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY,
+        paper_id TEXT NOT NULL,
+        venue_id TEXT NOT NULL,
+        year INTEGER,
+        title TEXT NOT NULL,
+        decision TEXT,
+        rating REAL,
+        review_sha256 TEXT,
+        UNIQUE (venue_id, paper_id)
+    )
+    """
+
+
+class SearchIndex:
+    """SQLite FTS5检索索引, paper表保存过滤字段, paper_fts表以相同的rowid保存标题和评审全文
+
+    更新时只处理标题或年份变化的论文, 以及评审sha256与下载清单不一致的论文
+    """
+
+    def __init__(self, db_path: Path = cache_dir / "search.sqlite3"):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=60)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(PAPER_TABLE.format(name="paper"))
+            self._migrate(conn)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS paper_venue ON paper (venue_id, year)"
+            )
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS paper_fts "
+                "USING fts5(title, body, tokenize='porter unicode61')"
+            )
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection):
+        """旧版本的paper_id在所有会议中唯一, 同一id出现在两个会议时写入失败; 重建为(venue_id, paper_id)唯一,
+        保留id, 与paper_fts的rowid仍然对应"""
+        (sql,) = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'paper'"
+        ).fetchone()
+        if "UNIQUE (venue_id, paper_id)" in sql:
+            return
+        with conn:
+            conn.execute(PAPER_TABLE.format(name="paper_new"))
+            conn.execute(
+                "INSERT INTO paper_new (id, paper_id, venue_id, year, title, decision, "
+                "rating, review_sha256) SELECT id, paper_id, venue_id, year, title, "
+                "decision, rating, review_sha256 FROM paper"
+            )
+            conn.execute("DROP TABLE paper")
+            conn.execute("ALTER TABLE paper_new RENAME TO paper")
+
+    def update_venue(self, venue_id: str) -> int:
+        """把一个会议的论文列表和已下载的评审增量写入索引
+
+        Returns:
+            int: 新增或更新的论文数量
+        """
+        paper_index = OpenReviewSpider(venue_id).load_paper_list()
+        if not paper_index.exists():
+            return 0
+        updated = set()
+        with self._lock, metrics.timer("index", venue_id):
+            conn = self._connect()
+            with conn:
+                indexed = {
+                    paper_id: (rowid, title, year, review_sha256)
+                    for rowid, paper_id, title, year, review_sha256 in conn.execute(
+                        "SELECT id, paper_id, title, year, review_sha256 "
+                        "FROM paper WHERE venue_id = ?",
+                        (venue_id,),
+                    )
+                }
+                for paper in paper_index:
+                    paper_id, title = paper["id"], paper["title"]
+                    year = int(paper["year"])
+                    if paper_id not in indexed:
+                        rowid = conn.execute(
+                            "INSERT INTO paper (paper_id, venue_id, year, title) "
+                            "VALUES (?, ?, ?, ?)",
+                            (paper_id, venue_id, year, title),
+                        ).lastrowid
+                        conn.execute(
+                            "INSERT INTO paper_fts (rowid, title, body) VALUES (?, ?, '')",
+                            (rowid, title),
+                        )
+                        indexed[paper_id] = (rowid, title, year, None)
+                        updated.add(paper_id)
+                    elif indexed[paper_id][1:3] != (title, year):
+                        rowid = indexed[paper_id][0]
+                        conn.execute(
+                            "UPDATE paper SET title = ?, year = ? WHERE id = ?",
+                            (title, year, rowid),
+                        )
+                        conn.execute(
+                            "UPDATE paper_fts SET title = ? WHERE rowid = ?",
+                            (title, rowid),
+                        )
+                        updated.add(paper_id)
+                for paper_id, sha256, path in manifest.done(venue_id, "review"):
+                    if paper_id not in indexed or indexed[paper_id][3] == sha256:
+                        continue
+                    review = load_review(paper_id, path)
+                    if review is None:
+                        continue
+                    rowid = indexed[paper_id][0]
+                    parsed = parse_review(review)
+                    conn.execute(
+                        "UPDATE paper SET decision = ?, rating = ?, review_sha256 = ? "
+                        "WHERE id = ?",
+                        (parsed["decision"], parsed["rating"], sha256, rowid),
+                    )
+                    conn.execute(
+                        "UPDATE paper_fts SET body = ? WHERE rowid = ?",
+                        (parsed["body"], rowid),
+                    )
+                    updated.add(paper_id)
+        print_log.info(f"{venue_id}: 检索索引更新{len(updated)}个论文")
+        return len(updated)
+
+    def search(
+        self,
+        query: str = None,
+        venue_id: str = None,
+        year: int = None,
+        decision: str = None,
+        min_rating: float = None,
+        max_rating: float = None,
+        title_only: bool = False,
+        limit: int = 20,
+    ) -> list:
+        """按关键词检索, 有关键词时按相关度(bm25)排序, 否则按评分排序
+
+        Args:
+            query (str): 关键词, 空格分隔的词同时匹配, 以*结尾的词按前缀匹配
+            venue_id (str): 会议id或其前缀, 如"ICLR.cc"
+            decision (str): 决定中包含的文字(不区分大小写), 如"accept"、"oral"
+            title_only (bool): 只检索标题
+
+        Returns:
+            list: 论文信息(paper_id, venue_id, year, title, decision, rating, snippet)
+        """
+        conditions, args = [], []
+        if query and match_query(query):
+            match = match_query(query)
+            conditions.append("paper_fts MATCH ?")
+            args.append(f"title : ({match})" if title_only else match)
+            order = "bm25(paper_fts, 10.0, 1.0)"
+            snippet = "snippet(paper_fts, 1, '[', ']', '...', 16)"
+        else:
+            order = "paper.rating IS NULL, paper.rating DESC"
+            snippet = "''"
+        if venue_id:
+            conditions.append("paper.venue_id LIKE ? ESCAPE '\\'")
+            args.append(f"{like_escape(venue_id)}%")
+        if year:
+            conditions.append("paper.year = ?")
+            args.append(int(year))
+        if decision:
+            conditions.append("paper.decision LIKE ? ESCAPE '\\'")
+            args.append(f"%{like_escape(decision)}%")
+        if min_rating is not None:
+            conditions.append("paper.rating >= ?")
+            args.append(min_rating)
+        if max_rating is not None:
+            conditions.append("paper.rating <= ?")
+            args.append(max_rating)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._connect().execute(
+            "SELECT paper.paper_id, paper.venue_id, paper.year, paper.title, "
+            f"paper.decision, paper.rating, {snippet} "
+            "FROM paper_fts JOIN paper ON paper.id = paper_fts.rowid "
+            f"{where} ORDER BY {order} LIMIT ?",
+            (*args, limit),
+        )
+        keys = ("paper_id", "venue_id", "year", "title", "decision", "rating")
+        return [{**dict(zip(keys, row)), "snippet": row[-1]} for row in rows]
+
+    def venues(self) -> list:
+        rows = self._connect().execute("SELECT DISTINCT venue_id FROM paper")
+        return [venue_id for (venue_id,) in rows]
+
+
+# 进程内共享的检索索引
+search_index = SearchIndex()
+
+
+def index_venue(venue_id: str):
+    """会议下载结束后更新检索索引, 出错不影响下载"""
+    if not enabled:
+        return
+    try:
+        search_index.update_venue(venue_id)
+    except Exception as e:
+        print_log.error(f"{venue_id}: 检索索引更新失败: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("query", nargs="?", help="关键词")
+    parser.add_argument("--venue", help="会议id或其前缀")
+    parser.add_argument("--year", type=int)
+    parser.add_argument("--decision", help="决定中包含的文字, 如accept、oral")
+    parser.add_argument("--min-rating", type=float)
+    parser.add_argument("--max-rating", type=float)
+    parser.add_argument("--title", action="store_true", help="只检索标题")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument(
+        "--update",
+        nargs="*",
+        metavar="VENUE_ID",
+        help="更新指定会议的索引, 不指定时更新下载清单中的全部会议",
+    )
+    args = parser.parse_args()
+    if args.update is not None:
+        for venue_id in args.update or manifest.venues():
+            search_index.update_venue(venue_id)
+        if not args.query:
+            return
+    results = search_index.search(
+        args.query,
+        venue_id=args.venue,
+        year=args.year,
+        decision=args.decision,
+        min_rating=args.min_rating,
+        max_rating=args.max_rating,
+        title_only=args.title,
+        limit=args.limit,
+    )
+    for i in results:
+        print(
+            f"{i['rating'] if i['rating'] is not None else '-':>5} "
+            f"{i['venue_id']} {i['year']} {i['paper_id']} {i['title']}"
+            f" [{i['decision'] or '-'}]"
+        )
+        if i["snippet"]:
+            print(f"      {' '.join(i['snippet'].split())}")
+    print(f"共{len(results)}条结果")
+
+
+if __name__ == "__main__":
+    main()
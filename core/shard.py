@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+from core.log_config import print_log
+from core.manifest import DownloadManifest, manifest
+from core.openreview_client import (
+    ENV_CREDENTIALS,
+    accounts_file_path,
+    config_file_path,
+)
+from core.openreview_spider import OpenReviewSpider
+from core.path_config import cache_dir, data_dir
+from core.retry import dead_letter
+from core.review_store import ReviewSegment, review_store, segment_method
+
+# 本机多进程分片时每个分片的工作目录为shards/<i>, 其中的cache、data、logs互不影响
+shard_root = Path("shards")
+
+
+def shard_of(paper_id: str, shard_count: int) -> int:
+    """按论文id的哈希分片, 不同进程、不同机器的结果一致"""
+    digest = hashlib.blake2b(paper_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shard_count
+
+
+class Shard:
+    """第index个分片(从0开始), 共count个"""
+
+    def __init__(self, index: int, count: int):
+        if not 0 <= index < count:
+            raise ValueError(f"分片序号超出范围: {index}/{count}")
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def parse(cls, value: str) -> "Shard":
+        """解析命令行参数, 格式为i/N"""
+        index, count = value.split("/")
+        return cls(int(index), int(count))
+
+    def owns(self, paper_info: dict) -> bool:
+        return shard_of(paper_info["id"], self.count) == self.index
+
+    def filter(self, paper_list):
+        return (i for i in paper_list if self.owns(i))
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+
+def shard_env(index: int) -> dict:
+    """分片进程的环境变量
+
+    设置了OPENREVIEW_USERNAME_<i>/OPENREVIEW_PASSWORD_<i>时该分片使用单独的账号, 否则使用共同的账号
+    """
+    env = dict(os.environ)
+    for name in ENV_CREDENTIALS:
+        if f"{name}_{index}" in env:
+            env[name] = env[f"{name}_{index}"]
+    # 分片在自己的目录下运行, 配置文件使用绝对路径
+    env.setdefault("OPENREVIEW_CONFIG", str(config_file_path.resolve()))
+    env.setdefault("OPENREVIEW_ACCOUNTS", str(accounts_file_path.resolve()))
+    return env
+
+
+def venue_cache_files(venue_id: str) -> list:
+    """会议的论文索引和tmdate游标文件, 游标放在最后, 复制时索引先于游标就位"""
+    spider = OpenReviewSpider(venue_id)
+    return [
+        spider.paper_index.index_path,
+        spider.paper_index.titles_path,
+        spider.cursor_file_path,
+    ]
+
+
+def seed_shards(shard_count: int, venue_ids: list, root: Path = shard_root):
+    """把主进程获取的会议信息、论文索引、游标和下载清单复制到各分片目录
+
+    分片进程直接使用缓存的论文索引, 不再各自获取整个会议的论文列表和评审;
+    下载清单中包括主进程批量获取的评审和增量同步标记的过期项
+    """
+    files = [cache_dir / "venue_plan.json", cache_dir / "venues.json"]
+    for venue_id in venue_ids:
+        files.extend(venue_cache_files(venue_id))
+    rows = list(manifest.rows())
+    for index in range(shard_count):
+        shard_cache_dir = root / str(index) / "cache"
+        shard_cache_dir.mkdir(parents=True, exist_ok=True)
+        for path in files:
+            if path.exists():
+                shutil.copy2(path, shard_cache_dir / path.name)
+        DownloadManifest(shard_cache_dir / "manifest.sqlite3").record_many(rows)
+    print_log.info(
+        f"已把{len(venue_ids)}个会议的论文索引和下载清单复制到{shard_count}个分片"
+    )
+
+
+def _load_cursor(path: Path) -> int:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["tmdate"]
+
+
+def merge_cursors(shard_cache_dir: Path) -> int:
+    """分片的tmdate游标比主目录新(或主目录没有)时, 连同对应的论文索引一起复制到主目录
+
+    Returns:
+        int: 更新的会议数量
+    """
+    count = 0
+    for cursor_path in shard_cache_dir.glob("*.cursor.json"):
+        target = cache_dir / cursor_path.name
+        if target.exists() and _load_cursor(target) >= _load_cursor(cursor_path):
+            continue
+        stem = cursor_path.name[: -len(".cursor.json")]
+        paths = [shard_cache_dir / f"{stem}.index", shard_cache_dir / f"{stem}.titles"]
+        if not all(i.exists() for i in paths):
+            continue
+        # 先复制索引再复制游标, 中途中断时游标不会超前于索引
+        for path in paths + [cursor_path]:
+            shutil.copy2(path, cache_dir / path.name)
+        count += 1
+    return count
+
+
+def run_shards(shard_count: int, script_path: Path, args=()) -> bool:
+    """启动shard_count个分片进程并等待结束, 每个进程有独立的账号、限速器和下载清单
+
+    Returns:
+        bool: 全部分片是否正常结束
+    """
+    processes = []
+    for index in range(shard_count):
+        shard_dir = shard_root / str(index)
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        processes.append(
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    str(script_path),
+                    "--shard",
+                    f"{index}/{shard_count}",
+                    *args,
+                ],
+                cwd=shard_dir,
+                env=shard_env(index),
+            )
+        )
+        print_log.info(f"启动分片: {index}/{shard_count}, 目录: {shard_dir}")
+    success = True
+    for index, process in enumerate(processes):
+        if process.wait() != 0:
+            print_log.error(f"分片{index}/{shard_count}异常退出: {process.returncode}")
+            success = False
+    return success
+
+
+def merge_shards(root: Path = shard_root) -> int:
+    """把各分片目录(<root>/<i>/data与<root>/<i>/cache中的下载清单、死信队列和tmdate游标)合并到主目录
+
+    多台机器运行时, 把每台机器的data和cache目录复制到<root>/<i>下再合并
+
+    Returns:
+        int: 移动的文件数量
+    """
+    moved_count = 0
+    for shard_dir in sorted(i for i in root.iterdir() if i.is_dir()):
+        shard_data_dir = shard_dir / "data"
+        if shard_data_dir.exists():
+            for path in list(shard_data_dir.rglob("*")):
+                # 未下载完的.part文件留在分片目录, 下次运行该分片时继续
+                if not path.is_file() or path.suffix == ".part":
+                    continue
+                target = data_dir / path.relative_to(shard_data_dir)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                method = segment_method(path)
+                if method:
+                    # 评审段不能直接覆盖, 逐篇追加到目标段, 追加完删除分片的段, 重复合并不会再次追加
+                    if not path.name.endswith(".index"):
+                        segment = ReviewSegment(path.parent, method)
+                        review_store.segment(target.parent, method).extend(segment)
+                        segment.path.unlink()
+                        segment.index_path.unlink(missing_ok=True)
+                        moved_count += 1
+                    continue
+                shutil.move(path, target)
+                moved_count += 1
+        manifest_path = shard_dir / "cache" / "manifest.sqlite3"
+        if manifest_path.exists():
+            # 清单中的路径相对于各自的工作目录, 合并后同样有效; 只替换比主目录更新的记录, 合并后清空分片的清单
+            manifest.merge(manifest_path)
+        dead_letter_path = shard_dir / "cache" / "dead_letter.sqlite3"
+        if dead_letter_path.exists():
+            # 分片中的死信项移动到主目录的死信队列, 用--replay重放
+            dead_letter.merge(dead_letter_path)
+        if (shard_dir / "cache").exists():
+            merge_cursors(shard_dir / "cache")
+        print_log.info(f"合并分片: {shard_dir}")
+    print_log.info(f"合并完成, 共移动{moved_count}个文件")
+    return moved_count
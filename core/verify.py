@@ -0,0 +1,182 @@
+"""下载数据的完整性校验: 在进程池中检查下载清单中已完成的文件, 损坏或缺失的项标记为过期, 下次运行重新下载
+
+用法: python -m core.verify [VENUE_ID ...]   不指定会议时校验下载清单中的全部会议
+      --workers N  进程数, 默认为CPU核数
+      --full       忽略上次的校验结果, 全部重新计算哈希
+      --deep       同时校验zip中每个文件的CRC
+"""
+
+import argparse
+import hashlib
+import sqlite3
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from core.attachment import check_file, file_digest
+from core.log_config import print_log
+from core.manifest import manifest
+from core.path_config import cache_dir
+from core.review_store import review_store, segment_method
+
+
+def verify_item(item: tuple) -> tuple:
+    """在子进程中校验一个下载项: 大小、文件结构和sha256, 评审段按论文id读取原始记录校验sha256
+
+    Args:
+        item (tuple): (venue_id, paper_id, artifact, size, sha256, path, deep)
+
+    Returns:
+        tuple: (venue_id, paper_id, artifact, 损坏原因, 文件修改时间), 正常时损坏原因为None
+    """
+    venue_id, paper_id, artifact, size, sha256, path, deep = item
+    path = Path(path)
+    reason, mtime_ns = None, None
+    try:
+        method = segment_method(path)
+        if method:
+            data = review_store.segment(path.parent, method).get_raw(paper_id)
+            if data is None:
+                reason = "评审段中没有记录"
+            elif sha256 and hashlib.sha256(data).hexdigest() != sha256:
+                reason = "sha256不一致"
+        elif not path.exists():
+            reason = "文件不存在"
+        else:
+            stat = path.stat()
+            mtime_ns = stat.st_mtime_ns
+            if size is not None and stat.st_size != size:
+                reason = f"大小不一致: 记录{size}字节, 实际{stat.st_size}字节"
+            else:
+                reason = check_file(path, deep)
+            if reason is None and sha256 and file_digest(path)[1] != sha256:
+                reason = "sha256不一致"
+    except (OSError, zlib.error, EOFError) as e:
+        reason = f"读取失败: {e}"
+    return venue_id, paper_id, artifact, reason, mtime_ns
+
+
+class Verifier:
+    """校验下载清单中已完成的文件
+
+    校验通过的结果保存在cache/verify.sqlite3, 文件大小、修改时间和清单中的sha256都没变时跳过
+    """
+
+    def __init__(self, db_path: Path = cache_dir / "verify.sqlite3"):
+        self.db_path = db_path
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=60)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS verified (
+                    venue_id TEXT NOT NULL,
+                    paper_id TEXT NOT NULL,
+                    artifact TEXT NOT NULL,
+                    sha256 TEXT,
+                    mtime_ns INTEGER,
+                    verified_at REAL NOT NULL,
+                    PRIMARY KEY (venue_id, paper_id, artifact)
+                ) WITHOUT ROWID
+                """)
+        return self._conn
+
+    def _unchanged(self, verified: dict, row: tuple) -> bool:
+        venue_id, paper_id, artifact, _, size, sha256, path, _ = row
+        record = verified.get((venue_id, paper_id, artifact))
+        if record is None or record[0] != sha256:
+            return False
+        if record[1] is None:  # 评审段中的记录, sha256没变即可
+            return True
+        try:
+            stat = Path(path).stat()
+        except OSError:
+            return False
+        return stat.st_mtime_ns == record[1] and size in (None, stat.st_size)
+
+    def __call__(
+        self,
+        venue_ids=None,
+        worker_num: int = None,
+        full: bool = False,
+        deep: bool = False,
+    ) -> dict:
+        """校验指定会议(默认全部), 损坏的项在下载清单中标记为过期
+
+        Returns:
+            dict: {"checked", "skipped", "damaged"}
+        """
+        venue_ids = set(venue_ids or manifest.venues())
+        conn = self._connect()
+        verified = {}
+        if not full:
+            for venue_id, paper_id, artifact, sha256, mtime_ns in conn.execute(
+                "SELECT venue_id, paper_id, artifact, sha256, mtime_ns FROM verified"
+            ):
+                verified[(venue_id, paper_id, artifact)] = (sha256, mtime_ns)
+        todo, skipped = [], 0
+        for row in manifest.rows():
+            if row[0] not in venue_ids or row[3] != "done" or not row[6]:
+                continue
+            if self._unchanged(verified, row):
+                skipped += 1
+                continue
+            venue_id, paper_id, artifact, _, size, sha256, path, _ = row
+            todo.append((venue_id, paper_id, artifact, size, sha256, path, deep))
+
+        passed, damaged = [], {}
+        now = time.time()
+        with ProcessPoolExecutor(max_workers=worker_num) as executor:
+            results = executor.map(verify_item, todo, chunksize=64)
+            for item, (venue_id, paper_id, artifact, reason, mtime_ns) in zip(
+                todo, results
+            ):
+                if reason is None:
+                    passed.append(
+                        (venue_id, paper_id, artifact, item[4], mtime_ns, now)
+                    )
+                    continue
+                print_log.warning(
+                    f"文件损坏: {venue_id} {paper_id} {artifact}, {reason}"
+                )
+                damaged.setdefault((venue_id, artifact), []).append(paper_id)
+
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO verified VALUES (?, ?, ?, ?, ?, ?)", passed
+            )
+            conn.executemany(
+                "DELETE FROM verified WHERE venue_id = ? AND paper_id = ? AND artifact = ?",
+                [
+                    (venue_id, paper_id, artifact)
+                    for (venue_id, artifact), paper_ids in damaged.items()
+                    for paper_id in paper_ids
+                ],
+            )
+        # 标记为过期后, 下次运行会重新下载并覆盖损坏的文件
+        for (venue_id, artifact), paper_ids in damaged.items():
+            manifest.mark_stale(venue_id, paper_ids, [artifact])
+        damaged_count = sum(len(i) for i in damaged.values())
+        print_log.info(
+            f"校验完成: 检查{len(todo)}个, 未变化跳过{skipped}个, 损坏{damaged_count}个"
+        )
+        return {"checked": len(todo), "skipped": skipped, "damaged": damaged_count}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("venue_ids", nargs="*", metavar="VENUE_ID")
+    parser.add_argument("--workers", type=int, help="进程数, 默认为CPU核数")
+    parser.add_argument("--full", action="store_true", help="忽略上次的校验结果")
+    parser.add_argument("--deep", action="store_true", help="校验zip中每个文件的CRC")
+    args = parser.parse_args()
+    Verifier()(args.venue_ids, args.workers, args.full, args.deep)
+
+
+if __name__ == "__main__":
+    main()
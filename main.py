@@ -1,16 +1,34 @@
+import argparse
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
 
+from core import (
+    attachment,
+    discovery,
+    export,
+    path_index,
+    pdf_text,
+    progress,
+    retry,
+    review_store,
+    scheduler,
+    search,
+)
+from core.async_download import AsyncPaperDownload
+from core.http_pool import configure_pool, connection_stats
 from core.log_config import print_log
-from core.openreview_spider import OpenReviewSpider, PaperDownload, get_all_venues
-from module.data_module import DownlaodModule
-from module.params_module import params_module_list
+from core.manifest import manifest
+from core.metrics import metrics
+from core.openreview_spider import PaperDownload
+from core.pipeline import DownloadPipeline, get_venue_tasks
+from core.rate_limiter import rate_limiter
+from core.retry import dead_letter, describe
+from core.review_refresh import ReviewRefresher
+from core.shard import Shard, merge_shards, run_shards, seed_shards
+from module import data_module
 
-# 获取所有会议的venue_id
-venue_list = get_all_venues()
-venue_count = len(venue_list)
-print_log.info(f"全部共{venue_count}个会议, 保存在./cache/venues.json中的members字段")
-# 指定要获取的venue_id
+# 指定要获取的venue_id, 全部会议的venue_id在第一次运行后保存在./cache/venues.json中的members字段
 venue_list = [
     "ICLR.cc/2020/Conference",
     "ICLR.cc/2021/Conference",
@@ -30,12 +48,100 @@ venue_list = [
 ]
 
 venue_count = len(venue_list)
-print_log.info(f"指定需要获取{venue_count}个会议")
+# 仍在进行中的会议, 每次运行只同步上次之后修改过的论文与评审
+incremental_venue_list = [
+    "NeurIPS.cc/2025/Conference",
+]
+# 会议信息(API版本、投稿invitation)缓存在cache/venue_plan.json中的有效期(秒), 开始下载前并发获取过期的会议
+discovery.ttl = 7 * 24 * 3600
+discovery.worker_num = 8
 # 线程数设置
 thread_num = 6
+# 每个host保持的长连接数, 不小于线程数; use_http2=True时使用HTTP/2多路复用(需要httpx[http2])
+pool_size = max(thread_num, 16)
+use_http2 = False
+# 下载引擎: "thread" 线程池, "async" 协程, "pipeline" 跨会议流水线
+engine = "thread"
+# 流水线引擎各阶段的worker数量, 未指定的阶段使用core/pipeline.py中的默认值
+stage_worker_nums = {"list": 1, "pdf": thread_num, "review": 4}
+# 协程引擎同时在途的论文数
+concurrency = 64
+# 按会议批量获取评审(details=replies分页), 代替每篇论文一次get_notes
+bulk_review = True
+# 本次运行下载的项, 如只要pdf和评审时为("pdf", "review")
+scheduler.artifacts = ("pdf", "supplement", "review")
+# 支撑文件的大小上限(字节), 下载前按Content-Length检查, 超过时跳过, None表示不限制
+scheduler.max_supplement_size = None
+# 超过large_size的支撑文件交给large_worker_num个线程的大文件通道按大小从小到大下载, 不占用thread_num个下载线程
+scheduler.large_size = 64 * 1024 * 1024
+scheduler.large_worker_num = 2
+# 文件布局: "id" data/<venue>/<year>/<id哈希>/<paper_id>.pdf, "title" 旧版本按标题命名(同名论文会互相覆盖)
+# 旧版本的数据先运行python -m core.path_index --migrate迁移
+data_module.layout = "id"
+# 每个会议结束后生成data/<venue>/paths.tsv(标题到路径的索引), title_links=True时另外生成data/<venue>/<year>/by-title下的符号链接
+path_index.title_links = False
+# 评审保存方式: "file" 每篇论文一个JSON文件, "segment" 每个会议年份一个压缩段(data/<venue>/<year>/reviews.jsonl.gz)
+review_store.backend = "file"
+# 每个会议下载结束后增量更新检索索引(cache/search.sqlite3), 用python -m core.search检索
+search.enabled = True
+# 每个会议下载结束后把论文和评审增量导出为按会议、年份分区的Parquet(export/papers、export/reviews), 需要安装pyarrow
+export.enabled = False
+# PDF下载完成后在独立的进程中提取纯文本和页数, 保存到data/<venue>/text.sqlite3, 需要安装pypdf
+# 在途任务达到max_pending时跳过, 不拖慢下载, 跳过的PDF在全部下载结束后补上
+pdf_text.enabled = False
+pdf_text.worker_num = None
+pdf_text.max_pending = 64
+# 单个下载项的重试次数与指数退避(秒), 仍然失败时记入死信队列(cache/dead_letter.sqlite3), 用--replay重新下载
+retry.max_attempts = 4
+retry.backoff_base = 2.0
+retry.backoff_max = 60.0
+# 一个会议最近breaker_window次尝试中失败比例达到breaker_threshold时暂停该会议breaker_pause秒
+retry.breaker_window = 20
+retry.breaker_threshold = 0.5
+retry.breaker_pause = 60.0
+# 流式下载的块大小, 决定单个下载任务的内存占用
+attachment.chunk_size = 1024 * 1024
+# 全局请求速率(次/秒), 遇到429会自动降速, 之后逐步恢复到max_request_rate
+# 配置了accounts.json(多个账号)时每个账号按这里的速率单独限速, 请求分配到排队最短且没有被429暂停的账号
+request_rate = 5
+max_request_rate = 20
+# 每progress.interval秒输出一次各会议的进度汇总(完成数、速度、预计剩余时间、失败项)
+# progress.detail=True时另外输出每篇论文的日志, 按论文id每detail_sample篇抽样1篇, 设为1时全部输出
+progress.interval = 30
+progress.detail = False
+progress.detail_sample = 100
+# 统计导出间隔(秒), 导出到cache/metrics.prom(Prometheus文本格式)和cache/metrics.json
+metrics_interval = 30
+
+
+def setup():
+    """按上面的配置初始化连接池、限速器和统计
+
+    PDF文本提取的子进程以spawn方式启动, 会重新导入本模块, 因此有副作用的初始化都放在这里, 只在运行时调用
+    """
+    print_log.info(f"指定需要获取{len(venue_list)}个会议")
+    configure_pool(size=pool_size, use_http2=use_http2)
+    rate_limiter.configure(rate=request_rate, max_rate=max_request_rate)
+    metrics.register_gauges("rate_limiter", rate_limiter.stats)
+    metrics.register_gauges("connection", connection_stats.stats)
+    metrics.register_gauges("progress", progress.tracker.stats)
 
 
-def main():
+def main(shard: Shard = None):
+    print_log.info(f"全部共{len(discovery.get_all_venues())}个会议")
+    if shard:
+        print_log.info(f"分片运行: {shard}")
+    discovery.venue_plan.discover(venue_list)
+    if engine == "pipeline":
+        DownloadPipeline(
+            stage_worker_nums,
+            incremental_venue_list=incremental_venue_list,
+            bulk_review=bulk_review,
+            shard=shard,
+        )(venue_list)
+        print_log.info(f"限速器状态: {rate_limiter.stats()}")
+        print_log.info(f"连接复用: {connection_stats.stats()}")
+        return
     for venue_index, venue_id in enumerate(venue_list, 1):
         print_log.info(f"开始: 第{venue_index}/{venue_count}个会议: {venue_id}")
         # # 检查参数模型
@@ -46,28 +152,110 @@ def main():
         # if params_module is None:
         #     print_log.error(f"没有找到匹配的参数模型, 需要维护: {venue_id}")
         #     continue
-        openreview_spider = OpenReviewSpider(venue_id)
-        paper_list = openreview_spider()
-        if not paper_list:
+        try:
+            task_list = list(
+                get_venue_tasks(
+                    venue_id, venue_id in incremental_venue_list, bulk_review, shard
+                )
+            )
+        except Exception as e:
+            # 论文列表重试后仍然获取失败, 跳过该会议, 下次运行重新获取
+            print_log.error(f"获取论文列表失败, 跳过: {venue_id}, {describe(e)}")
             continue
-        paper_count = len(paper_list)
-        futures = []
-        with ThreadPoolExecutor(
-            max_workers=thread_num, thread_name_prefix="下载"
-        ) as executor:
-            for paper_index, paper_info in enumerate(paper_list, 1):
-                task = executor.submit(
-                    multi_task,
-                    venue_index,
-                    paper_index,
-                    paper_count,
-                    paper_info,
-                    venue_id,
+        download_venue(venue_index, venue_count, venue_id, task_list)
+
+
+def prepare_shards(shard_count: int):
+    """在主进程中获取一次各会议的论文列表(增量会议同步一次)和批量评审, 复制到各分片目录
+
+    分片进程使用复制的论文索引, 不再各自获取整个会议, 列表和评审的请求数不随分片数增加
+    """
+    discovery.get_all_venues()
+    discovery.venue_plan.discover(venue_list)
+    for venue_id in venue_list:
+        try:
+            list(
+                get_venue_tasks(
+                    venue_id, venue_id in incremental_venue_list, bulk_review
                 )
-                futures.append(task)
-            for future in as_completed(futures):
+            )
+        except Exception as e:
+            print_log.error(
+                f"获取论文列表失败, 由各分片获取: {venue_id}, {describe(e)}"
+            )
+    seed_shards(shard_count, venue_list)
+
+
+def replay():
+    """只重新下载死信队列中的项, 不重新获取论文列表"""
+    venue_ids = dead_letter.venues()
+    print_log.info(f"重放死信队列: {len(venue_ids)}个会议")
+    for venue_index, venue_id in enumerate(venue_ids, 1):
+        print_log.info(f"开始重放: 第{venue_index}/{len(venue_ids)}个会议: {venue_id}")
+        download_venue(
+            venue_index, len(venue_ids), venue_id, dead_letter.tasks(venue_id)
+        )
+
+
+def refresh_reviews():
+    """刷新incremental_venue_list中有新回复的forum的评审, 适合在讨论期每隔几小时运行"""
+    refresher = ReviewRefresher()
+    for venue_id in incremental_venue_list:
+        if refresher(venue_id).get("written"):
+            search.index_venue(venue_id)
+            export.export_venue(venue_id)
+
+
+def download_venue(venue_index, venue_count, venue_id, task_list):
+    """用async或thread引擎下载一个会议的任务"""
+    if not task_list:
+        return
+    progress.tracker.add(venue_id, len(task_list))
+    if engine == "async":
+        success_count = AsyncPaperDownload(concurrency)(venue_id, task_list)
+        print_log.info(
+            f"结束: 第{venue_index}/{venue_count}个会议: {venue_id}, 成功{success_count}个"
+        )
+        progress.tracker.finish_venue(venue_id)
+        search.index_venue(venue_id)
+        path_index.index_venue(venue_id)
+        export.export_venue(venue_id)
+        pdf_text.extract_venue(venue_id)
+        print_log.info(f"限速器状态: {rate_limiter.stats()}")
+        return
+    paper_count = len(task_list)
+    futures = []
+    with scheduler.LargeLane() as large_lane, ThreadPoolExecutor(
+        max_workers=thread_num, thread_name_prefix="下载"
+    ) as executor:
+        for paper_index, (paper_info, states) in enumerate(task_list, 1):
+            task = executor.submit(
+                multi_task,
+                venue_index,
+                venue_count,
+                paper_index,
+                paper_count,
+                paper_info,
+                venue_id,
+                states,
+                large_lane,
+            )
+            futures.append(task)
+        for future in as_completed(futures):
+            # 下载项的错误已在PaperDownload中重试并记入死信队列, 其余意外错误只影响这一篇论文
+            try:
                 future.result()
-        print_log.info(f"结束: 第{venue_index}/{venue_count}个会议: {venue_id}")
+            except Exception as e:
+                print_log.exception(e)
+    print_log.info(f"结束: 第{venue_index}/{venue_count}个会议: {venue_id}")
+    progress.tracker.finish_venue(venue_id)
+    search.index_venue(venue_id)
+    path_index.index_venue(venue_id)
+    export.export_venue(venue_id)
+    pdf_text.extract_venue(venue_id)
+    print_log.info(f"下载清单: {manifest.stats(venue_id)}")
+    print_log.info(f"限速器状态: {rate_limiter.stats()}")
+    print_log.info(f"连接复用: {connection_stats.stats()}")
 
 
 def parse_title(paper: dict):
@@ -98,10 +286,21 @@ def parse_year(paper):
     return paper_year
 
 
-def multi_task(venue_index, paper_index, paper_count, paper_info, venue_id):
-    print_log.info(
-        f"开始: 第{venue_index}/{venue_count}个会议, 第{paper_index}/{paper_count}个论文"
-    )
+def multi_task(
+    venue_index,
+    venue_count,
+    paper_index,
+    paper_count,
+    paper_info,
+    venue_id,
+    states,
+    large_lane,
+):
+    detail = progress.tracker.sampled(paper_info["id"])
+    if detail:
+        print_log.info(
+            f"开始: 第{venue_index}/{venue_count}个会议, 第{paper_index}/{paper_count}个论文"
+        )
     # # 论文信息
     # paper_title = parse_title(paper_info)
     # paper_year = parse_year(paper_info)
@@ -113,15 +312,72 @@ def multi_task(venue_index, paper_index, paper_count, paper_info, venue_id):
     # venue_id, paper_year, paper_title, paper_id, review_info
     # )
     # 下载
-    PaperDownload(venue_id, paper_info)()
-    print_log.info(
-        f"结束: 第{venue_index}/{venue_count}个会议, 第{paper_index}/{paper_count}个论文"
-    )
+    PaperDownload(venue_id, paper_info, states, large_lane)()
+    progress.tracker.paper_done(venue_id)
+    if detail:
+        print_log.info(
+            f"结束: 第{venue_index}/{venue_count}个会议, 第{paper_index}/{paper_count}个论文"
+        )
     return True
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--shard",
+        help="只下载第i个分片(按论文id哈希), 格式为i/N, 多台机器时每台指定一个",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        help="在本机启动N个分片进程(目录为shards/<i>), 结束后自动合并",
+    )
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        help="把shards/<i>下各分片的结果合并到data和下载清单",
+    )
+    parser.add_argument(
+        "--replay",
+        action="store_true",
+        help="只重新下载死信队列中的项(python -m core.retry查看)",
+    )
+    parser.add_argument(
+        "--refresh-reviews",
+        action="store_true",
+        help="只刷新incremental_venue_list中有新回复的评审",
+    )
+    args = parser.parse_args()
     try:
-        main()
+        setup()
+        if args.shards:
+            prepare_shards(args.shards)
+            if run_shards(args.shards, Path(__file__).resolve()):
+                merge_shards()
+        elif args.merge:
+            merge_shards()
+        elif args.replay or args.refresh_reviews:
+            metrics.start_export(metrics_interval)
+            progress.tracker.start_report()
+            try:
+                if args.replay:
+                    replay()
+                else:
+                    refresh_reviews()
+            finally:
+                # 补上跳过的PDF并等待文本提取完成
+                pdf_text.extractor.close()
+                progress.tracker.stop_report()
+                metrics.stop_export()
+        else:
+            metrics.start_export(metrics_interval)
+            progress.tracker.start_report()
+            try:
+                main(Shard.parse(args.shard) if args.shard else None)
+            finally:
+                # 补上跳过的PDF并等待文本提取完成
+                pdf_text.extractor.close()
+                progress.tracker.stop_report()
+                metrics.stop_export()
     except Exception as e:
         print_log.exception(e)
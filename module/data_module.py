@@ -1,3 +1,15 @@
+import hashlib
+import re
+
+from core.path_config import data_dir
+
+# 文件布局: "id" 按论文id命名并按id哈希分到256个子目录, 同名论文互不覆盖;
+# "title" 旧版本的按标题命名, 同一年份的文件都在一个目录下, 同名论文会互相覆盖
+layout = "id"
+# 已创建的目录, 避免每篇论文都调用一次mkdir
+_created_dirs = set()
+
+
 class DownlaodModule:
 
     def __init__(self, venue_id, paper_year, paper_title, paper_id, review_info):
@@ -6,3 +18,57 @@ class DownlaodModule:
         self.paper_title = paper_title
         self.paper_id = paper_id
         self.review_info = review_info
+
+
+def venue_dir(venue_id: str):
+    """会议的保存目录, 其下按年份分目录"""
+    return data_dir / re.sub(r'[<>:"/\\|?*]', "-", venue_id)
+
+
+def safe_title(title: str) -> str:
+    """去掉标题中不能用于文件名的字符"""
+    return re.sub(r'[<>:"/\\|?*]', "-", title).replace("\x08", "")
+
+
+def id_shard(paper_id: str) -> str:
+    """论文id所在的子目录, 按哈希取两位十六进制, 每个年份最多256个子目录"""
+    return hashlib.blake2b(paper_id.encode("utf-8"), digest_size=1).hexdigest()
+
+
+class PaperPath:
+    """论文各个文件的保存路径, 同步与协程下载共用
+
+    layout为"id"时为data/<venue>/<year>/<id哈希>/<paper_id>.pdf, 为"title"时为data/<venue>/<year>/<标题>.pdf;
+    评审段(review_store.backend="segment")两种布局都保存在年份目录下
+    """
+
+    def __init__(self, venue_id: str, paper_info: dict, style: str = None):
+        style = style or layout
+        supplementary_type = paper_info["supplementary_type"]
+        self.year_dir = venue_dir(venue_id) / paper_info["year"]
+        if style == "id":
+            file_name = paper_info["id"]
+            self.paper_save_dir = self.year_dir / id_shard(file_name)
+        else:
+            file_name = safe_title(paper_info["title"])
+            self.paper_save_dir = self.year_dir
+        self.paper_save_path = self.paper_save_dir / f"{file_name}.pdf"
+        self.paper_supplement_save_path = None
+        if supplementary_type:
+            self.paper_supplement_save_path = (
+                self.paper_save_dir / f"{file_name}_supplement.{supplementary_type}"
+            )
+        self.paper_review_save_path = self.paper_save_dir / f"{file_name}.json"
+
+    def artifact_paths(self) -> dict:
+        return {
+            "pdf": self.paper_save_path,
+            "supplement": self.paper_supplement_save_path,
+            "review": self.paper_review_save_path,
+        }
+
+    def make_dir(self):
+        """创建保存目录, 同一进程内每个目录只创建一次"""
+        if self.paper_save_dir not in _created_dirs:
+            self.paper_save_dir.mkdir(parents=True, exist_ok=True)
+            _created_dirs.add(self.paper_save_dir)
@@ -0,0 +1,53 @@
+"""V1会议回复修改后, 增量同步和评审刷新都能发现变化(V1接口只能按投稿invitation查询修改)"""
+
+import pytest
+
+from benchmark.fake_server import FakeOpenReview
+from core import openreview_client
+from core.manifest import manifest
+from core.openreview_spider import OpenReviewSpider
+from core.review_refresh import ReviewRefresher
+
+VENUE_ID = "Fake.cc/2019/Conference"
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name in ("cache", "data"):
+        (tmp_path / name).mkdir()
+    server = FakeOpenReview(
+        venues={VENUE_ID: 1}, papers=5, pdf_size=1024, supplement_size=1024, latency=0
+    )
+    for version, url in server.baseurls(server.start()).items():
+        monkeypatch.setitem(openreview_client.BASEURLS, version, url)
+    yield server
+    server.stop()
+
+
+def change_reply(server, paper_index: int):
+    """第paper_index篇论文的第一条回复内容修改, tmdate前移"""
+    replies = server.replies
+
+    def changed(venue_id, index):
+        notes = replies(venue_id, index)
+        if index == paper_index:
+            notes[0]["tmdate"] += 10**6
+            notes[0]["content"] = {**notes[0]["content"], "review": "changed"}
+        return notes
+
+    server.replies = changed
+
+
+def test_v1_reply_change(server):
+    assert OpenReviewSpider(VENUE_ID)()
+    refresher = ReviewRefresher()
+    assert refresher(VENUE_ID)["written"] == 5
+    assert refresher(VENUE_ID)["written"] == 0
+
+    change_reply(server, 2)
+    paper_id = server._paper_ids(VENUE_ID)[2]
+    assert refresher(VENUE_ID)["written"] == 1
+
+    OpenReviewSpider(VENUE_ID, incremental=True)()
+    assert manifest.get(VENUE_ID, paper_id, "review")[0] == "stale"